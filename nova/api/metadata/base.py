@@ -17,11 +17,15 @@
 """Instance Metadata information."""
 
 import base64
+import functools
 import json
 import os
 import posixpath
+import sys
 
+import eventlet
 from oslo.config import cfg
+import six
 
 from nova.api.ec2 import ec2utils
 from nova.api.metadata import password
@@ -29,7 +33,9 @@ from nova import block_device
 from nova.compute import flavors
 from nova import conductor
 from nova import context
+from nova import metadata_cache
 from nova import network
+from nova.network import model as network_model
 from nova.objects import base as obj_base
 from nova.objects import block_device as block_device_obj
 from nova.objects import instance as instance_obj
@@ -51,6 +57,23 @@ metadata_opts = [
     cfg.StrOpt('vendordata_driver',
                default='nova.api.metadata.vendordata_json.JsonFileVendorData',
                help='Driver to use for vendor data'),
+    cfg.IntOpt('metadata_lookup_cache_expiration',
+               default=0,
+               help='Time in seconds to cache the availability zone, '
+                    'security groups, block device mappings, EC2 ids and '
+                    'network info of an instance for the metadata service. '
+                    'Changes made through other services are only seen '
+                    'before it expires if memcached_servers is shared '
+                    'with them. 0 => look them up for every uncached '
+                    'request'),
+    cfg.BoolOpt('metadata_cache_warming',
+                default=False,
+                help='Look up the metadata of an instance on the compute '
+                     'host when it becomes active, so that its first '
+                     'metadata requests are served from the cache. Only '
+                     'useful when memcached_servers is shared with the '
+                     'metadata service, and metadata_lookup_cache_expiration '
+                     'is set'),
 ]
 
 CONF = cfg.CONF
@@ -101,13 +124,17 @@ class InstanceMetadata():
     """Instance metadata."""
 
     def __init__(self, instance, address=None, content=None, extra_md=None,
-                 conductor_api=None, network_info=None, vd_driver=None):
+                 conductor_api=None, network_info=None, vd_driver=None,
+                 lookup_cache=None):
         """Creation of this object should basically cover all time consuming
         collection.  Methods after that should not cause time delays due to
         network operations or lengthy cpu operations.
 
         The user should then get a single instance and make multiple method
         calls on it.
+
+        The lookups in other services are made concurrently, and each of
+        their results is taken from and stored in lookup_cache if given.
         """
         if not content:
             content = []
@@ -128,22 +155,19 @@ class InstanceMetadata():
         else:
             capi = conductor.API()
 
-        self.availability_zone = ec2utils.get_availability_zone_by_host(
-                instance['host'], capi)
-
-        self.security_groups = secgroup_obj.SecurityGroupList.get_by_instance(
-            ctxt, instance)
-
-        self.mappings = _format_instance_mapping(ctxt, instance)
+        lookups = _lookup_all(ctxt, instance, capi, network_info,
+                              lookup_cache)
+        self.availability_zone = lookups['availability_zone']
+        self.security_groups = lookups['security_groups']
+        self.mappings = lookups['mappings']
+        self.ec2_ids = lookups['ec2_ids']
+        network_info = lookups['network_info']
 
         if instance.get('user_data', None) is not None:
             self.userdata_raw = base64.b64decode(instance['user_data'])
         else:
             self.userdata_raw = None
 
-        self.ec2_ids = capi.get_ec2_ids(ctxt,
-                                        obj_base.obj_to_primitive(instance))
-
         self.address = address
 
         # expose instance metadata.
@@ -156,11 +180,7 @@ class InstanceMetadata():
         self.content = {}
         self.files = []
 
-        # get network info, and the rendered network template
-        if network_info is None:
-            network_info = network.API().get_instance_nw_info(ctxt,
-                                                              instance)
-
+        # get the rendered network template
         self.ip_info = \
                 ec2utils.get_ip_info_for_instance_from_nw_info(network_info)
 
@@ -504,7 +524,21 @@ def get_metadata_by_instance_id(conductor_api, instance_id, address,
                                 ctxt=None):
     ctxt = ctxt or context.get_admin_context()
     instance = instance_obj.Instance.get_by_uuid(ctxt, instance_id)
-    return InstanceMetadata(instance, address)
+    return InstanceMetadata(instance, address,
+                            lookup_cache=metadata_cache.get_client())
+
+
+def warm_lookup_cache(instance, network_info=None, conductor_api=None):
+    """Make the lookups for the metadata of instance and cache them."""
+    if not CONF.metadata_lookup_cache_expiration:
+        return
+    ctxt = context.get_admin_context()
+    if network_info is not None:
+        # NOTE: Copy the network info into a plain NetworkInfo, which unlike
+        # the asynchronous wrapper compute uses can be stored in memcached.
+        network_info = network_model.NetworkInfo(list(network_info))
+    _lookup_all(ctxt, instance, conductor_api or conductor.API(),
+                network_info, metadata_cache.get_client())
 
 
 def _format_instance_mapping(ctxt, instance):
@@ -513,6 +547,76 @@ def _format_instance_mapping(ctxt, instance):
     return block_device.instance_block_mapping(instance, bdms)
 
 
+def _cached_lookup(cache, key, lookup):
+    if cache is None or not CONF.metadata_lookup_cache_expiration:
+        return lookup()
+    value = cache.get(key)
+    if value is None:
+        value = lookup()
+        cache.set(key, value, CONF.metadata_lookup_cache_expiration)
+    return value
+
+
+def _lookup_all(ctxt, instance, capi, network_info=None, cache=None):
+    """Return the pieces of the metadata of instance which are looked up
+    in other services.
+
+    The lookups run concurrently, and each result is cached on its own in
+    cache if given, so a failed lookup does not throw away the others.
+    network_info is looked up only if it is not given, in which case it is
+    stored in the cache as it is.
+    """
+    uuid = instance['uuid']
+    lookups = {
+        'availability_zone': (
+            'metadata-az-%s' % instance['host'],
+            functools.partial(ec2utils.get_availability_zone_by_host,
+                              instance['host'], capi)),
+        'security_groups': (
+            metadata_cache.lookup_key('secgroups', uuid),
+            functools.partial(secgroup_obj.SecurityGroupList.get_by_instance,
+                              ctxt, instance)),
+        'mappings': (
+            metadata_cache.lookup_key('mappings', uuid),
+            functools.partial(_format_instance_mapping, ctxt, instance)),
+        'ec2_ids': (
+            metadata_cache.lookup_key('ec2-ids', uuid),
+            functools.partial(capi.get_ec2_ids, ctxt,
+                              obj_base.obj_to_primitive(instance))),
+    }
+    if network_info is None:
+        lookups['network_info'] = (
+            metadata_cache.lookup_key('nw-info', uuid),
+            functools.partial(network.API().get_instance_nw_info, ctxt,
+                              instance))
+    elif cache is not None and CONF.metadata_lookup_cache_expiration:
+        cache.set(metadata_cache.lookup_key('nw-info', uuid), network_info,
+                  CONF.metadata_lookup_cache_expiration)
+
+    def _lookup(key, lookup):
+        # NOTE: Failures are returned rather than raised, which would have
+        # eventlet print them as unhandled.
+        try:
+            return _cached_lookup(cache, key, lookup), None
+        except Exception:
+            return None, sys.exc_info()
+
+    pool = eventlet.GreenPool(len(lookups))
+    threads = dict((name, pool.spawn(_lookup, key, lookup))
+                   for name, (key, lookup) in lookups.items())
+    results = {'network_info': network_info}
+    # NOTE: Wait for every lookup before raising the first failure, so
+    # that the others are not left running, and still get cached.
+    failure = None
+    for name, thread in threads.items():
+        results[name], exc_info = thread.wait()
+        if failure is None:
+            failure = exc_info
+    if failure is not None:
+        six.reraise(*failure)
+    return results
+
+
 def ec2_md_print(data):
     if isinstance(data, dict):
         output = ''
@@ -18,6 +18,7 @@
 import hashlib
 import hmac
 import os
+import time
 
 from oslo.config import cfg
 import six
@@ -25,11 +26,12 @@ import webob.dec
 import webob.exc
 
 from nova.api.metadata import base
+from nova import cache_utils
 from nova import conductor
 from nova import exception
+from nova import metadata_cache
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova import wsgi
 
 CACHE_EXPIRATION = 15  # in seconds
@@ -49,7 +51,22 @@ metadata_proxy_opts = [
          help='Shared secret to validate proxies Neutron metadata requests')
 ]
 
+metadata_cache_opts = [
+    cfg.IntOpt('metadata_response_cache_expiration',
+               default=CACHE_EXPIRATION,
+               help='Time in seconds to cache each rendered metadata '
+                    'response for. The cache is shared by all metadata '
+                    'workers when memcached_servers is set, and changes '
+                    'made through other services are then seen before it '
+                    'expires. 0 => disabled'),
+    cfg.IntOpt('metadata_cache_stats_interval',
+               default=600,
+               help='Interval in seconds between logging the hit rate of '
+                    'the metadata response cache. 0 => never'),
+]
+
 CONF.register_opts(metadata_proxy_opts)
+CONF.register_opts(metadata_cache_opts)
 
 LOG = logging.getLogger(__name__)
 
@@ -58,15 +75,38 @@ class MetadataRequestHandler(wsgi.Application):
     """Serve metadata."""
 
     def __init__(self):
-        self._cache = memorycache.get_client()
+        self._cache = cache_utils.get_client()
         self.conductor_api = conductor.API()
+        self._response_hits = 0
+        self._response_misses = 0
+        self._response_stale = 0
+        self._next_stats_log = time.time() + CONF.metadata_cache_stats_interval
+
+    def _cache_get(self, cache_key):
+        """Return a cached value, unless the cache generation of its
+        instance has changed since it was stored.
+        """
+        cached = self._cache.get(cache_key)
+        if cached is None:
+            return None
+        instance_uuid, generation, value = cached
+        if generation != metadata_cache.get_generation(instance_uuid):
+            return None
+        return value
+
+    def _cache_set(self, cache_key, instance_uuid, value, expiration):
+        # NOTE: A change made while the value was being looked up is only
+        # seen once the value expires.
+        generation = metadata_cache.get_generation(instance_uuid)
+        self._cache.set(cache_key, (instance_uuid, generation, value),
+                        expiration)
 
     def get_metadata_by_remote_address(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
         cache_key = 'metadata-%s' % address
-        data = self._cache.get(cache_key)
+        data = self._cache_get(cache_key)
         if data:
             return data
 
@@ -75,13 +115,13 @@ class MetadataRequestHandler(wsgi.Application):
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        self._cache_set(cache_key, data.uuid, data, CACHE_EXPIRATION)
 
         return data
 
     def get_metadata_by_instance_id(self, instance_id, address):
         cache_key = 'metadata-%s' % instance_id
-        data = self._cache.get(cache_key)
+        data = self._cache_get(cache_key)
         if data:
             return data
 
@@ -91,15 +131,77 @@ class MetadataRequestHandler(wsgi.Application):
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        self._cache_set(cache_key, data.uuid, data, CACHE_EXPIRATION)
 
         return data
 
+    def get_cache_stats(self):
+        """Return the counters of the response cache of this worker."""
+        lookups = (self._response_hits + self._response_misses +
+                   self._response_stale)
+        return {'hits': self._response_hits,
+                'misses': self._response_misses,
+                'stale': self._response_stale,
+                'hit_rate': (float(self._response_hits) / lookups
+                             if lookups else 0.0)}
+
+    def _log_cache_stats(self):
+        interval = CONF.metadata_cache_stats_interval
+        if not interval or time.time() < self._next_stats_log:
+            return
+        self._next_stats_log = time.time() + interval
+        LOG.info(_('Metadata response cache: %(hits)d hits, %(misses)d '
+                   'misses, %(stale)d stale, hit rate %(hit_rate).2f'),
+                 self.get_cache_stats())
+
+    def _response_cache_key(self, req):
+        """Return the key to cache the response to req under, or None if
+        it is not cacheable.
+        """
+        if not CONF.metadata_response_cache_expiration or req.method != 'GET':
+            return None
+        if CONF.service_neutron_metadata_proxy:
+            instance_id = self._check_instance_id_request(req)[0]
+            key = 'instance %s' % instance_id
+        else:
+            address = self._get_remote_address(req)
+            if not address:
+                return None
+            key = 'address %s' % address
+        # NOTE: The path is hashed, as memcached keys cannot hold spaces or
+        # control characters.
+        return 'metadata-response-%s' % hashlib.sha1(
+            '%s %s' % (key, req.path_info)).hexdigest()
+
+    def _get_cached_response(self, req, response_key):
+        cached = self._cache.get(response_key)
+        if cached is None:
+            self._response_misses += 1
+            return None
+        instance_uuid, generation, (project_id, response) = cached
+        if generation != metadata_cache.get_generation(instance_uuid):
+            self._response_stale += 1
+            return None
+        if (CONF.service_neutron_metadata_proxy and
+                project_id != req.headers.get('X-Tenant-ID')):
+            # NOTE: Let the uncached path reject the request.
+            self._response_misses += 1
+            return None
+        self._response_hits += 1
+        return response
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         if os.path.normpath(req.path_info) == "/":
             return(base.ec2_md_print(base.VERSIONS + ["latest"]))
 
+        self._log_cache_stats()
+        response_key = self._response_cache_key(req)
+        if response_key:
+            response = self._get_cached_response(req, response_key)
+            if response is not None:
+                return response
+
         if CONF.service_neutron_metadata_proxy:
             meta_data = self._handle_instance_id_request(req)
         else:
@@ -121,12 +223,21 @@ class MetadataRequestHandler(wsgi.Application):
         if callable(data):
             return data(req, meta_data)
 
-        return base.ec2_md_print(data)
+        response = base.ec2_md_print(data)
+        if response_key:
+            self._cache_set(response_key, meta_data.uuid,
+                            (meta_data.instance['project_id'], response),
+                            CONF.metadata_response_cache_expiration)
+        return response
 
-    def _handle_remote_ip_request(self, req):
+    def _get_remote_address(self, req):
         remote_address = req.remote_addr
         if CONF.use_forwarded_for:
             remote_address = req.headers.get('X-Forwarded-For', remote_address)
+        return remote_address
+
+    def _handle_remote_ip_request(self, req):
+        remote_address = self._get_remote_address(req)
 
         try:
             meta_data = self.get_metadata_by_remote_address(remote_address)
@@ -142,7 +253,10 @@ class MetadataRequestHandler(wsgi.Application):
 
         return meta_data
 
-    def _handle_instance_id_request(self, req):
+    def _check_instance_id_request(self, req):
+        """Validate the headers of a request proxied by Neutron, and return
+        its instance id and tenant id.
+        """
         instance_id = req.headers.get('X-Instance-ID')
         tenant_id = req.headers.get('X-Tenant-ID')
         signature = req.headers.get('X-Instance-ID-Signature')
@@ -183,6 +297,12 @@ class MetadataRequestHandler(wsgi.Application):
             msg = _('Invalid proxy request signature.')
             raise webob.exc.HTTPForbidden(explanation=msg)
 
+        return instance_id, tenant_id
+
+    def _handle_instance_id_request(self, req):
+        instance_id, tenant_id = self._check_instance_id_request(req)
+        remote_address = req.headers.get('X-Forwarded-For')
+
         try:
             meta_data = self.get_metadata_by_instance_id(instance_id,
                                                          remote_address)
@@ -17,6 +17,7 @@
 
 import datetime
 
+import webob
 from webob import exc
 
 from nova.api.openstack import extensions
@@ -47,8 +48,9 @@ def get_host_from_body(fn):
 
 class AggregateController(object):
     """The Host Aggregates API controller for the OpenStack API."""
-    def __init__(self):
+    def __init__(self, ext_mgr=None):
         self.api = compute_api.AggregateAPI()
+        self.ext_mgr = ext_mgr
 
     def index(self, req):
         """Returns a list a host aggregate's id, name, availability_zone."""
@@ -153,6 +155,8 @@ class AggregateController(object):
             'remove_host': self._remove_host,
             'set_metadata': self._set_metadata,
         }
+        if self.ext_mgr and self.ext_mgr.is_loaded('os-image-precache'):
+            _actions['cache_image'] = self._cache_image
         for action, data in body.iteritems():
             if action not in _actions.keys():
                 msg = _('Aggregates does not have %s action') % action
@@ -220,6 +224,26 @@ class AggregateController(object):
 
         return self._marshall_aggregate(aggregate)
 
+    def _cache_image(self, req, id, body):
+        """Starts downloading an image to every host in the aggregate."""
+        context = _get_context(req)
+        authorize(context)
+
+        try:
+            image_id = body["image_id"]
+        except (KeyError, TypeError):
+            raise exc.HTTPBadRequest()
+        try:
+            self.api.cache_image(context, id, image_id)
+        except exception.AggregateNotFound:
+            LOG.info(_('Cannot cache image %(image_id)s in aggregate %(id)s'),
+                     {'image_id': image_id, 'id': id})
+            raise exc.HTTPNotFound()
+        except exception.ImageNotFound as e:
+            raise exc.HTTPBadRequest(explanation=e.format_message())
+
+        return webob.Response(status_int=202)
+
     def _marshall_aggregate(self, aggregate):
         _aggregate = {}
         for key, value in aggregate.items():
@@ -241,7 +265,7 @@ class Aggregates(extensions.ExtensionDescriptor):
     def get_resources(self):
         resources = []
         res = extensions.ResourceExtension('os-aggregates',
-                AggregateController(),
+                AggregateController(self.ext_mgr),
                 member_actions={"action": "POST", })
         resources.append(res)
         return resources
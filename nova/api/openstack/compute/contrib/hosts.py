@@ -15,6 +15,7 @@
 
 """The hosts admin extension."""
 
+import webob
 import webob.exc
 
 from nova.api.openstack import extensions
@@ -90,8 +91,9 @@ class HostUpdateDeserializer(wsgi.XMLDeserializer):
 
 class HostController(object):
     """The Hosts API controller for the OpenStack API."""
-    def __init__(self):
+    def __init__(self, ext_mgr=None):
         self.api = compute.HostAPI()
+        self.ext_mgr = ext_mgr
         super(HostController, self).__init__()
 
     @wsgi.serializers(xml=HostIndexTemplate)
@@ -265,6 +267,26 @@ class HostController(object):
     def reboot(self, req, id):
         return self._host_power_action(req, host_name=id, action="reboot")
 
+    def cache_image(self, req, id, body):
+        """Starts downloading an image to the _base cache of the host."""
+        if not (self.ext_mgr and
+                self.ext_mgr.is_loaded('os-image-precache')):
+            raise webob.exc.HTTPNotFound()
+        context = req.environ['nova.context']
+        authorize(context)
+        try:
+            image_id = body['cache_image']['image_id']
+        except (KeyError, TypeError):
+            msg = _("'image_id' needed to cache an image")
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        try:
+            self.api.cache_image(context, image_id, [id])
+        except exception.ImageNotFound as e:
+            raise webob.exc.HTTPBadRequest(explanation=e.format_message())
+        except exception.NotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        return webob.Response(status_int=202)
+
     @staticmethod
     def _get_total_resources(host_name, compute_node):
         return {'resource': {'host': host_name,
@@ -359,8 +381,8 @@ class Hosts(extensions.ExtensionDescriptor):
 
     def get_resources(self):
         resources = [extensions.ResourceExtension('os-hosts',
-                HostController(),
+                HostController(self.ext_mgr),
                 collection_actions={'update': 'PUT'},
                 member_actions={"startup": "GET", "shutdown": "GET",
-                        "reboot": "GET"})]
+                        "reboot": "GET", "cache_image": "POST"})]
         return resources
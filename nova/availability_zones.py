@@ -17,8 +17,8 @@
 
 from oslo.config import cfg
 
+from nova import cache_utils
 from nova import db
-from nova.openstack.common import memorycache
 
 # NOTE(vish): azs don't change that often, so cache them for an hour to
 #             avoid hitting the db multiple times on every request.
@@ -42,7 +42,7 @@ def _get_cache():
     global MC
 
     if MC is None:
-        MC = memorycache.get_client()
+        MC = cache_utils.get_client()
 
     return MC
 
@@ -0,0 +1,219 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Memcached clients, with a bounded in process cache as the fallback.
+
+This replaces nova.openstack.common.memorycache for nova, whose in process
+Client walks every key on each get() and is never bounded.
+"""
+
+from oslo.config import cfg
+
+from nova.openstack.common import timeutils
+
+cache_opts = [
+    cfg.IntOpt('memorycache_max_entries',
+               default=10000,
+               help='Maximum number of entries kept by each in process '
+                    'cache. The least recently used entries are evicted '
+                    'first. 0 means no limit.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+# Indexes into the entries of the in process cache, which are kept in a
+# doubly linked list from the least to the most recently used.
+_PREV, _NEXT, _KEY, _TIMEOUT, _VALUE = range(5)
+
+
+def get_client(memcached_servers=None):
+    """Return a memcached client for memcached_servers, or an in process
+    Client if none are set or python-memcached is not installed.
+    """
+    client_cls = Client
+
+    if not memcached_servers:
+        memcached_servers = CONF.memcached_servers
+    if memcached_servers:
+        try:
+            import memcache
+            client_cls = memcache.Client
+        except ImportError:
+            pass
+
+    return client_cls(memcached_servers, debug=0)
+
+
+class Client(object):
+    """Replicates a tiny subset of memcached client interface.
+
+    Lookups are O(1).  Expired entries are dropped when they are looked
+    up, and by a sweep of the whole cache at most every sweep_interval
+    seconds.  The least recently used entries are evicted to stay within
+    max_entries, unless it is 0.
+    """
+
+    sweep_interval = 60
+
+    def __init__(self, *args, **kwargs):
+        """Ignores the passed in args."""
+        self.max_entries = kwargs.get('max_entries',
+                                      CONF.memorycache_max_entries)
+        self.cache = {}
+        self._root = root = []
+        root[:] = [root, root, None, 0, None]
+        self._next_sweep = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _unlink(self, entry):
+        entry[_PREV][_NEXT] = entry[_NEXT]
+        entry[_NEXT][_PREV] = entry[_PREV]
+
+    def _link_last(self, entry):
+        root = self._root
+        last = root[_PREV]
+        entry[_PREV] = last
+        entry[_NEXT] = root
+        last[_NEXT] = root[_PREV] = entry
+
+    def _remove(self, entry):
+        self._unlink(entry)
+        del self.cache[entry[_KEY]]
+
+    def _sweep(self, now):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        for entry in self.cache.values():
+            if entry[_TIMEOUT] and now >= entry[_TIMEOUT]:
+                self._remove(entry)
+                self.expirations += 1
+
+    def _lookup(self, key, now):
+        """Return the live entry for a key, marking it most recently
+        used, or None.
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[_TIMEOUT] and now >= entry[_TIMEOUT]:
+            self._remove(entry)
+            self.expirations += 1
+            return None
+        self._unlink(entry)
+        self._link_last(entry)
+        return entry
+
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        now = timeutils.utcnow_ts()
+        self._sweep(now)
+        entry = self._lookup(key, now)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[_VALUE]
+
+    def get_multi(self, keys, key_prefix=''):
+        """Retrieves the values for several keys.
+
+        Returns a dict of the keys which were found, without key_prefix,
+        to their values.
+        """
+        now = timeutils.utcnow_ts()
+        self._sweep(now)
+        result = {}
+        for key in keys:
+            entry = self._lookup(key_prefix + key, now)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                result[key] = entry[_VALUE]
+        return result
+
+    def _set(self, key, value, time, now):
+        timeout = 0
+        if time != 0:
+            timeout = now + time
+        entry = self.cache.get(key)
+        if entry is not None:
+            self._unlink(entry)
+            entry[_TIMEOUT] = timeout
+            entry[_VALUE] = value
+        else:
+            if self.max_entries and len(self.cache) >= self.max_entries:
+                self._sweep(now)
+                while len(self.cache) >= self.max_entries:
+                    self._remove(self._root[_NEXT])
+                    self.evictions += 1
+            entry = [None, None, key, timeout, value]
+            self.cache[key] = entry
+        self._link_last(entry)
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        self._set(key, value, time, timeutils.utcnow_ts())
+        return True
+
+    def set_multi(self, mapping, time=0, key_prefix='', min_compress_len=0):
+        """Sets the values for several keys.
+
+        Returns the list of keys which were not stored, which is always
+        empty.
+        """
+        now = timeutils.utcnow_ts()
+        for key, value in mapping.iteritems():
+            self._set(key_prefix + key, value, time, now)
+        return []
+
+    def add(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key if it doesn't exist."""
+        if self.get(key) is not None:
+            return False
+        return self.set(key, value, time, min_compress_len)
+
+    def incr(self, key, delta=1):
+        """Increments the value for a key."""
+        value = self.get(key)
+        if value is None:
+            return None
+        new_value = int(value) + delta
+        self.cache[key][_VALUE] = str(new_value)
+        return new_value
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        entry = self.cache.get(key)
+        if entry is not None:
+            self._remove(entry)
+
+    def delete_multi(self, keys, time=0, key_prefix=''):
+        """Deletes the values associated with several keys."""
+        for key in keys:
+            self.delete(key_prefix + key)
+        return 1
+
+    def get_cache_stats(self):
+        """Returns the counters of the in process cache."""
+        return {'entries': len(self.cache),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations}
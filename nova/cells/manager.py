@@ -45,7 +45,26 @@ cell_manager_opts = [
                         "or deleted to continue to update cells"),
         cfg.IntOpt("instance_update_num_instances",
                 default=1,
-                help="Number of instances to update per periodic task run")
+                help="Number of instances to update per periodic task run"),
+        cfg.IntOpt("instance_heal_batch_size",
+                default=0,
+                help="If set, heal instances by sending parent cells the "
+                     "instances updated or deleted since the last periodic "
+                     "task run, up to this many of each per run, instead "
+                     "of a random sample of instance_update_num_instances "
+                     "instances"),
+        cfg.IntOpt("instance_heal_lookback",
+                default=10,
+                help="Number of seconds before the last change sent to "
+                     "parent cells from which instance changes are read "
+                     "again, so that changes made within the same second "
+                     "or committed late are not missed"),
+        cfg.BoolOpt("skip_timed_out_cells",
+                default=False,
+                help="Leave out cells which did not respond in time when "
+                     "listing services, compute nodes, task logs and "
+                     "migrations across cells, instead of failing the "
+                     "request")
 ]
 
 
@@ -93,6 +112,7 @@ class CellsManager(manager.Manager):
                 CONF.cells.driver)
         self.driver = cells_driver_cls()
         self.instances_to_heal = iter([])
+        self.instance_change_cursors = None
 
     def post_start_hook(self):
         """Have the driver start its servers for inter-cell communication.
@@ -136,12 +156,20 @@ class CellsManager(manager.Manager):
         setting defines the maximum number of seconds old the updated_at
         can be.  Ie, a threshold of 3600 means to only update instances
         that have modified in the last hour.
+
+        If CONF.cells.instance_heal_batch_size is set, instances are
+        instead healed from the stream of instance changes.  See
+        _heal_changed_instances().
         """
 
         if not self.state_manager.get_parent_cells():
             # No need to sync up if we have no parents.
             return
 
+        if CONF.cells.instance_heal_batch_size > 0:
+            self._heal_changed_instances(ctxt)
+            return
+
         info = {'updated_list': False}
 
         def _next_instance():
@@ -182,6 +210,43 @@ class CellsManager(manager.Manager):
                 self._sync_instance(ctxt, instance)
                 break
 
+    def _heal_changed_instances(self, ctxt):
+        """Send parent cells the instances that were updated or deleted
+        since the last run, oldest change first.
+
+        Updates and deletes are followed with separate cursors, because
+        deleting an instance does not change its updated_at.  Each run
+        sends up to CONF.cells.instance_heal_batch_size instances from
+        each cursor, so a backlog is worked through over several runs.
+        On the first run, the cursors start
+        CONF.cells.instance_updated_at_threshold seconds in the past, or
+        at the beginning if the threshold is not set.
+        """
+        if self.instance_change_cursors is None:
+            threshold = CONF.cells.instance_updated_at_threshold
+            if threshold > 0:
+                start = timeutils.utcnow() - datetime.timedelta(
+                        seconds=threshold)
+            else:
+                start = datetime.datetime.utcfromtimestamp(0)
+            lookback = CONF.cells.instance_heal_lookback
+            self.instance_change_cursors = [
+                    cells_utils.InstanceChangeCursor('updated_at', start,
+                                                     lookback),
+                    cells_utils.InstanceChangeCursor('deleted_at', start,
+                                                     lookback)]
+
+        rd_context = ctxt.elevated(read_deleted='yes')
+        batch_size = CONF.cells.instance_heal_batch_size
+        for cursor in self.instance_change_cursors:
+            instances = cursor.get_batch(rd_context, batch_size)
+            for instance in instances:
+                # Yield to other greenthreads
+                time.sleep(0)
+                self._sync_instance(ctxt, instance)
+            cursor.ack(instances)
+        self.msg_runner.flush_instance_syncs()
+
     def _sync_instance(self, ctxt, instance):
         """Broadcast an instance_update or instance_destroy message up to
         parent cells.
@@ -191,6 +256,25 @@ class CellsManager(manager.Manager):
         else:
             self.instance_update_at_top(ctxt, instance)
 
+    def _response_values(self, responses):
+        """Yield (response, value) for each response to a broadcast.
+
+        Responses from cells which timed out are skipped if
+        CONF.cells.skip_timed_out_cells is set.  Any other failure is
+        raised.
+        """
+        for response in responses:
+            if response.failure and CONF.cells.skip_timed_out_cells:
+                exc = response.value
+                if isinstance(exc, (tuple, list)):
+                    exc = exc[1]
+                if isinstance(exc, exception.CellTimeout):
+                    LOG.warn(_("Leaving out cell %(cell_name)s which did "
+                               "not respond in time"),
+                             {'cell_name': response.cell_name})
+                    continue
+            yield response, response.value_or_raise()
+
     def schedule_run_instance(self, ctxt, host_sched_kwargs):
         """Pick a cell (possibly ourselves) to build new instance(s)
         and forward the request accordingly.
@@ -260,8 +344,7 @@ class CellsManager(manager.Manager):
         responses = self.msg_runner.service_get_all(ctxt, filters)
         ret_services = []
         # 1 response per cell.  Each response is a list of services.
-        for response in responses:
-            services = response.value_or_raise()
+        for response, services in self._response_values(responses):
             for service in services:
                 cells_utils.add_cell_to_service(service, response.cell_name)
                 ret_services.append(service)
@@ -346,8 +429,7 @@ class CellsManager(manager.Manager):
         # 1 response per cell.  Each response is a list of task log
         # entries.
         ret_task_logs = []
-        for response in responses:
-            task_logs = response.value_or_raise()
+        for response, task_logs in self._response_values(responses):
             for task_log in task_logs:
                 cells_utils.add_cell_to_task_log(task_log,
                                                  response.cell_name)
@@ -371,8 +453,7 @@ class CellsManager(manager.Manager):
         # 1 response per cell.  Each response is a list of compute_node
         # entries.
         ret_nodes = []
-        for response in responses:
-            nodes = response.value_or_raise()
+        for response, nodes in self._response_values(responses):
             for node in nodes:
                 cells_utils.add_cell_to_compute_node(node,
                                                      response.cell_name)
@@ -446,8 +527,8 @@ class CellsManager(manager.Manager):
         responses = self.msg_runner.get_migrations(ctxt, target_cell,
                                                        False, filters)
         migrations = []
-        for response in responses:
-            migrations += response.value_or_raise()
+        for response, cell_migrations in self._response_values(responses):
+            migrations += cell_migrations
         return migrations
 
     def instance_update_from_api(self, ctxt, instance, expected_vm_state,
@@ -27,8 +27,10 @@ reached.
 The interface into this module is the MessageRunner class.
 """
 import sys
+import time
 import traceback
 
+from eventlet import greenthread
 from eventlet import queue
 from oslo.config import cfg
 from oslo import messaging
@@ -64,7 +66,19 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.IntOpt('instance_sync_batch_size',
+            default=0,
+            help='Maximum number of instance updates and destroys to send '
+                 'up to parent cells in a single message. Updates for the '
+                 'same instance within a batch replace each other. 0 or 1 '
+                 'sends every update in its own message. Parent cells must '
+                 'be upgraded before this is enabled.'),
+    cfg.FloatOpt('instance_sync_batch_latency',
+            default=1.0,
+            help='Maximum number of seconds an instance update or destroy '
+                 'waits in a batch before the batch is sent up to parent '
+                 'cells.')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -77,6 +91,10 @@ LOG = logging.getLogger(__name__)
 # path.
 _PATH_CELL_SEP = cells_utils.PATH_CELL_SEP
 
+# Share of its own time left that a cell gives its neighbors to respond to
+# a broadcast, keeping the rest to pass their responses back in time.
+_NEIGHBOR_TIMEOUT_SHARE = 0.9
+
 
 def _reverse_path(path):
     """Reverse a path.  Used for sending responses upstream."""
@@ -229,7 +247,8 @@ class _BaseMessage(object):
         wait_time = CONF.cells.call_timeout
         try:
             for x in xrange(num_responses):
-                json_responses = self.resp_queue.get(timeout=wait_time)
+                _sender, json_responses = self.resp_queue.get(
+                        timeout=wait_time)
                 responses.extend(json_responses)
         except queue.Empty:
             raise exception.CellTimeout()
@@ -452,13 +471,21 @@ class _BroadcastMessage(_BaseMessage):
     message_type = 'broadcast'
 
     def __init__(self, msg_runner, ctxt, method_name, method_kwargs,
-            direction, run_locally=True, **kwargs):
+            direction, run_locally=True, timeout=None, **kwargs):
         super(_BroadcastMessage, self).__init__(msg_runner, ctxt,
                 method_name, method_kwargs, direction, **kwargs)
         # The local cell creating this message has the option
         # to be able to process the message locally or not.
         self.run_locally = run_locally
         self.is_broadcast = True
+        # NOTE: The seconds left to respond.  Each hop passes on less than
+        # it has, so that a cell gives up on its neighbors before the cell
+        # waiting on it does.  Messages from cells which do not send it get
+        # the full call_timeout.
+        if timeout is None:
+            timeout = CONF.cells.call_timeout
+        self.timeout = timeout
+        self.base_attrs_to_json.append('timeout')
 
     def _get_next_hops(self):
         """Set the next hops and return the number of hops.  The next
@@ -476,6 +503,41 @@ class _BroadcastMessage(_BaseMessage):
         for cell in target_cells:
             cell.send_message(self)
 
+    def _wait_for_neighbor_responses(self, next_hops, deadline):
+        """Wait until deadline for the JSON-ified responses from each of
+        next_hops, and combine them into a single list.
+
+        A neighbor that has not responded by the deadline gets a CellTimeout
+        failure response of its own, so the responses that did arrive are
+        still returned.  Responses are relayed as they were received,
+        without decoding them.
+        """
+        responses = []
+        pending = set(hop.name for hop in next_hops)
+        try:
+            while pending:
+                wait_time = max(deadline - time.time(), 0)
+                sender, json_responses = self.resp_queue.get(
+                        timeout=wait_time)
+                pending.discard(sender)
+                responses.extend(json_responses)
+        except queue.Empty:
+            LOG.warn(_("Timed out waiting for responses to %(method)s from "
+                       "cells: %(cells)s"),
+                     {'method': self.method_name,
+                      'cells': ', '.join(sorted(pending))})
+            try:
+                raise exception.CellTimeout()
+            except exception.CellTimeout:
+                exc_info = sys.exc_info()
+            for cell_name in sorted(pending):
+                cell_path = self.routing_path + _PATH_CELL_SEP + cell_name
+                response = Response(cell_path, exc_info, True)
+                responses.append(response.to_json())
+        finally:
+            self._cleanup_response_queue()
+        return responses
+
     def _send_json_responses(self, json_responses):
         """Responses to broadcast messages always need to go to the
         neighbor cell from which we received this message.  That
@@ -525,6 +587,11 @@ class _BroadcastMessage(_BaseMessage):
 
         # We'll need to aggregate all of the responses (from ourself
         # and our sibling cells) into 1 response
+        # NOTE: Our neighbors are already working on the message while we
+        # process it locally, so the time we spend on it counts towards the
+        # deadline for their responses.
+        deadline = time.time() + self.timeout
+        self.timeout = self.timeout * _NEIGHBOR_TIMEOUT_SHARE
         try:
             self._setup_response_queue()
             self._send_to_cells(next_hops)
@@ -544,8 +611,8 @@ class _BroadcastMessage(_BaseMessage):
             local_response = None
 
         try:
-            remote_responses = self._wait_for_json_responses(
-                    num_responses=len(next_hops))
+            remote_responses = self._wait_for_neighbor_responses(next_hops,
+                                                                 deadline)
         except Exception as exc:
             # Error waiting for responses, most likely a timeout.
             # Send a single response back with the failure.
@@ -641,8 +708,11 @@ class _ResponseMessageMethods(_BaseMessageMethods):
     eventlet queue to signal the caller that's waiting.
     """
     def parse_responses(self, message, orig_message, responses):
+        # NOTE: The response was created by the first cell in its
+        # routing_path.  Broadcast responses come from our neighbors.
+        sender = message.routing_path.split(_PATH_CELL_SEP)[0]
         self.msg_runner._put_response(message.response_uuid,
-                responses)
+                responses, sender=sender)
 
 
 class _TargetedMessageMethods(_BaseMessageMethods):
@@ -1075,6 +1145,23 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
         except exception.InstanceNotFound:
             pass
 
+    def instance_sync_batch_at_top(self, message, syncs, **kwargs):
+        """Apply a batch of instance updates and destroys if we're a top
+        level cell.
+        """
+        if not self._at_the_top():
+            return
+        LOG.debug(_("Got batch of %(count)d instance syncs"),
+                  {'count': len(syncs)})
+        for sync in syncs:
+            method = getattr(self, sync['method'])
+            try:
+                method(message, sync['instance'])
+            except Exception:
+                LOG.exception(_("Failed to apply %(method)s from batch"),
+                              {'method': sync['method']},
+                              instance_uuid=sync['instance'].get('uuid'))
+
     def instance_delete_everywhere(self, message, instance, delete_type,
                                    **kwargs):
         """Call compute API delete() or soft_delete() in every cell.
@@ -1267,6 +1354,11 @@ class MessageRunner(object):
         for msg_type, cls in _CELL_MESSAGE_TYPE_TO_METHODS_CLS.iteritems():
             self.methods_by_type[msg_type] = cls(self)
         self.serializer = objects_base.NovaObjectSerializer()
+        # NOTE: Instance updates and destroys waiting to be sent up in a
+        # batch, by instance uuid, and the order in which they arrived.
+        self._instance_syncs = {}
+        self._instance_sync_order = []
+        self._instance_sync_timer = None
 
     def _process_message_locally(self, message):
         """Message processing will call this when its determined that
@@ -1279,17 +1371,18 @@ class MessageRunner(object):
         fn = getattr(methods, message.method_name)
         return fn(message, **message.method_kwargs)
 
-    def _put_response(self, response_uuid, response):
+    def _put_response(self, response_uuid, response, sender=None):
         """Put a response into a response queue.  This is called when
         a _ResponseMessage is processed in the cell that initiated a
-        'call' to another cell.
+        'call' to another cell.  sender is the name of the cell that sent
+        the response.
         """
         resp_queue = self.response_queues.get(response_uuid)
         if not resp_queue:
             # Response queue is gone.  We must have restarted or we
             # received a response after our timeout period.
             return
-        resp_queue.put(response)
+        resp_queue.put((sender, response))
 
     def _setup_response_queue(self, message):
         """Set up an eventlet queue to use to wait for replies.
@@ -1434,19 +1527,60 @@ class MessageRunner(object):
                                    cell_name, need_response=call)
         return message.process()
 
-    def instance_update_at_top(self, ctxt, instance):
-        """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
+    def _sync_instance_at_top(self, ctxt, method, instance):
+        """Send an instance update or destroy up to the top level cell,
+        batching it with others if CONF.cells.instance_sync_batch_size is
+        set.
+        """
+        batch_size = CONF.cells.instance_sync_batch_size
+        if batch_size <= 1:
+            message = _BroadcastMessage(self, ctxt, method,
+                                        dict(instance=instance), 'up',
+                                        run_locally=False)
+            message.process()
+            return
+
+        instance_uuid = instance['uuid']
+        if instance_uuid not in self._instance_syncs:
+            self._instance_sync_order.append(instance_uuid)
+        # NOTE: Only the latest update or destroy for an instance is sent.
+        self._instance_syncs[instance_uuid] = dict(method=method,
+                                                   instance=instance)
+        if len(self._instance_syncs) >= batch_size:
+            self.flush_instance_syncs()
+        elif self._instance_sync_timer is None:
+            self._instance_sync_timer = greenthread.spawn_after(
+                    CONF.cells.instance_sync_batch_latency,
+                    self.flush_instance_syncs)
+
+    def flush_instance_syncs(self):
+        """Send the batch of pending instance updates and destroys up to
+        the top level cell.
+        """
+        if self._instance_sync_timer is not None:
+            self._instance_sync_timer.cancel()
+            self._instance_sync_timer = None
+        if not self._instance_sync_order:
+            return
+        syncs = [self._instance_syncs[instance_uuid]
+                 for instance_uuid in self._instance_sync_order]
+        self._instance_syncs = {}
+        self._instance_sync_order = []
+        # NOTE: The batch mixes updates made with different request
+        # contexts, so it is sent with an admin context.
+        ctxt = context.get_admin_context()
+        message = _BroadcastMessage(self, ctxt, 'instance_sync_batch_at_top',
+                                    dict(syncs=syncs), 'up',
                                     run_locally=False)
         message.process()
 
+    def instance_update_at_top(self, ctxt, instance):
+        """Update an instance at the top level cell."""
+        self._sync_instance_at_top(ctxt, 'instance_update_at_top', instance)
+
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._sync_instance_at_top(ctxt, 'instance_destroy_at_top', instance)
 
     def instance_delete_everywhere(self, ctxt, instance, delete_type):
         """This is used by API cell when it didn't know what cell
@@ -16,6 +16,7 @@
 """
 CellState Manager
 """
+import bisect
 import copy
 import datetime
 import functools
@@ -140,6 +141,60 @@ def sync_after(f):
     return wrapper
 
 
+class FreeCapacity(object):
+    """Free capacity of one resource across the compute hosts in a cell.
+
+    Hosts are updated one at a time, and the usable free capacity of every
+    host is kept sorted, so that the number of instances of a given size
+    which fit in the cell can be counted without visiting every host.
+    """
+
+    def __init__(self):
+        self.total_free = 0
+        self._by_host = {}
+        self._usable = []
+
+    def update_host(self, host, free, usable):
+        """Set the free and usable (free minus reserved) capacity of a
+        host.
+        """
+        old = self._by_host.get(host)
+        if old == (free, usable):
+            return
+        if old is not None:
+            self._remove(old)
+        self._by_host[host] = (free, usable)
+        self.total_free += free
+        bisect.insort(self._usable, usable)
+
+    def remove_host(self, host):
+        old = self._by_host.pop(host, None)
+        if old is not None:
+            self._remove(old)
+
+    def _remove(self, old):
+        self.total_free -= old[0]
+        del self._usable[bisect.bisect_left(self._usable, old[1])]
+
+    def hosts(self):
+        return self._by_host.keys()
+
+    def units(self, per_inst):
+        """Return how many instances needing per_inst fit in the cell."""
+        usable = self._usable
+        if not per_inst or not usable:
+            return 0
+        max_units = int(usable[-1] / per_inst)
+        if max_units > len(usable):
+            return sum(int(free / per_inst) for free in usable)
+        # NOTE: Each host fits one instance for every multiple of per_inst
+        # up to its usable capacity, so count the hosts with at least
+        # 1, 2, ... times per_inst free.
+        num_hosts = len(usable)
+        return sum(num_hosts - bisect.bisect_left(usable, units * per_inst)
+                   for units in xrange(1, max_units + 1))
+
+
 _unset = object()
 
 
@@ -168,6 +223,8 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        self._ram_capacity = FreeCapacity()
+        self._disk_capacity = FreeCapacity()
 
         self._cell_data_sync(force=True)
 
@@ -251,39 +308,34 @@ class CellStateManager(base.Base):
             ctxt = context.get_admin_context()
 
         reserve_level = CONF.cells.reserve_percent / 100.0
-        compute_hosts = {}
+        compute_hosts = set()
+
+        def _usable(total, free):
+            return max(0, free - total * reserve_level)
+
+        # NOTE: The free capacity of each host is kept between runs, and
+        # only the hosts which changed are updated.
+        for compute in self.db.compute_node_get_all(ctxt):
+            service = compute['service']
+            if not service or service['disabled']:
+                continue
+            host = service['host']
+            compute_hosts.add(host)
+            free_ram_mb = compute['free_ram_mb']
+            free_disk_mb = compute['free_disk_gb'] * 1024
+            self._ram_capacity.update_host(host, free_ram_mb,
+                    _usable(compute['memory_mb'], free_ram_mb))
+            self._disk_capacity.update_host(host, free_disk_mb,
+                    _usable(compute['local_gb'] * 1024, free_disk_mb))
+
+        for capacity in (self._ram_capacity, self._disk_capacity):
+            for host in set(capacity.hosts()) - compute_hosts:
+                capacity.remove_host(host)
 
-        def _get_compute_hosts():
-            compute_nodes = self.db.compute_node_get_all(ctxt)
-            for compute in compute_nodes:
-                service = compute['service']
-                if not service or service['disabled']:
-                    continue
-                host = service['host']
-                compute_hosts[host] = {
-                        'free_ram_mb': compute['free_ram_mb'],
-                        'free_disk_mb': compute['free_disk_gb'] * 1024,
-                        'total_ram_mb': compute['memory_mb'],
-                        'total_disk_mb': compute['local_gb'] * 1024}
-
-        _get_compute_hosts()
         if not compute_hosts:
             self.my_cell_state.update_capacities({})
             return
 
-        ram_mb_free_units = {}
-        disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
-
-        def _free_units(total, free, per_inst):
-            if per_inst:
-                min_free = total * reserve_level
-                free = max(0, free - min_free)
-                return int(free / per_inst)
-            else:
-                return 0
-
         instance_types = self.db.flavor_get_all(ctxt)
         memory_mb_slots = frozenset(
                 [inst_type['memory_mb'] for inst_type in instance_types])
@@ -291,20 +343,15 @@ class CellStateManager(base.Base):
                 [(inst_type['root_gb'] + inst_type['ephemeral_gb']) * units.Ki
                     for inst_type in instance_types])
 
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for memory_mb_slot in memory_mb_slots:
-                ram_mb_free_units.setdefault(str(memory_mb_slot), 0)
-                free_units = _free_units(compute_values['total_ram_mb'],
-                        compute_values['free_ram_mb'], memory_mb_slot)
-                ram_mb_free_units[str(memory_mb_slot)] += free_units
-            for disk_mb_slot in disk_mb_slots:
-                disk_mb_free_units.setdefault(str(disk_mb_slot), 0)
-                free_units = _free_units(compute_values['total_disk_mb'],
-                        compute_values['free_disk_mb'], disk_mb_slot)
-                disk_mb_free_units[str(disk_mb_slot)] += free_units
+        ram_mb_free_units = dict(
+                (str(slot), self._ram_capacity.units(slot))
+                for slot in memory_mb_slots)
+        disk_mb_free_units = dict(
+                (str(slot), self._disk_capacity.units(slot))
+                for slot in disk_mb_slots)
 
+        total_ram_mb_free = self._ram_capacity.total_free
+        total_disk_mb_free = self._disk_capacity.total_free
         capacities = {'ram_free': {'total_mb': total_ram_mb_free,
                                    'units_by_mb': ram_mb_free_units},
                       'disk_free': {'total_mb': total_disk_mb_free,
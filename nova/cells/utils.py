@@ -16,9 +16,11 @@
 """
 Cells Utility Methods
 """
+import datetime
 import random
 
 from nova import db
+from nova.openstack.common import timeutils
 
 # Separator used between cell names for the 'full cell name' and routing
 # path
@@ -54,6 +56,59 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
             yield instance
 
 
+class InstanceChangeCursor(object):
+    """Position in the stream of instance changes ordered by one of the
+    'updated_at' or 'deleted_at' columns.
+
+    The position is the largest column value sent so far.  Timestamps can
+    be as coarse as a second, and a transaction can commit after others
+    with later timestamps, so every batch is read from lookback seconds
+    before the position.  A change read again is only left out if it was
+    sent once its timestamp was more than lookback seconds old.  Until
+    then the instance may still change again at the same timestamp, so it
+    is sent again.  Instances whose column is NULL are not part of the
+    stream.
+    """
+
+    _filter_names = {'updated_at': 'changes-since',
+                     'deleted_at': 'deleted-since'}
+
+    def __init__(self, column, position, lookback=0):
+        self.column = column
+        self.position = position
+        self.lookback = datetime.timedelta(seconds=lookback)
+        # NOTE: The (uuid, timestamp) of the changes in the lookback window
+        # which were sent after their timestamp had settled.
+        self.settled = set()
+
+    def get_batch(self, context, limit):
+        """Return up to limit instances changed since lookback seconds
+        before the position, oldest change first, leaving out the changes
+        already sent once settled.  The position does not move until ack()
+        is called with the instances that were sent.
+        """
+        filters = {self._filter_names[self.column]:
+                   self.position - self.lookback}
+        instances = db.instance_get_all_by_filters(
+                context, filters, self.column, 'asc',
+                limit=limit + len(self.settled))
+        return [instance for instance in instances
+                if (instance['uuid'], instance[self.column])
+                not in self.settled][:limit]
+
+    def ack(self, instances):
+        """Move the position past instances returned by get_batch()."""
+        settled_until = timeutils.utcnow() - self.lookback
+        for instance in instances:
+            changed_at = instance[self.column]
+            self.position = max(self.position, changed_at)
+            if changed_at <= settled_until:
+                self.settled.add((instance['uuid'], changed_at))
+        window_start = self.position - self.lookback
+        self.settled = set(change for change in self.settled
+                           if change[1] >= window_start)
+
+
 def cell_with_item(cell_name, item):
     """Turn cell_name and item into <cell_name>@<item>."""
     if cell_name is None:
@@ -18,7 +18,9 @@ import sys
 
 from oslo.config import cfg
 
+from nova.conductor import dbpool
 from nova import config
+from nova.db import api as db_api
 from nova import objects
 from nova.openstack.common import log as logging
 from nova.openstack.common.report import guru_meditation_report as gmr
@@ -28,6 +30,10 @@ from nova import version
 
 CONF = cfg.CONF
 CONF.import_opt('topic', 'nova.conductor.api', group='conductor')
+CONF.import_opt('db_thread_pool_size', 'nova.conductor.api',
+                group='conductor')
+CONF.import_opt('db_thread_pool_max_queue', 'nova.conductor.api',
+                group='conductor')
 
 
 def main():
@@ -38,6 +44,11 @@ def main():
 
     gmr.TextGuruMeditation.setup_autorun(version)
 
+    if CONF.conductor.db_thread_pool_size > 0:
+        db_api.IMPL = dbpool.ThreadPoolDBAPI(
+            db_api.IMPL, CONF.conductor.db_thread_pool_size,
+            max_queue=CONF.conductor.db_thread_pool_max_queue)
+
     server = service.Service.create(binary='nova-conductor',
                                     topic=CONF.conductor.topic,
                                     manager=CONF.conductor.manager)
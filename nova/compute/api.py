@@ -25,6 +25,7 @@ import re
 import string
 import uuid
 
+import eventlet
 from oslo.config import cfg
 import six
 
@@ -44,6 +45,7 @@ from nova.db import base
 from nova import exception
 from nova import hooks
 from nova.image import glance
+from nova import metadata_cache
 from nova import network
 from nova.network import model as network_model
 from nova.network.security_group import openstack_driver
@@ -118,6 +120,14 @@ compute_opts = [
                      'in a local image being created on the hypervisor node. '
                      'Setting this to 0 means nova will allow only '
                      'boot from volume. A negative number means unlimited.'),
+    cfg.IntOpt('image_precache_concurrency',
+               default=4,
+               help='Maximum number of compute hosts that download an '
+                    'image at the same time when it is pre-cached'),
+    cfg.IntOpt('image_precache_timeout',
+               default=600,
+               help='Seconds to wait for a compute host to finish '
+                    'pre-caching an image'),
 ]
 
 
@@ -2946,6 +2956,7 @@ class API(base.Base):
     def delete_instance_metadata(self, context, instance, key):
         """Delete the given metadata item from an instance."""
         instance.delete_metadata_key(key)
+        metadata_cache.invalidate(instance['uuid'])
         self.compute_rpcapi.change_instance_metadata(context,
                                                      instance=instance,
                                                      diff={key: ['-']})
@@ -2973,6 +2984,7 @@ class API(base.Base):
         self._check_metadata_properties_quota(context, _metadata)
         instance.metadata = _metadata
         instance.save()
+        metadata_cache.invalidate(instance['uuid'])
         diff = _diff_dict(orig, instance.metadata)
         self.compute_rpcapi.change_instance_metadata(context,
                                                      instance=instance,
@@ -3110,6 +3122,40 @@ class API(base.Base):
                 context, instances_by_host[host], events_by_host[host])
 
 
+def _precache_image(context, rpcapi, image_id, hosts):
+    """Ask hosts to cache an image, a few hosts at a time.
+
+    Returns a dict of the hosts which downloaded the image, already had it,
+    or failed.
+    """
+    results = {'downloaded': [], 'cached': [], 'failed': []}
+
+    def cache_on_host(host):
+        try:
+            fetched = rpcapi.cache_image(
+                context, host, image_id,
+                timeout=CONF.image_precache_timeout)
+        except Exception:
+            LOG.exception(_('Failed to pre-cache image %(image_id)s on '
+                            '%(host)s'), {'image_id': image_id, 'host': host})
+            results['failed'].append(host)
+            return
+        results['downloaded' if fetched else 'cached'].append(host)
+
+    pool = eventlet.GreenPool(max(1, CONF.image_precache_concurrency))
+    for host in hosts:
+        pool.spawn_n(cache_on_host, host)
+    pool.waitall()
+
+    LOG.info(_('Pre-cached image %(image_id)s: downloaded on %(downloaded)d '
+               'hosts, already cached on %(cached)d, failed on %(failed)d'),
+             {'image_id': image_id,
+              'downloaded': len(results['downloaded']),
+              'cached': len(results['cached']),
+              'failed': len(results['failed'])})
+    return results
+
+
 class HostAPI(base.Base):
     """Sub-set of the Compute Manager API for managing host operations."""
 
@@ -3180,6 +3226,16 @@ class HostAPI(base.Base):
                                                payload)
         return result
 
+    def cache_image(self, context, image_id, hosts):
+        """Start pre-caching an image on the given compute hosts.
+
+        The hosts download the image in the background, so this returns as
+        soon as the image and hosts have been checked.
+        """
+        hosts = [self._assert_host_exists(context, host) for host in hosts]
+        glance.get_default_image_service().show(context, image_id)
+        utils.spawn_n(_precache_image, context, self.rpcapi, image_id, hosts)
+
     def service_get_all(self, context, filters=None, set_zones=False):
         """Returns a list of services, optionally filtering the results.
 
@@ -3359,6 +3415,13 @@ class AggregateAPI(base.Base):
         aggregate = aggregate_obj.Aggregate.get_by_id(context, aggregate_id)
         return self._reformat_aggregate_info(aggregate)
 
+    def cache_image(self, context, aggregate_id, image_id):
+        """Start pre-caching an image on every host in an aggregate."""
+        aggregate = aggregate_obj.Aggregate.get_by_id(context, aggregate_id)
+        glance.get_default_image_service().show(context, image_id)
+        utils.spawn_n(_precache_image, context, self.compute_rpcapi,
+                      image_id, list(aggregate.hosts))
+
     def get_aggregate_list(self, context):
         """Get all the aggregates."""
         aggregates = aggregate_obj.AggregateList.get_all(context)
@@ -3808,6 +3871,7 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_add_security_group(context.elevated(),
                                             instance_uuid,
                                             security_group['id'])
+        metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -3831,6 +3895,7 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_remove_security_group(context.elevated(),
                                                instance_uuid,
                                                security_group['id'])
+        metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -103,6 +103,7 @@ class RPCClientCellsProxy(object):
         self.version_cap = version_cap
         self._server = None
         self._version = None
+        self._timeout = None
 
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
 
@@ -112,6 +113,7 @@ class RPCClientCellsProxy(object):
 
         server = kwargs.pop('server', None)
         version = kwargs.pop('version', None)
+        timeout = kwargs.pop('timeout', None)
 
         if kwargs:
             raise ValueError("Unsupported kwargs: %s" % kwargs.keys())
@@ -120,6 +122,8 @@ class RPCClientCellsProxy(object):
             ret._server = server
         if version:
             ret._version = version
+        if timeout:
+            ret._timeout = timeout
 
         return ret
 
@@ -158,7 +162,8 @@ class RPCClientCellsProxy(object):
         msg = self._make_msg(method, **kwargs)
         topic = self._get_topic()
         return self.cells_rpcapi.proxy_rpc_to_manager(ctxt, msg,
-                                                      topic, call=True)
+                                                      topic, call=True,
+                                                      timeout=self._timeout)
 
 
 class ComputeRPCProxyAPI(compute_rpcapi.ComputeAPI):
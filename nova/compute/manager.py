@@ -41,6 +41,7 @@ import eventlet.timeout
 from oslo.config import cfg
 from oslo import messaging
 
+from nova.api.metadata import base as instance_metadata
 from nova import block_device
 from nova.cells import rpcapi as cells_rpcapi
 from nova.cloudpipe import pipelib
@@ -220,6 +221,7 @@ CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 CONF.import_opt('image_cache_manager_interval', 'nova.virt.imagecache')
 CONF.import_opt('enabled', 'nova.rdp', group='rdp')
 CONF.import_opt('html5_proxy_base_url', 'nova.rdp', group='rdp')
+CONF.import_opt('metadata_cache_warming', 'nova.api.metadata.base')
 
 LOG = logging.getLogger(__name__)
 
@@ -572,7 +574,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='3.23')
+    target = messaging.Target(version='3.24')
 
     def __init__(self, compute_driver=None, *args, **kwargs):
         """Load configuration options and connect to the hypervisor."""
@@ -1775,8 +1777,26 @@ class ComputeManager(manager.Manager):
         network_info.wait(do_raise=True)
         instance.info_cache.network_info = network_info
         instance.save(expected_task_state=task_states.SPAWNING)
+        self._warm_metadata_cache(instance, network_info)
         return instance
 
+    def _warm_metadata_cache(self, instance, network_info):
+        """Cache the metadata lookups of a newly active instance in the
+        background, ready for its first metadata requests.
+        """
+        if not CONF.metadata_cache_warming:
+            return
+
+        def _warm():
+            try:
+                instance_metadata.warm_lookup_cache(
+                    instance, network_info, conductor_api=self.conductor_api)
+            except Exception:
+                LOG.exception(_('Failed to warm the metadata cache'),
+                              instance=instance)
+
+        utils.spawn_n(_warm)
+
     def _notify_about_instance_usage(self, context, instance, event_suffix,
                                      network_info=None, system_metadata=None,
                                      extra_usage_info=None, fault=None):
@@ -1982,6 +2002,7 @@ class ComputeManager(manager.Manager):
 
 
         instance.save(expected_task_state=task_states.SPAWNING)
+        self._warm_metadata_cache(instance, network_info)
 
     @contextlib.contextmanager
     def _build_resources(self, context, instance, requested_networks,
@@ -5640,6 +5661,12 @@ class ComputeManager(manager.Manager):
             else:
                 self._process_instance_event(instance, event)
 
+    @wrap_exception()
+    def cache_image(self, context, image_id):
+        """Download an image into the local image cache ahead of use."""
+        LOG.info(_('Pre-caching image %s'), image_id)
+        return self.driver.cache_image(context, image_id)
+
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
     def _run_image_cache_manager_pass(self, context):
@@ -408,6 +408,9 @@ class ResourceTracker(object):
 
         LOG.debug(_("Hypervisor: free ram (MB): %s") % free_ram_mb)
         LOG.debug(_("Hypervisor: free disk (GB): %s") % free_disk_gb)
+        if resources.get('local_gb_pending_wipe'):
+            LOG.debug(_("Hypervisor: disk pending wipe (GB): %s") %
+                      resources['local_gb_pending_wipe'])
 
         vcpus = resources['vcpus']
         if vcpus:
@@ -604,8 +607,11 @@ class ResourceTracker(object):
         # purge old stats
         self.stats.clear()
 
-        # set some initial values, reserve room for host/hypervisor:
-        resources['local_gb_used'] = CONF.reserved_host_disk_mb / 1024
+        # set some initial values, reserve room for host/hypervisor and for
+        # deleted instance disks the hypervisor has not freed yet:
+        resources['local_gb_used'] = (CONF.reserved_host_disk_mb / 1024 +
+                                      resources.pop('local_gb_pending_wipe',
+                                                    0))
         resources['memory_mb_used'] = CONF.reserved_host_memory_mb
         resources['vcpus_used'] = 0
         resources['free_ram_mb'] = (resources['memory_mb'] -
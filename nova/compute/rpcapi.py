@@ -241,6 +241,7 @@ class ComputeAPI(object):
         3.21 - Made rebuild take new-world BDM objects
         3.22 - Made terminate_instance take new-world BDM objects
         3.23 - Added external_instance_event()
+        3.24 - Added cache_image()
     '''
 
     VERSION_ALIASES = {
@@ -968,6 +969,11 @@ class ComputeAPI(object):
         cctxt.cast(ctxt, 'external_instance_event', instances=instances,
                    events=events)
 
+    def cache_image(self, ctxt, host, image_id, timeout=None):
+        cctxt = self.client.prepare(server=host, version='3.24',
+                                    timeout=timeout)
+        return cctxt.call(ctxt, 'cache_image', image_id=image_id)
+
 
 class SecurityGroupAPI(object):
     '''Client side of the security group rpc API.
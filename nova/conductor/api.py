@@ -36,7 +36,17 @@ conductor_opts = [
                help='Full class name for the Manager for conductor'),
     cfg.IntOpt('workers',
                help='Number of workers for OpenStack Conductor service. '
-                    'The default will be the number of CPUs available.')
+                    'The default will be the number of CPUs available.'),
+    cfg.IntOpt('db_thread_pool_size',
+               default=0,
+               help='Number of native threads each conductor worker uses to '
+                    'run database calls. 0 runs database calls in the '
+                    'calling greenthread.'),
+    cfg.IntOpt('db_thread_pool_max_queue',
+               default=0,
+               help='Maximum number of database calls allowed to wait for a '
+                    'free thread when db_thread_pool_size is set. Further '
+                    'calls are rejected. 0 means no limit.'),
 ]
 conductor_group = cfg.OptGroup(name='conductor',
                                title='Conductor Options')
@@ -217,6 +227,14 @@ class LocalAPI(object):
     def service_update(self, context, service, values):
         return self._manager.service_update(context, service, values)
 
+    def service_heartbeat(self, context, service):
+        """Record a heartbeat from a service.
+
+        Returns None, or the updated service if the heartbeat had to be
+        sent to an old conductor as a full service_update().
+        """
+        return self._manager.service_heartbeat(context, service['id'])
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         return self._manager.task_log_get(context, task_name, begin, end,
                                           host, state)
@@ -363,6 +381,14 @@ class API(LocalAPI):
         return self._manager.instance_update(context, instance_uuid,
                                              updates, 'conductor')
 
+    def service_heartbeat(self, context, service):
+        """Record a heartbeat from a service.
+
+        Returns None, or the updated service if the heartbeat had to be
+        sent to an old conductor as a full service_update().
+        """
+        return self._manager.service_heartbeat(context, service)
+
 
 class ComputeTaskAPI(object):
     """ComputeTask API that queues up compute tasks for nova-conductor."""
@@ -0,0 +1,132 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Thread pool execution of DB API calls for nova-conductor.
+
+The conductor serves every database access made on behalf of compute
+nodes.  With a C database driver such as MySQLdb each query blocks the
+whole process, because eventlet cannot switch greenthreads while the
+driver is waiting on the server.  ThreadPoolDBAPI wraps the DB API
+backend so that each call runs on a native thread from eventlet's tpool,
+with a bounded number of callers allowed to wait for a free thread, and
+keeps per-method statistics about the calls it has executed.
+"""
+
+import time
+
+from eventlet import semaphore
+from eventlet import tpool
+
+from nova import exception
+
+
+class MethodStats(object):
+    """Counters for a single DB API method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.active = 0
+        self.max_active = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_wait = 0.0
+
+    def to_dict(self):
+        avg = self.total_time / self.calls if self.calls else 0.0
+        avg_wait = self.total_wait / self.calls if self.calls else 0.0
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'active': self.active,
+                'max_active': self.max_active,
+                'total_time': self.total_time,
+                'avg_time': avg,
+                'max_time': self.max_time,
+                'avg_wait': avg_wait}
+
+
+class ThreadPoolDBAPI(object):
+    """Run the methods of a DB API object on a native thread pool.
+
+    At most pool_size calls execute at the same time.  Callers beyond that
+    wait in a queue; once max_queue callers are waiting, further calls are
+    rejected with ConductorDBQueueFull.  A max_queue of 0 leaves the queue
+    unbounded.
+    """
+
+    def __init__(self, db_api, pool_size, max_queue=0):
+        self._db_api = db_api
+        self._pool_size = pool_size
+        self._max_queue = max_queue
+        self._slots = semaphore.Semaphore(pool_size)
+        self._waiting = 0
+        self._max_waiting = 0
+        self._rejected = 0
+        self._method_stats = {}
+        tpool.set_num_threads(pool_size)
+
+    def __getattr__(self, key):
+        attr = getattr(self._db_api, key)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._execute(key, attr, *args, **kwargs)
+        return call
+
+    def _execute(self, name, func, *args, **kwargs):
+        stats = self._method_stats.get(name)
+        if stats is None:
+            stats = self._method_stats.setdefault(name, MethodStats())
+
+        queued_at = time.time()
+        if self._slots.locked():
+            if self._max_queue and self._waiting >= self._max_queue:
+                self._rejected += 1
+                raise exception.ConductorDBQueueFull(method=name,
+                                                     depth=self._waiting)
+            self._waiting += 1
+            self._max_waiting = max(self._max_waiting, self._waiting)
+            try:
+                self._slots.acquire()
+            finally:
+                self._waiting -= 1
+        else:
+            self._slots.acquire()
+
+        started_at = time.time()
+        stats.calls += 1
+        stats.active += 1
+        stats.max_active = max(stats.max_active, stats.active)
+        stats.total_wait += started_at - queued_at
+        try:
+            return tpool.execute(func, *args, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.time() - started_at
+            stats.active -= 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            self._slots.release()
+
+    def get_stats(self):
+        """Return a snapshot of the pool and per-method statistics."""
+        return {'pool_size': self._pool_size,
+                'max_queue': self._max_queue,
+                'queue_depth': self._waiting,
+                'max_queue_depth': self._max_waiting,
+                'rejected': self._rejected,
+                'methods': dict((name, stats.to_dict())
+                                for name, stats
+                                in self._method_stats.items())}
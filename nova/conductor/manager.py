@@ -14,6 +14,8 @@
 
 """Handles database requests from other nova services."""
 
+from eventlet import greenthread
+from oslo.config import cfg
 from oslo import messaging
 import six
 
@@ -25,7 +27,11 @@ from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
+from nova.conductor import dbpool
+from nova.conductor import readcache
 from nova.conductor.tasks import live_migrate
+from nova import context as nova_context
+from nova.db import api as db_api
 from nova.db import base
 from nova import exception
 from nova.image import glance
@@ -41,11 +47,34 @@ from nova.openstack.common import excutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import periodic_task
 from nova.openstack.common import timeutils
 from nova import quota
 from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova.scheduler import utils as scheduler_utils
 
+conductor_manager_opts = [
+    cfg.IntOpt('db_stats_interval',
+               default=600,
+               help='Interval in seconds for logging conductor database call '
+                    'and read cache statistics, when they are enabled. Set '
+                    'to 0 to disable.'),
+    cfg.IntOpt('read_cache_ttl',
+               default=0,
+               help='Number of seconds to cache the results of frequent '
+                    'read-only conductor calls such as flavor, aggregate '
+                    'and service lookups. 0 disables the cache.'),
+    cfg.IntOpt('read_cache_max_entries',
+               default=10000,
+               help='Maximum number of results kept in the conductor read '
+                    'cache. 0 means no limit.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(conductor_manager_opts, group='conductor')
+CONF.import_opt('heartbeat_flush_window', 'nova.servicegroup.api',
+                group='conductor')
+
 LOG = logging.getLogger(__name__)
 
 # Instead of having a huge list of arguments to instance_update(), we just
@@ -63,6 +92,13 @@ allowed_updates = ['task_state', 'vm_state', 'expected_task_state',
 # Fields that we want to convert back into a datetime object.
 datetime_fields = ['launched_at', 'terminated_at', 'updated_at']
 
+# Read cache groups invalidated by object actions on each object type.
+object_cache_groups = {'Aggregate': ('aggregate',),
+                       'ComputeNode': ('service',),
+                       'Flavor': ('flavor',),
+                       'Service': ('service',),
+                       }
+
 
 class ConductorManager(manager.Manager):
     """Mission: Conduct things.
@@ -90,6 +126,13 @@ class ConductorManager(manager.Manager):
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
         self.additional_endpoints.append(self.compute_task_mgr)
         self.additional_endpoints.append(_ConductorManagerV2Proxy(self))
+        self._heartbeats = {}
+        self._heartbeat_timer = None
+        self.read_cache = None
+        if CONF.conductor.read_cache_ttl > 0:
+            self.read_cache = readcache.ReadCache(
+                CONF.conductor.read_cache_ttl,
+                max_entries=CONF.conductor.read_cache_max_entries)
 
     @property
     def network_api(self):
@@ -106,6 +149,46 @@ class ConductorManager(manager.Manager):
             self._compute_api = compute_api.API()
         return self._compute_api
 
+    def get_db_stats(self):
+        """Return DB call statistics, or None without a DB thread pool."""
+        if isinstance(db_api.IMPL, dbpool.ThreadPoolDBAPI):
+            return db_api.IMPL.get_stats()
+
+    def get_read_cache_stats(self):
+        """Return read cache statistics, or None without a read cache."""
+        if self.read_cache is not None:
+            return self.read_cache.get_stats()
+
+    @periodic_task.periodic_task(
+        spacing=CONF.conductor.db_stats_interval or -1)
+    def _log_read_cache_stats(self, context):
+        stats = self.get_read_cache_stats()
+        if not stats:
+            return
+        LOG.info(_("Read cache: %(entries)d entries, TTL %(ttl)ds"), stats)
+        for name, method in sorted(stats['methods'].items()):
+            LOG.info(_("Read cache %(name)s: %(hits)d hits, %(misses)d "
+                       "misses"), dict(method, name=name))
+
+    @periodic_task.periodic_task(
+        spacing=CONF.conductor.db_stats_interval or -1)
+    def _log_db_stats(self, context):
+        stats = self.get_db_stats()
+        if not stats:
+            return
+        LOG.info(_("DB thread pool: size %(pool_size)d, queue depth "
+                   "%(queue_depth)d (max %(max_queue_depth)d), "
+                   "%(rejected)d calls rejected"), stats)
+        methods = sorted(stats['methods'].items(),
+                         key=lambda item: item[1]['total_time'],
+                         reverse=True)
+        for name, method in methods:
+            method['name'] = name
+            LOG.info(_("DB call %(name)s: %(calls)d calls, %(errors)d "
+                       "errors, avg %(avg_time).3fs, max %(max_time).3fs, "
+                       "avg wait %(avg_wait).3fs, max concurrency "
+                       "%(max_active)d"), method)
+
     def ping(self, context, arg):
         # NOTE(russellb) This method can be removed in 2.0 of this API.  It is
         # now a part of the base rpc API.
@@ -200,6 +283,7 @@ class ConductorManager(manager.Manager):
         return jsonutils.to_primitive(migration_ref)
 
     @messaging.expected_exceptions(exception.AggregateHostExists)
+    @readcache.invalidates('aggregate')
     def aggregate_host_add(self, context, aggregate, host):
         host_ref = self.db.aggregate_host_add(context.elevated(),
                 aggregate['id'], host)
@@ -207,6 +291,7 @@ class ConductorManager(manager.Manager):
         return jsonutils.to_primitive(host_ref)
 
     @messaging.expected_exceptions(exception.AggregateHostNotFound)
+    @readcache.invalidates('aggregate')
     def aggregate_host_delete(self, context, aggregate, host):
         self.db.aggregate_host_delete(context.elevated(),
                 aggregate['id'], host)
@@ -220,6 +305,7 @@ class ConductorManager(manager.Manager):
 
     # NOTE(russellb): This method is now deprecated and can be removed in
     # version 2.0 of the RPC API
+    @readcache.cached_read('aggregate')
     def aggregate_get_by_host(self, context, host, key=None):
         aggregates = self.db.aggregate_get_by_host(context.elevated(),
                                                    host, key)
@@ -227,6 +313,7 @@ class ConductorManager(manager.Manager):
 
     # NOTE(danms): This method is now deprecated and can be removed in
     # version 2.0 of the RPC API
+    @readcache.invalidates('aggregate')
     def aggregate_metadata_add(self, context, aggregate, metadata,
                                set_delete=False):
         new_metadata = self.db.aggregate_metadata_add(context.elevated(),
@@ -237,10 +324,12 @@ class ConductorManager(manager.Manager):
     # NOTE(danms): This method is now deprecated and can be removed in
     # version 2.0 of the RPC API
     @messaging.expected_exceptions(exception.AggregateMetadataNotFound)
+    @readcache.invalidates('aggregate')
     def aggregate_metadata_delete(self, context, aggregate, key):
         self.db.aggregate_metadata_delete(context.elevated(),
                                           aggregate['id'], key)
 
+    @readcache.cached_read('aggregate')
     def aggregate_metadata_get_by_host(self, context, host,
                                        key='availability_zone'):
         result = self.db.aggregate_metadata_get_by_host(context, host, key)
@@ -276,10 +365,12 @@ class ConductorManager(manager.Manager):
             context, secgroup['id'])
         return jsonutils.to_primitive(rules, max_depth=4)
 
+    @readcache.cached_read('provider_fw_rule')
     def provider_fw_rule_get_all(self, context):
         rules = self.db.provider_fw_rule_get_all(context)
         return jsonutils.to_primitive(rules)
 
+    @readcache.cached_read('agent_build')
     def agent_build_get_by_triple(self, context, hypervisor, os, architecture):
         info = self.db.agent_build_get_by_triple(context, hypervisor, os,
                                                  architecture)
@@ -393,6 +484,7 @@ class ConductorManager(manager.Manager):
 
     # NOTE(danms): This method is now deprecated and can be removed in
     # version v2.0 of the RPC API.
+    @readcache.cached_read('flavor')
     def instance_type_get(self, context, instance_type_id):
         result = self.db.flavor_get(context, instance_type_id)
         return jsonutils.to_primitive(result)
@@ -426,6 +518,7 @@ class ConductorManager(manager.Manager):
 
     @messaging.expected_exceptions(exception.ComputeHostNotFound,
                                    exception.HostBinaryNotFound)
+    @readcache.cached_read('service')
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
         if not any((topic, host, binary)):
             result = self.db.service_get_all(context)
@@ -454,18 +547,22 @@ class ConductorManager(manager.Manager):
         evt = self.db.action_event_finish(context, values)
         return jsonutils.to_primitive(evt)
 
+    @readcache.invalidates('service')
     def service_create(self, context, values):
         svc = self.db.service_create(context, values)
         return jsonutils.to_primitive(svc)
 
     @messaging.expected_exceptions(exception.ServiceNotFound)
+    @readcache.invalidates('service')
     def service_destroy(self, context, service_id):
         self.db.service_destroy(context, service_id)
 
+    @readcache.invalidates('service')
     def compute_node_create(self, context, values):
         result = self.db.compute_node_create(context, values)
         return jsonutils.to_primitive(result)
 
+    @readcache.invalidates('service')
     def compute_node_update(self, context, node, values, prune_stats=False):
         # NOTE(belliott) prune_stats is no longer relevant and will be
         # ignored
@@ -479,15 +576,58 @@ class ConductorManager(manager.Manager):
         result = self.db.compute_node_update(context, node['id'], values)
         return jsonutils.to_primitive(result)
 
+    @readcache.invalidates('service')
     def compute_node_delete(self, context, node):
         result = self.db.compute_node_delete(context, node['id'])
         return jsonutils.to_primitive(result)
 
     @messaging.expected_exceptions(exception.ServiceNotFound)
+    @readcache.invalidates('service')
     def service_update(self, context, service, values):
         svc = self.db.service_update(context, service['id'], values)
         return jsonutils.to_primitive(svc)
 
+    def service_heartbeat(self, context, service_id):
+        """Record a heartbeat from a service.
+
+        If CONF.conductor.heartbeat_flush_window is set, the heartbeat is
+        buffered and written along with the others received in the same
+        window.
+        """
+        window = CONF.conductor.heartbeat_flush_window
+        if window <= 0:
+            self.db.service_update_heartbeats(context, [service_id],
+                                              timeutils.utcnow())
+            if self.read_cache is not None:
+                self.read_cache.invalidate('service')
+            return
+        self._heartbeats.setdefault(service_id, timeutils.utcnow())
+        if self._heartbeat_timer is None:
+            self._heartbeat_timer = greenthread.spawn_after(
+                    window, self.flush_heartbeats)
+
+    def flush_heartbeats(self):
+        """Write the buffered service heartbeats."""
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        if not self._heartbeats:
+            return
+        heartbeats = self._heartbeats
+        self._heartbeats = {}
+        # NOTE: Every service is recorded at the time the oldest heartbeat
+        # was received, so that none of them looks more recent than it is.
+        ctxt = nova_context.get_admin_context()
+        try:
+            self.db.service_update_heartbeats(ctxt, heartbeats.keys(),
+                                              min(heartbeats.values()))
+        except Exception:
+            LOG.exception(_('Failed to record heartbeats for %d services'),
+                          len(heartbeats))
+        finally:
+            if self.read_cache is not None:
+                self.read_cache.invalidate('service')
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         result = self.db.task_log_get(context, task_name, begin, end, host,
                                       state)
@@ -608,26 +748,64 @@ class ConductorManager(manager.Manager):
         return (result.obj_to_primitive(target_version=objver)
                 if isinstance(result, nova_object.NovaObject) else result)
 
-    def object_action(self, context, objinst, objmethod, args, kwargs):
-        """Perform an action on an object."""
-        oldobj = objinst.obj_clone()
-        result = self._object_dispatch(objinst, objmethod, context,
-                                       args, kwargs)
+    def _invalidate_for_object(self, objinst):
+        groups = object_cache_groups.get(objinst.obj_name())
+        if groups and self.read_cache is not None:
+            self.read_cache.invalidate(*groups)
+
+    def _object_updates(self, oldobj, objinst, fingerprints=None):
+        """Diff an object with the one passed to us.
+
+        This generates the dict of changes to forward back to the caller.
+        If fingerprints are given, fields which were not passed to us are
+        skipped when they still match the caller's fingerprint of them.
+        """
         updates = dict()
-        # NOTE(danms): Diff the object with the one passed to us and
-        # generate a list of changes to forward back
         for name, field in objinst.fields.items():
             if not objinst.obj_attr_is_set(name):
                 # Avoid demand-loading anything
                 continue
-            if (not oldobj.obj_attr_is_set(name) or
-                    oldobj[name] != objinst[name]):
-                updates[name] = field.to_primitive(objinst, name,
-                                                   objinst[name])
+            if oldobj.obj_attr_is_set(name):
+                if oldobj[name] == objinst[name]:
+                    continue
+                value = field.to_primitive(objinst, name, objinst[name])
+            else:
+                value = field.to_primitive(objinst, name, objinst[name])
+                if (fingerprints and fingerprints.get(name) ==
+                        nova_object.obj_fingerprint(value)):
+                    continue
+            updates[name] = value
         # This is safe since a field named this would conflict with the
         # method anyway
         updates['obj_what_changed'] = objinst.obj_what_changed()
-        return updates, result
+        return updates
+
+    def object_action(self, context, objinst, objmethod, args, kwargs):
+        """Perform an action on an object."""
+        oldobj = objinst.obj_clone()
+        try:
+            result = self._object_dispatch(objinst, objmethod, context,
+                                           args, kwargs)
+        finally:
+            self._invalidate_for_object(objinst)
+        return self._object_updates(oldobj, objinst), result
+
+    def object_delta_action(self, context, objinst, objmethod, args, kwargs,
+                            fingerprints):
+        """Perform an action on an object which was sent as a delta.
+
+        objinst only carries its identity and changed fields, as built by
+        obj_to_delta_primitive(), and fingerprints summarizes the rest of
+        the fields the caller has. Only the values which no longer match
+        the caller's copy are sent back.
+        """
+        oldobj = objinst.obj_clone()
+        try:
+            result = self._object_dispatch(objinst, objmethod, context,
+                                           args, kwargs)
+        finally:
+            self._invalidate_for_object(objinst)
+        return self._object_updates(oldobj, objinst, fingerprints), result
 
     # NOTE(danms): This method is now deprecated and can be removed in
     # v2.0 of the RPC API
@@ -872,7 +1050,7 @@ class ComputeTaskManager(base.Base):
 
 class _ConductorManagerV2Proxy(object):
 
-    target = messaging.Target(version='2.0')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, manager):
         self.manager = manager
@@ -982,6 +1160,9 @@ class _ConductorManagerV2Proxy(object):
     def service_update(self, context, service, values):
         return self.manager.service_update(context, service, values)
 
+    def service_heartbeat(self, context, service_id):
+        self.manager.service_heartbeat(context, service_id)
+
     def task_log_get(self, context, task_name, begin, end, host, state):
         return self.manager.task_log_get(context, task_name, begin, end, host,
                 state)
@@ -1044,3 +1225,8 @@ class _ConductorManagerV2Proxy(object):
 
     def object_backport(self, context, objinst, target_version):
         return self.manager.object_backport(context, objinst, target_version)
+
+    def object_delta_action(self, context, objinst, objmethod, args, kwargs,
+                            fingerprints):
+        return self.manager.object_delta_action(context, objinst, objmethod,
+                args, kwargs, fingerprints)
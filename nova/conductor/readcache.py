@@ -0,0 +1,138 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Result cache for hot, read-only conductor methods.
+
+Compute nodes ask the conductor for the same flavors, aggregates and
+services over and over.  ReadCache keeps the results of those calls for a
+short time, keyed by method, arguments and the parts of the request
+context that affect what the database returns.  Cached methods belong to
+an invalidation group, and conductor methods that write the underlying
+data drop every entry of the groups they touch.
+
+The cache is local to a conductor worker, and writes made elsewhere (the
+API, another worker) are not seen until an entry expires, so the TTL is
+the bound on staleness.
+"""
+
+import copy
+import functools
+import time
+
+
+class MethodStats(object):
+    """Hit and miss counters for a single cached method."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class ReadCache(object):
+    def __init__(self, ttl, max_entries=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # NOTE: Entries are stored per invalidation group so that a write
+        # only has to drop one dict.
+        self._groups = {}
+        self._size = 0
+        self._method_stats = {}
+        self._invalidations = {}
+
+    @staticmethod
+    def _make_key(method, context, args, kwargs):
+        return (method, context.is_admin, context.project_id,
+                repr(args), repr(sorted(kwargs.items())))
+
+    def _make_room(self, now):
+        for entries in self._groups.values():
+            for key, (expires, _value) in entries.items():
+                if expires <= now:
+                    del entries[key]
+        self._size = sum(len(entries) for entries in self._groups.values())
+        if self._size >= self.max_entries:
+            self._groups.clear()
+            self._size = 0
+
+    def call(self, group, method, func, context, *args, **kwargs):
+        """Return func(context, *args, **kwargs), cached under group."""
+        stats = self._method_stats.get(method)
+        if stats is None:
+            stats = self._method_stats.setdefault(method, MethodStats())
+        entries = self._groups.setdefault(group, {})
+        key = self._make_key(method, context, args, kwargs)
+        now = time.time()
+
+        cached = entries.get(key)
+        if cached is not None and cached[0] > now:
+            stats.hits += 1
+            return copy.deepcopy(cached[1])
+
+        stats.misses += 1
+        result = func(context, *args, **kwargs)
+        if key not in entries:
+            if self.max_entries and self._size >= self.max_entries:
+                self._make_room(now)
+                entries = self._groups.setdefault(group, {})
+            self._size += 1
+        entries[key] = (now + self.ttl, result)
+        return copy.deepcopy(result)
+
+    def invalidate(self, *groups):
+        """Drop every cached result in the given groups."""
+        for group in groups:
+            self._size -= len(self._groups.pop(group, {}))
+            self._invalidations[group] = self._invalidations.get(group, 0) + 1
+
+    def get_stats(self):
+        """Return a snapshot of the cache statistics."""
+        return {'ttl': self.ttl,
+                'entries': self._size,
+                'invalidations': dict(self._invalidations),
+                'methods': dict((name, stats.to_dict())
+                                for name, stats
+                                in self._method_stats.items())}
+
+
+def cached_read(group):
+    """Decorate a conductor manager method whose result can be cached.
+
+    The method is served from the manager's read_cache when the manager
+    has one, and called directly otherwise.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, context, *args, **kwargs):
+            if self.read_cache is None:
+                return fn(self, context, *args, **kwargs)
+            return self.read_cache.call(group, fn.__name__,
+                                        functools.partial(fn, self),
+                                        context, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def invalidates(*groups):
+    """Decorate a conductor manager method that writes cached data."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                if self.read_cache is not None:
+                    self.read_cache.invalidate(*groups)
+        return wrapper
+    return decorator
@@ -133,6 +133,8 @@ class ConductorAPI(object):
     ...  - Remove block_device_mapping_destroy()
 
     2.0  - Drop backwards compatibility
+    2.1  - Added object_delta_action()
+    2.2  - Added service_heartbeat()
     """
 
     VERSION_ALIASES = {
@@ -329,6 +331,15 @@ class ConductorAPI(object):
         return cctxt.call(context, 'service_update',
                           service=service_p, values=values)
 
+    def service_heartbeat(self, context, service):
+        if not self.client.can_send_version('2.2'):
+            # NOTE: An old conductor needs the full update, so the caller
+            # gets the updated service back to keep report_count current.
+            return self.service_update(context, service,
+                    {'report_count': service['report_count'] + 1})
+        cctxt = self.client.prepare(version='2.2')
+        cctxt.cast(context, 'service_heartbeat', service_id=service['id'])
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'task_log_get',
@@ -434,6 +445,16 @@ class ConductorAPI(object):
         return cctxt.call(context, 'object_backport', objinst=objinst,
                           target_version=target_version)
 
+    def object_delta_action(self, context, objinst, objmethod, args, kwargs):
+        if not self.client.can_send_version('2.1'):
+            return self.object_action(context, objinst, objmethod, args,
+                                      kwargs)
+        objinst_p, fingerprints = objinst.obj_to_delta_primitive()
+        cctxt = self.client.prepare(version='2.1')
+        return cctxt.call(context, 'object_delta_action', objinst=objinst_p,
+                          objmethod=objmethod, args=args, kwargs=kwargs,
+                          fingerprints=fingerprints)
+
 
 class ComputeTaskAPI(object):
     """Client side of the conductor 'compute' namespaced RPC API
@@ -21,6 +21,7 @@ import time
 from oslo.config import cfg
 from oslo import messaging
 
+from nova import cache_utils
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import rpcapi as compute_rpcapi
 from nova import manager
@@ -28,7 +29,6 @@ from nova.objects import instance as instance_obj
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 
 
 LOG = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ class ConsoleAuthManager(manager.Manager):
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         super(ConsoleAuthManager, self).__init__(service_name='consoleauth',
                                                  *args, **kwargs)
-        self.mc = memorycache.get_client()
+        self.mc = cache_utils.get_client()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
 
@@ -78,10 +78,11 @@ class ConsoleAuthManager(manager.Manager):
         self.mc.set(token.encode('UTF-8'), data, CONF.console_token_ttl)
         tokens = self._get_tokens_for_instance(instance_uuid)
         # Remove the expired tokens from cache.
-        for tok in tokens:
-            token_str = self.mc.get(tok.encode('UTF-8'))
-            if not token_str:
-                tokens.remove(tok)
+        if tokens:
+            live_tokens = self.mc.get_multi([tok.encode('UTF-8')
+                                             for tok in tokens])
+            tokens = [tok for tok in tokens
+                      if live_tokens.get(tok.encode('UTF-8'))]
         tokens.append(token)
         self.mc.set(instance_uuid.encode('UTF-8'),
                     jsonutils.dumps(tokens))
@@ -120,6 +121,6 @@ class ConsoleAuthManager(manager.Manager):
 
     def delete_tokens_for_instance(self, context, instance_uuid):
         tokens = self._get_tokens_for_instance(instance_uuid)
-        for token in tokens:
-            self.mc.delete(token.encode('UTF-8'))
-        self.mc.delete(instance_uuid.encode('UTF-8'))
+        keys = [token.encode('UTF-8') for token in tokens]
+        keys.append(instance_uuid.encode('UTF-8'))
+        self.mc.delete_multi(keys)
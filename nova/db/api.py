@@ -148,6 +148,15 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_update_heartbeats(context, service_ids, updated_at):
+    """Record a heartbeat for each of the given services in a single
+    update, setting updated_at and incrementing report_count.
+
+    Returns the number of services updated.
+    """
+    return IMPL.service_update_heartbeats(context, service_ids, updated_at)
+
+
 ###################
 
 
@@ -560,6 +569,16 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
 
 
+def fixed_ip_search_by_address(context, address_pattern):
+    """Find the fixed ips of instances, or their floating ips, whose
+    address matches a SQL LIKE pattern.
+
+    Returns dicts of the instance_uuid, address and floating_address, which
+    is None when the fixed ip matched.
+    """
+    return IMPL.fixed_ip_search_by_address(context, address_pattern)
+
+
 def fixed_ip_update(context, address, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_update(context, address, values)
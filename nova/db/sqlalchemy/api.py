@@ -35,6 +35,7 @@ from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
 from sqlalchemy import or_
+from sqlalchemy.orm import attributes
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
@@ -44,6 +45,7 @@ from sqlalchemy.sql.expression import asc
 from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import select
 from sqlalchemy.sql import func
+from sqlalchemy.sql import null
 from sqlalchemy import String
 
 from nova import block_device
@@ -535,6 +537,17 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+@require_admin_context
+def service_update_heartbeats(context, service_ids, updated_at):
+    if not service_ids:
+        return 0
+    return model_query(context, models.Service, read_deleted="no").\
+            filter(models.Service.id.in_(service_ids)).\
+            update({'report_count': models.Service.report_count + 1,
+                    'updated_at': updated_at},
+                   synchronize_session=False)
+
+
 ###################
 
 def compute_node_get(context, compute_id):
@@ -1396,6 +1409,50 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return result
 
 
+def _ip_address_like(column, pattern):
+    db_string = CONF.database.connection.split(':')[0].split('+')[0]
+    if db_string == 'postgresql':
+        # NOTE: Addresses are stored as inet, which LIKE does not take.
+        column = func.host(column)
+    return column.like(pattern)
+
+
+@require_context
+def fixed_ip_search_by_address(context, address_pattern):
+    vif_and = and_(models.VirtualInterface.id ==
+                   models.FixedIp.virtual_interface_id,
+                   models.VirtualInterface.deleted == 0,
+                   models.VirtualInterface.instance_uuid != None)
+    session = get_session()
+    # NOTE: Each half of the union can use the index on the address of its
+    # own table, which a single query matching either address could not.
+    fixed = session.query(models.VirtualInterface.instance_uuid,
+                          models.FixedIp.address,
+                          null()).\
+                    select_from(models.FixedIp).\
+                    join((models.VirtualInterface, vif_and)).\
+                    filter(models.FixedIp.deleted == 0).\
+                    filter(_ip_address_like(models.FixedIp.address,
+                                            address_pattern))
+    floating = session.query(models.VirtualInterface.instance_uuid,
+                             models.FixedIp.address,
+                             models.FloatingIp.address).\
+                       select_from(models.FloatingIp).\
+                       join((models.FixedIp,
+                             models.FixedIp.id ==
+                             models.FloatingIp.fixed_ip_id)).\
+                       join((models.VirtualInterface, vif_and)).\
+                       filter(models.FloatingIp.deleted == 0).\
+                       filter(models.FixedIp.deleted == 0).\
+                       filter(_ip_address_like(models.FloatingIp.address,
+                                               address_pattern))
+    return [{'instance_uuid': instance_uuid,
+             'address': address,
+             'floating_address': floating_address}
+            for instance_uuid, address, floating_address
+            in fixed.union_all(floating).all()]
+
+
 @require_context
 def fixed_ip_update(context, address, values):
     session = get_session()
@@ -1845,6 +1902,7 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     Special keys are used to tweek the query further:
 
         'changes-since' - only return instances updated after
+        'deleted-since' - only return instances deleted after
         'deleted' - only return (or exclude) deleted instances
         'soft_deleted' - modify behavior of 'deleted' to either
                          include or exclude instances whose
@@ -1880,6 +1938,11 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
         query_prefix = query_prefix.\
                             filter(models.Instance.updated_at >= changes_since)
 
+    if 'deleted-since' in filters:
+        deleted_since = timeutils.normalize_time(filters['deleted-since'])
+        query_prefix = query_prefix.\
+                            filter(models.Instance.deleted_at >= deleted_since)
+
     if 'deleted' in filters:
         # Instances can be soft or hard deleted and the query needs to
         # include or exclude both
@@ -2198,6 +2261,11 @@ def instance_update_and_get_original(context, instance_uuid, values,
     when the task state before update matches expected_task_state. Otherwise
     a UnexpectedTaskStateError is thrown.
 
+    The expected states are compared by a conditional UPDATE, but unlike
+    instance_update() the instance is still read before it, because the
+    original is returned.  That read is not locking, and it takes the place
+    of the read which returns the updated instance, so it adds no statement.
+
     :returns: a tuple of the form (old_instance_ref, new_instance_ref)
 
     Raises NotFound if instance does not exist.
@@ -2232,6 +2300,66 @@ def _instance_metadata_update_in_place(context, instance, metadata_type, model,
         instance[metadata_type].append(newitem)
 
 
+def _instance_check_expected_states(instance_ref, expected):
+    """Raise if the instance is not in the expected task and vm states."""
+    if 'task_state' in expected:
+        actual_state = instance_ref["task_state"]
+        if actual_state not in expected['task_state']:
+            if actual_state == task_states.DELETING:
+                raise exception.UnexpectedDeletingTaskStateError(
+                        actual=actual_state, expected=expected['task_state'])
+            else:
+                raise exception.UnexpectedTaskStateError(
+                        actual=actual_state, expected=expected['task_state'])
+    if 'vm_state' in expected:
+        actual_state = instance_ref["vm_state"]
+        if actual_state not in expected['vm_state']:
+            raise exception.UnexpectedVMStateError(
+                    actual=actual_state, expected=expected['vm_state'])
+
+
+def _instance_update_expected(context, session, instance_uuid, values,
+                              expected):
+    """Update an instance only if it is in the expected states.
+
+    The states are compared by the UPDATE statement itself, so they cannot
+    change between the check and the write, whether or not the row was read
+    first.  If no row was updated, the instance is read to raise the same
+    errors as _instance_check_expected_states().
+    """
+    query = model_query(context, models.Instance, session=session,
+                        project_only=True).\
+                filter_by(uuid=instance_uuid)
+    for key, states in expected.iteritems():
+        column = getattr(models.Instance, key)
+        conditions = []
+        not_null = [state for state in states if state is not None]
+        if not_null:
+            conditions.append(column.in_(not_null))
+        if len(not_null) != len(states):
+            conditions.append(column == None)
+        query = query.filter(or_(*conditions))
+
+    if query.update(values, synchronize_session=False):
+        return
+
+    # NOTE: The instance may already be in the session, so make sure we
+    # see the states which made the update fail.
+    instance_ref = model_query(context, models.Instance, session=session,
+                               project_only=True).\
+                        filter_by(uuid=instance_uuid).\
+                        populate_existing().\
+                        first()
+    if not instance_ref:
+        raise exception.InstanceNotFound(instance_id=instance_uuid)
+    _instance_check_expected_states(instance_ref, expected)
+    # NOTE: The states matched again by the time we read them back, so they
+    # were changed under us and then changed back.
+    raise exception.UnexpectedTaskStateError(
+            actual=instance_ref['task_state'],
+            expected=expected.get('task_state'))
+
+
 def _instance_update(context, instance_uuid, values, copy_old_instance=False,
                      columns_to_join=None):
     session = get_session()
@@ -2239,31 +2367,44 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False,
     if not uuidutils.is_uuid_like(instance_uuid):
         raise exception.InvalidUUID(instance_uuid)
 
+    # NOTE: expected_task_state and expected_vm_state are not db columns so
+    # always pop them out
+    expected = {}
+    for key in ('task_state', 'vm_state'):
+        if 'expected_' + key in values:
+            states = values.pop('expected_' + key)
+            if not isinstance(states, (tuple, list, set)):
+                states = (states,)
+            expected[key] = tuple(states)
+
+    # NOTE: When the expected states are given, the columns are updated
+    # as a compare-and-swap with a single conditional UPDATE. If nothing
+    # needs the instance as it was before the update, it is not read before
+    # the write either. instance_update_and_get_original(), which Instance
+    # save() uses, does need it: there the check of the states read first
+    # is only an early exit, and the conditional UPDATE still decides.
+    columns = models.Instance.__table__.columns
+    compare_and_swap = expected and all(
+        key in columns or key in ('metadata', 'system_metadata')
+        for key in values)
+    needs_old_instance = copy_old_instance or any(
+        key in values for key in ('hostname', 'metadata', 'system_metadata'))
+
     with session.begin():
+        if compare_and_swap and not needs_old_instance:
+            _handle_objects_related_type_conversions(values)
+            values.setdefault('updated_at', timeutils.utcnow())
+            _instance_update_expected(context, session, instance_uuid,
+                                      values, expected)
+            instance_ref = _instance_get_by_uuid(
+                context, instance_uuid, session=session,
+                columns_to_join=columns_to_join)
+            return (None, instance_ref)
+
         instance_ref = _instance_get_by_uuid(context, instance_uuid,
                                              session=session,
                                              columns_to_join=columns_to_join)
-        if "expected_task_state" in values:
-            # it is not a db column so always pop out
-            expected = values.pop("expected_task_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["task_state"]
-            if actual_state not in expected:
-                if actual_state == task_states.DELETING:
-                    raise exception.UnexpectedDeletingTaskStateError(
-                            actual=actual_state, expected=expected)
-                else:
-                    raise exception.UnexpectedTaskStateError(
-                            actual=actual_state, expected=expected)
-        if "expected_vm_state" in values:
-            expected = values.pop("expected_vm_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["vm_state"]
-            if actual_state not in expected:
-                raise exception.UnexpectedVMStateError(actual=actual_state,
-                                                       expected=expected)
+        _instance_check_expected_states(instance_ref, expected)
 
         instance_hostname = instance_ref['hostname'] or ''
         if ("hostname" in values and
@@ -2294,8 +2435,15 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False,
                                                session)
 
         _handle_objects_related_type_conversions(values)
-        instance_ref.update(values)
-        session.add(instance_ref)
+        if compare_and_swap:
+            values.setdefault('updated_at', timeutils.utcnow())
+            _instance_update_expected(context, session, instance_uuid,
+                                      values, expected)
+            for key, value in values.iteritems():
+                attributes.set_committed_value(instance_ref, key, value)
+        else:
+            instance_ref.update(values)
+            session.add(instance_ref)
 
     return (old_instance_ref, instance_ref)
 
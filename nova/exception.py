@@ -1376,6 +1376,11 @@ class ObjectActionError(NovaException):
     msg_fmt = _('Object action %(action)s failed because: %(reason)s')
 
 
+class ConductorDBQueueFull(NovaException):
+    msg_fmt = _("Too many database calls are waiting in the conductor; "
+                "rejected %(method)s with %(depth)d calls queued")
+
+
 class CoreAPIMissing(NovaException):
     msg_fmt = _("Core API extensions are missing: %(missing_apis)s")
 
@@ -0,0 +1,205 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import httplib
+import logging
+import random
+
+from glanceclient.common import http as glance_http
+from oslo.config import cfg
+import six.moves.urllib.parse as urlparse
+
+from nova import exception
+import nova.image.download.base as xfer_base
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import units
+from nova.virt.libvirt import imagecache
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+peer_opts = [
+    cfg.ListOpt('peer_urls',
+                default=[],
+                help=_('Base URLs at which other compute hosts serve the '
+                       'contents of their image cache directory, for '
+                       'example https://compute2:8443/_base/. Only images '
+                       'which are cached unchanged can be copied from a '
+                       'peer: raw images, or any image on peers with '
+                       'force_raw_images=False')),
+    cfg.BoolOpt('allow_http',
+                default=False,
+                help=_('Allow peers to be reached over plain http, which '
+                       'neither authenticates the peer nor keeps the image '
+                       'data private')),
+    cfg.StrOpt('ca_file',
+               help=_('CA certificates file to verify the https '
+                      'certificates of peers with. The system CA '
+                      'certificates are used if not set')),
+    cfg.StrOpt('cert_file',
+               help=_('Certificate file presented to peers, which should '
+                      'require it to serve their image cache')),
+    cfg.StrOpt('key_file',
+               help=_('Private key file of cert_file, if it is not in '
+                      'cert_file')),
+    cfg.IntOpt('timeout',
+               default=10,
+               help=_('Seconds to wait for a peer to connect or send data '
+                      'before trying the next one')),
+    cfg.IntOpt('chunk_size_kb',
+               default=64,
+               help=_('Size in kilobytes of the chunks image data is read '
+                      'from a peer in')),
+]
+CONF.register_opts(peer_opts, group='image_peer')
+
+
+#  This module fetches base images from the image cache of other compute
+#  hosts instead of from glance, so that booting many instances of a new
+#  image on many hosts does not make every host download it from glance.
+#  To use it, add "peer" to allowed_direct_url_schemes and list the peers:
+#  [image_peer]
+#  peer_urls = https://compute1:8443/_base/,https://compute2:8443/_base/
+#
+#  Each peer must serve its image cache directory read-only over HTTPS, with
+#  any web server, at the listed URL.  Base files are named after the SHA1
+#  of the image id, so a peer is asked for <peer_url>/<sha1(image_id)>.
+#
+#  NOTE: The image cache holds the images of every tenant, including private
+#  ones, so it must not be served to anyone but the other compute hosts.
+#  The web server should require a client certificate, which nova presents
+#  from [image_peer] cert_file and key_file, and the certificates of peers
+#  are verified against ca_file.  Plain http peers are refused unless
+#  allow_http is set, for deployments where the network between compute
+#  hosts is trusted.
+#
+#  Peers are tried in random order to spread the load between them.  A peer
+#  which does not have the image, has it in another format, or sends data
+#  which does not match the glance checksum is skipped.  If no peer has the
+#  image, glance is used.
+#
+#  NOTE: A peer is only useful for images it caches unchanged.  With the
+#  default force_raw_images=True, the libvirt driver converts qcow2 and
+#  other images to raw in the image cache, so their size and checksum no
+#  longer match glance, and every peer is skipped for them.  Only raw images
+#  are then copied from peers; for other images the peers must run with
+#  force_raw_images=False.
+
+
+class PeerTransfer(xfer_base.TransferBase):
+
+    def _connect(self, url_parts):
+        if url_parts.scheme == 'https':
+            return glance_http.VerifiedHTTPSConnection(
+                url_parts.hostname, url_parts.port,
+                key_file=CONF.image_peer.key_file,
+                cert_file=CONF.image_peer.cert_file,
+                cacert=CONF.image_peer.ca_file,
+                timeout=CONF.image_peer.timeout)
+        return httplib.HTTPConnection(url_parts.hostname, url_parts.port,
+                                      timeout=CONF.image_peer.timeout)
+
+    def _fetch_from_peer(self, peer_url, image_id, dst_file, size, checksum,
+                         observer=None):
+        url = urlparse.urljoin(peer_url.rstrip('/') + '/',
+                               imagecache.get_cache_fname(
+                                   {'image_id': image_id}, 'image_id'))
+        url_parts = urlparse.urlparse(url)
+        conn = self._connect(url_parts)
+        try:
+            conn.request('GET', url_parts.path)
+            resp = conn.getresponse()
+            if resp.status != httplib.OK:
+                LOG.debug(_('Peer %(url)s answered %(status)d'),
+                          {'url': url, 'status': resp.status})
+                return False
+            length = resp.getheader('content-length')
+            if length is None or int(length) != size:
+                LOG.debug(_('Peer %(url)s has a %(length)s byte file, not '
+                            'the %(size)d byte image'),
+                          {'url': url, 'length': length, 'size': size})
+                return False
+
+            md5 = hashlib.md5()
+            received = 0
+            # NOTE: The observer only sees the data after it has all
+            # arrived and been verified, as this peer might be skipped.
+            with open(dst_file, 'wb') as f:
+                while True:
+                    chunk = resp.read(CONF.image_peer.chunk_size_kb *
+                                      units.Ki)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    f.write(chunk)
+                    received += len(chunk)
+            if received != size or md5.hexdigest() != checksum:
+                LOG.warn(_('Image %(image_id)s from peer %(url)s does not '
+                           'match its checksum'),
+                         {'image_id': image_id, 'url': url})
+                return False
+        finally:
+            conn.close()
+
+        if observer is not None:
+            with open(dst_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(
+                        CONF.image_peer.chunk_size_kb * units.Ki), ''):
+                    observer.write(chunk)
+        return True
+
+    def download(self, context, url_parts, dst_file, metadata, **kwargs):
+        image_id = url_parts.path.lstrip('/')
+        checksum = metadata.get('checksum')
+        size = metadata.get('size')
+        if not checksum or not size:
+            msg = _('Peers can only be used for images with a known size '
+                    'and checksum.')
+            raise exception.ImageDownloadModuleMetaDataError(
+                module=str(self), reason=msg)
+
+        peer_urls = list(CONF.image_peer.peer_urls)
+        random.shuffle(peer_urls)
+        for peer_url in peer_urls:
+            scheme = urlparse.urlparse(peer_url).scheme
+            if scheme != 'https' and not (scheme == 'http' and
+                                          CONF.image_peer.allow_http):
+                LOG.warn(_('Not copying image %(image_id)s from peer '
+                           '%(peer_url)s, which is not an https URL'),
+                         {'image_id': image_id, 'peer_url': peer_url})
+                continue
+            try:
+                if self._fetch_from_peer(peer_url, image_id, dst_file, size,
+                                         checksum,
+                                         observer=kwargs.get('observer')):
+                    LOG.info(_('Copied image %(image_id)s from peer '
+                               '%(peer_url)s'),
+                             {'image_id': image_id, 'peer_url': peer_url})
+                    return
+            except (IOError, httplib.HTTPException) as ex:
+                LOG.debug(_('Failed to copy image %(image_id)s from peer '
+                            '%(peer_url)s: %(ex)s'),
+                          {'image_id': image_id, 'peer_url': peer_url,
+                           'ex': ex})
+
+        msg = _('No peer has image %s.') % image_id
+        raise exception.ImageDownloadModuleError(reason=msg, module=str(self))
+
+
+def get_download_handler(**kwargs):
+    return PeerTransfer()
+
+
+def get_schemes():
+    return ['peer']
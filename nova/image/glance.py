@@ -23,6 +23,7 @@ import json
 import random
 import sys
 import time
+import uuid
 
 import glanceclient
 import glanceclient.exc
@@ -30,12 +31,15 @@ from oslo.config import cfg
 import six
 import six.moves.urllib.parse as urlparse
 
+from nova import cache_utils
 from nova import exception
 import nova.image.download as image_xfers
+from nova.image import ranged
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova.openstack.common import units
 from nova import utils
 
 
@@ -66,7 +70,26 @@ glance_opts = [
                 default=[],
                 help='A list of url scheme that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
-                     '[file].'),
+                     '[file, peer].'),
+    cfg.IntOpt('glance_download_workers',
+               default=1,
+               help='Number of byte ranges of an image downloaded from '
+                    'glance at the same time. 1 downloads images as a '
+                    'single stream.'),
+    cfg.IntOpt('glance_download_range_mb',
+               default=64,
+               help='Size in megabytes of the byte ranges of an image '
+                    'downloaded in parallel. Images smaller than two '
+                    'ranges are downloaded as a single stream.'),
+    cfg.IntOpt('glance_download_timeout',
+               default=600,
+               help='Number of seconds to wait for a glance server while '
+                    'downloading the byte ranges of an image.'),
+    cfg.IntOpt('glance_metadata_cache_ttl',
+               default=0,
+               help='Number of seconds for which the metadata of active '
+                    'images, and the absence of images that were not '
+                    'found, is cached. 0 disables the cache.'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -75,6 +98,11 @@ CONF.register_opts(glance_opts)
 CONF.import_opt('auth_strategy', 'nova.api.auth')
 CONF.import_opt('my_ip', 'nova.netconf')
 
+_METADATA_CACHE = None
+_metadata_cache_stats = {'hits': 0, 'misses': 0}
+# Cached in place of the metadata of an image that was not found.
+_NOT_FOUND = 'not-found'
+
 
 def generate_glance_url():
     """Generate the URL to glance."""
@@ -141,6 +169,63 @@ def _create_glance_client(context, host, port, use_ssl, version=1):
     return glanceclient.Client(str(version), endpoint, **params)
 
 
+def _get_metadata_cache():
+    global _METADATA_CACHE
+
+    if _METADATA_CACHE is None:
+        _METADATA_CACHE = cache_utils.get_client()
+
+    return _METADATA_CACHE
+
+
+def reset_metadata_cache():
+    """Reset the image metadata cache, mainly for testing purposes."""
+    global _METADATA_CACHE
+
+    _METADATA_CACHE = None
+    _metadata_cache_stats.update(hits=0, misses=0)
+
+
+def get_metadata_cache_stats():
+    """Return the hit and miss counts of the image metadata cache."""
+    return dict(_metadata_cache_stats)
+
+
+def _metadata_generation_key(image_id):
+    return ('glance-image-generation-%s' % image_id).encode('utf-8')
+
+
+def _metadata_cache_generation(cache, image_id):
+    """Return the generation of the cached metadata of an image.
+
+    Every cache key of the image includes it, so that deleting it drops
+    the image as seen by every project and user at once.
+    """
+    key = _metadata_generation_key(image_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        # NOTE: The generation does not expire.  If it is evicted, the
+        # entries made under it are simply not found any more.
+        if not cache.add(key, generation):
+            generation = cache.get(key) or generation
+    return generation
+
+
+def _metadata_cache_key(context, image_id, generation):
+    """Return the cache key of an image as seen by the given context.
+
+    Without an auth token, _is_image_available() also looks at the user.
+    """
+    user_id = None
+    if not getattr(context, 'auth_token', None):
+        user_id = context.user_id
+    key = 'glance-image-%s-%s-%s-%s-%s' % (image_id, generation,
+                                           context.project_id,
+                                           context.is_admin, user_id)
+    return key.encode('utf-8')
+
+
 def get_api_servers():
     """Shuffle a list of CONF.glance_api_servers and return an iterator
     that will cycle through the list, looping around to the beginning
@@ -184,6 +269,16 @@ class GlanceClientWrapper(object):
                                      self.host, self.port,
                                      self.use_ssl, self.version)
 
+    def get_api_server(self):
+        """Return the (host, port, use_ssl) of the api server to send a
+        request to which is not made through the glance client.
+        """
+        if self.client is not None:
+            return self.host, self.port, self.use_ssl
+        if self.api_servers is None:
+            self.api_servers = get_api_servers()
+        return self.api_servers.next()
+
     def _create_onetime_client(self, context, version):
         """Create a client that will be used for one call."""
         if self.api_servers is None:
@@ -225,6 +320,18 @@ class GlanceClientWrapper(object):
                 time.sleep(1)
 
 
+class _CountingObserver(object):
+    """Pass image data on to an observer, counting the bytes it was given."""
+
+    def __init__(self, observer):
+        self.observer = observer
+        self.count = 0
+
+    def write(self, chunk):
+        self.observer.write(chunk)
+        self.count += len(chunk)
+
+
 class GlanceImageService(object):
     """Provides storage and retrieval of disk image objects within Glance."""
 
@@ -265,7 +372,48 @@ class GlanceImageService(object):
         return _images
 
     def show(self, context, image_id):
-        """Returns a dict with image data for the given opaque image id."""
+        """Returns a dict with image data for the given opaque image id.
+
+        With glance_metadata_cache_ttl set, the metadata of active images
+        and the absence of images that are not found are cached for each
+        image and visibility, so a change made in glance can take that long
+        to be seen.
+        """
+        ttl = CONF.glance_metadata_cache_ttl
+        if not ttl:
+            return self._show(context, image_id)
+
+        cache = _get_metadata_cache()
+        # NOTE: The generation is read before glance is, so that metadata
+        # read before an update or delete is cached under the generation
+        # which that update or delete then drops.
+        key = _metadata_cache_key(context, image_id,
+                                  _metadata_cache_generation(cache, image_id))
+        cached = cache.get(key)
+        if cached is not None:
+            _metadata_cache_stats['hits'] += 1
+            if cached == _NOT_FOUND:
+                raise exception.ImageNotFound(image_id=image_id)
+            return copy.deepcopy(cached)
+
+        _metadata_cache_stats['misses'] += 1
+        try:
+            image_meta = self._show(context, image_id)
+        except exception.ImageNotFound:
+            cache.set(key, _NOT_FOUND, time=ttl)
+            raise
+        # NOTE: Images which are still being uploaded or are otherwise
+        # changing are not cached.
+        if image_meta.get('status') == 'active':
+            cache.set(key, copy.deepcopy(image_meta), time=ttl)
+        return image_meta
+
+    def _invalidate_metadata(self, image_id):
+        """Drop the cached metadata of an image for every visibility."""
+        if CONF.glance_metadata_cache_ttl:
+            _get_metadata_cache().delete(_metadata_generation_key(image_id))
+
+    def _show(self, context, image_id):
         try:
             image = self._client.call(context, 1, 'get', image_id)
         except Exception:
@@ -307,8 +455,20 @@ class GlanceImageService(object):
         return
 
     def download(self, context, image_id, data=None, dst_path=None):
-        """Calls out to Glance for data and writes data."""
-        if CONF.allowed_direct_url_schemes and dst_path is not None:
+        """Calls out to Glance for data and writes data.
+
+        If both data and dst_path are given, the image is stored at dst_path
+        and data is also written the image data in order as it arrives, so
+        that it can inspect it.  Direct url transfers do not feed data.
+
+        With "peer" in allowed_direct_url_schemes, an image stored to
+        dst_path is first looked for in the image cache of other compute
+        hosts, see nova.image.download.peer.
+        """
+        direct_url_schemes = [scheme for scheme
+                              in CONF.allowed_direct_url_schemes
+                              if scheme != 'peer']
+        if direct_url_schemes and dst_path is not None:
             locations = self._get_locations(context, image_id)
             for entry in locations:
                 loc_url = entry['url']
@@ -325,13 +485,32 @@ class GlanceImageService(object):
                     except Exception as ex:
                         LOG.exception(ex)
 
+        if dst_path is not None and self._get_transfer_module('peer'):
+            if self._download_from_peers(context, image_id, dst_path,
+                                         observer=data):
+                return
+
+        # NOTE: A ranged download which fails and falls back to a single
+        # stream has already shown the observer the start of the image, so
+        # only the rest of the stream is shown to it.
+        observed = 0
+        if dst_path is not None and CONF.glance_download_workers > 1:
+            counter = data and _CountingObserver(data)
+            if self._download_ranges(context, image_id, dst_path,
+                                     observer=counter):
+                return
+            if counter:
+                observed = counter.count
+
         try:
             image_chunks = self._client.call(context, 1, 'data', image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
 
         close_file = False
-        if data is None and dst_path:
+        observer = None
+        if dst_path:
+            observer = data
             data = open(dst_path, 'wb')
             close_file = True
 
@@ -340,11 +519,86 @@ class GlanceImageService(object):
         else:
             try:
                 for chunk in image_chunks:
+                    if observer is not None and observed < len(chunk):
+                        observer.write(chunk[observed:] if observed
+                                       else chunk)
+                    observed = max(0, observed - len(chunk))
                     data.write(chunk)
             finally:
                 if close_file:
                     data.close()
 
+    def _download_from_peers(self, context, image_id, dst_path,
+                             observer=None):
+        """Copy an image from the image cache of another compute host.
+
+        Returns False if no peer could provide the image, in which case it
+        should be downloaded from glance.
+        """
+        image_meta = self.show(context, image_id)
+        url_parts = urlparse.urlparse('peer:///%s' % image_id)
+        metadata = {'checksum': image_meta.get('checksum'),
+                    'size': image_meta.get('size')}
+        try:
+            self._get_transfer_module('peer').download(
+                context, url_parts, dst_path, metadata, observer=observer)
+        except exception.ImageDownloadModuleError as ex:
+            LOG.info(_('Downloading image %(image_id)s from glance: %(ex)s'),
+                     {'image_id': image_id, 'ex': ex.format_message()})
+            return False
+        except exception.NovaException:
+            raise
+        except Exception:
+            LOG.exception(_('Failed to copy image %s from a peer, '
+                            'downloading it from glance'), image_id)
+            return False
+        return True
+
+    def _download_ranges(self, context, image_id, dst_path, observer=None):
+        """Download an image as concurrent byte ranges, verifying its
+        checksum on the way.
+
+        Returns False if the image should be downloaded as a single stream
+        instead, because it is small or glance does not serve ranges.
+        """
+        range_size = CONF.glance_download_range_mb * units.Mi
+        image_meta = self.show(context, image_id)
+        size = image_meta.get('size') or 0
+        if not range_size or size < 2 * range_size:
+            return False
+
+        headers = {'X-Auth-Token': getattr(context, 'auth_token', None)}
+        if CONF.auth_strategy == 'keystone':
+            headers.update(generate_identity_headers(context))
+
+        try:
+            # NOTE: The metadata may have come from the cache rather than
+            # from an api server, so one is picked here.
+            host, port, use_ssl = self._client.get_api_server()
+            if utils.is_valid_ipv6(host):
+                host = '[%s]' % host
+            url = '%s://%s:%s/v1/images/%s' % (
+                'https' if use_ssl else 'http', host, port, image_id)
+            download = ranged.RangedDownload(
+                url, headers, size, CONF.glance_download_workers,
+                range_size, num_retries=CONF.glance_num_retries,
+                insecure=CONF.glance_api_insecure,
+                timeout=CONF.glance_download_timeout)
+            download.fetch(dst_path, image_id,
+                           checksum=image_meta.get('checksum'),
+                           observer=observer)
+        except ranged.RangeNotSupported:
+            LOG.info(_('%s does not serve byte ranges, downloading the '
+                       'image as a single stream'), url)
+            return False
+        except exception.NovaException:
+            raise
+        except Exception:
+            LOG.exception(_('Parallel download of image %s failed, '
+                            'downloading it as a single stream'), image_id)
+            return False
+        return True
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = _translate_to_glance(image_meta)
@@ -377,6 +631,8 @@ class GlanceImageService(object):
             _reraise_translated_image_exception(image_id)
         else:
             return _translate_from_glance(image_meta)
+        finally:
+            self._invalidate_metadata(image_id)
 
     def delete(self, context, image_id):
         """Delete the given image.
@@ -392,6 +648,8 @@ class GlanceImageService(object):
             raise exception.ImageNotFound(image_id=image_id)
         except glanceclient.exc.HTTPForbidden:
             raise exception.ImageNotAuthorized(image_id=image_id)
+        finally:
+            self._invalidate_metadata(image_id)
         return True
 
 
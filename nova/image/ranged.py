@@ -0,0 +1,208 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Download image data as several concurrent HTTP byte ranges.
+
+The image is split into fixed size ranges, which a small pool of
+greenthreads fetch with Range requests and write straight to their place
+in a file that has been preallocated to the size of the image.  The MD5
+of the data, which glance records as the image checksum, is computed
+while the download runs: a range is hashed as soon as every range before
+it has arrived, by reading it back while it is still in the page cache.
+"""
+
+import collections
+import hashlib
+import httplib
+import re
+import sys
+import time
+
+import eventlet
+from glanceclient.common import http as glance_http
+import six
+import six.moves.urllib.parse as urlparse
+
+from nova import exception
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import units
+
+LOG = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * units.Ki
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class RangeNotSupported(Exception):
+    """The server answered a Range request with something else."""
+    pass
+
+
+class RangedDownload(object):
+    """Fetch one image of a known size into dst_path."""
+
+    def __init__(self, url, headers, size, workers, range_size,
+                 num_retries=0, insecure=False, timeout=600):
+        self.url = urlparse.urlparse(url)
+        self.headers = dict((k, v) for k, v in headers.items()
+                            if v is not None)
+        self.size = size
+        self.workers = workers
+        self.range_size = range_size
+        self.num_retries = num_retries
+        self.insecure = insecure
+        self.timeout = timeout
+
+        self._pending = collections.deque(
+            (start, min(start + range_size, size) - 1)
+            for start in range(0, size, range_size))
+        self._done = {}
+        self._error = None
+        self._observer = None
+        self._hashed_to = 0
+        self._md5 = hashlib.md5()
+
+    def _connect(self):
+        """Open a connection the way the glance client does, so that https
+        certificates are verified unless insecure is set.
+        """
+        scheme = self.url.scheme
+        client = glance_http.HTTPClient
+        kwargs = client.get_connection_kwargs(scheme,
+                                              insecure=self.insecure,
+                                              ssl_compression=False,
+                                              timeout=self.timeout)
+        return client.get_connection_class(scheme)(self.url.hostname,
+                                                   self.url.port, **kwargs)
+
+    def _fetch_range(self, conn, f, start, end):
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%d-%d' % (start, end)
+        conn.request('GET', self.url.path, headers=headers)
+        resp = conn.getresponse()
+        try:
+            match = _CONTENT_RANGE.match(resp.getheader('content-range', ''))
+            if resp.status != 206 or match is None:
+                raise RangeNotSupported()
+            if (int(match.group(1)), int(match.group(2))) != (start, end):
+                raise RangeNotSupported()
+
+            f.seek(start)
+            offset = start
+            while offset <= end:
+                chunk = resp.read(min(_CHUNK_SIZE, end + 1 - offset))
+                if not chunk:
+                    raise IOError(_('Short read of image data at offset '
+                                    '%(offset)d of range %(start)d-%(end)d')
+                                  % {'offset': offset, 'start': start,
+                                     'end': end})
+                f.write(chunk)
+                offset += len(chunk)
+            f.flush()
+        finally:
+            resp.close()
+
+    def _hash_done_ranges(self, f):
+        """Hash every range which now follows the hashed prefix, and pass
+        it on to the observer.
+        """
+        while self._hashed_to in self._done:
+            end = self._done.pop(self._hashed_to)
+            f.seek(self._hashed_to)
+            remaining = end + 1 - self._hashed_to
+            while remaining:
+                chunk = f.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(_('Image file ended while hashing it'))
+                self._md5.update(chunk)
+                if self._observer is not None:
+                    self._observer.write(chunk)
+                remaining -= len(chunk)
+            self._hashed_to = end + 1
+
+    def _worker(self, dst_path):
+        conn = self._connect()
+        try:
+            with open(dst_path, 'r+b') as f:
+                while self._pending:
+                    start, end = self._pending.popleft()
+                    attempt = 0
+                    while True:
+                        try:
+                            self._fetch_range(conn, f, start, end)
+                            break
+                        except (IOError, httplib.HTTPException):
+                            attempt += 1
+                            if attempt > self.num_retries:
+                                raise
+                            LOG.warn(_('Retrying range %(start)d-%(end)d '
+                                       'of %(url)s'),
+                                     {'start': start, 'end': end,
+                                      'url': self.url.geturl()})
+                            conn.close()
+                            conn = self._connect()
+                    self._done[start] = end
+                    self._hash_done_ranges(f)
+        except Exception:
+            # NOTE: Stop the other workers picking up new ranges, and keep
+            # the first failure to re-raise once they have finished.
+            self._pending.clear()
+            if self._error is None:
+                self._error = sys.exc_info()
+        finally:
+            conn.close()
+
+    def fetch(self, dst_path, image_id, checksum=None, observer=None):
+        """Download the image, verify it, and return some statistics.
+
+        If observer is given, its write() method is called with the image
+        data in order as it is hashed, and can abort the download by
+        raising.  Raises RangeNotSupported if the server does not serve byte
+        ranges, in which case the caller should fall back to a plain
+        download.
+        """
+        self._observer = observer
+        started_at = time.time()
+        with open(dst_path, 'wb') as f:
+            f.truncate(self.size)
+
+        workers = min(self.workers, len(self._pending)) or 1
+        pool = eventlet.GreenPool(workers)
+        for _i in range(workers):
+            pool.spawn_n(self._worker, dst_path)
+        pool.waitall()
+        if self._error is not None:
+            six.reraise(*self._error)
+
+        if self._hashed_to != self.size:
+            raise IOError(_('Only %(hashed)d of %(size)d bytes of image '
+                            '%(image_id)s were downloaded')
+                          % {'hashed': self._hashed_to, 'size': self.size,
+                             'image_id': image_id})
+        md5 = self._md5.hexdigest()
+        if checksum and md5 != checksum:
+            raise exception.ImageUnacceptable(
+                image_id=image_id,
+                reason=_('checksum %(md5)s does not match the expected '
+                         '%(checksum)s') % {'md5': md5,
+                                            'checksum': checksum})
+
+        seconds = time.time() - started_at
+        rate = self.size / seconds / units.Mi if seconds else 0.0
+        LOG.info(_('Downloaded %(size)d bytes of image %(image_id)s in '
+                   '%(seconds).2f seconds (%(rate).1f MB/s) using '
+                   '%(workers)d connections'),
+                 {'size': self.size, 'image_id': image_id,
+                  'seconds': seconds, 'rate': rate, 'workers': workers})
+        return {'size': self.size, 'seconds': seconds, 'rate': rate,
+                'md5': md5, 'workers': workers}
@@ -0,0 +1,113 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of instance metadata shared with the services which change it.
+
+The metadata service caches lookups and rendered responses in a
+nova.cache_utils client, which is shared by every worker and service using
+the same memcached_servers.  Each instance has a cache generation, and cached
+responses are only used while the generation they were stored with is
+current.  Changes to the metadata, security groups or network info of an
+instance start a new generation, and drop its cached lookups.
+
+Invalidation requires memcached_servers: without it each service has its
+own in process cache, which the others cannot invalidate, so the services
+making changes skip it.  The metadata service then serves what it has
+cached until it expires.
+
+This module is kept free of heavy imports, so that the compute and network
+APIs and the objects can use it.
+"""
+
+import hashlib
+
+from oslo.config import cfg
+
+from nova import cache_utils
+from nova.openstack.common import uuidutils
+
+CONF = cfg.CONF
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+# NOTE: A generation outlives the entries stored with it; when it expires
+# the next request just starts a new one.
+GENERATION_EXPIRATION = 60 * 60
+
+# Lookups which are cached per instance by nova.api.metadata.base.
+LOOKUPS = ('secgroups', 'mappings', 'ec2-ids', 'nw-info')
+
+_CLIENT = None
+
+
+def get_client():
+    global _CLIENT
+
+    if _CLIENT is None:
+        _CLIENT = cache_utils.get_client()
+
+    return _CLIENT
+
+
+def reset():
+    """Reset the cache, mainly for testing purposes."""
+    global _CLIENT
+
+    _CLIENT = None
+
+
+def lookup_key(name, instance_uuid):
+    return 'metadata-%s-%s' % (name, instance_uuid)
+
+
+def _generation_key(instance_uuid):
+    return 'metadata-generation-%s' % instance_uuid
+
+
+def get_generation(instance_uuid):
+    """Return the current cache generation of an instance."""
+    client = get_client()
+    key = _generation_key(instance_uuid)
+    generation = client.get(key)
+    if generation is None:
+        # NOTE: add() rather than set(), so that a generation started by a
+        # concurrent invalidate() is not replaced.
+        client.add(key, uuidutils.generate_uuid(), GENERATION_EXPIRATION)
+        generation = client.get(key)
+    return generation
+
+
+def invalidate(instance_uuid):
+    """Stop serving anything cached about the metadata of an instance."""
+    if not CONF.memcached_servers:
+        return
+    client = get_client()
+    client.set(_generation_key(instance_uuid), uuidutils.generate_uuid(),
+               GENERATION_EXPIRATION)
+    client.delete_multi([lookup_key(name, instance_uuid)
+                         for name in LOOKUPS])
+
+
+def network_info_updated(instance_uuid, network_info_json):
+    """Invalidate the cache of an instance if its network info changed.
+
+    The network info cache is refreshed far more often than it changes,
+    including by the metadata service itself, so a digest of the last
+    network info seen is kept to tell the two apart.
+    """
+    if not CONF.memcached_servers:
+        return
+    digest = hashlib.md5(network_info_json or '').hexdigest()
+    client = get_client()
+    key = lookup_key('nw-digest', instance_uuid)
+    if client.get(key) != digest:
+        invalidate(instance_uuid)
+        client.set(key, digest, GENERATION_EXPIRATION)
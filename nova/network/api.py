@@ -22,6 +22,7 @@ import inspect
 from nova.compute import flavors
 from nova.db import base
 from nova import exception
+from nova import metadata_cache
 from nova.network import floating_ips
 from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
@@ -316,6 +317,7 @@ class API(base.Base):
                     instance_obj.Instance(), instance)
         self.network_rpcapi.deallocate_for_instance(context, instance=instance,
                 requested_networks=requested_networks)
+        metadata_cache.invalidate(instance['uuid'])
 
     # NOTE(danms): Here for neutron compatibility
     def allocate_port_for_instance(self, context, instance, port_id,
@@ -171,6 +171,39 @@ CONF.import_opt('network_topic', 'nova.network.rpcapi')
 CONF.import_opt('fake_network', 'nova.network.linux_net')
 
 
+def _ip_filter_to_like_pattern(ip_filter):
+    """Return a SQL LIKE pattern matching every address that the ip filter
+    regular expression matches from its start, or None if the expression
+    is not simple enough to turn into one.
+
+    The pattern may match more addresses than the expression, for example
+    because LIKE ignores case, so matches still need to be checked against
+    the expression.
+    """
+    if ip_filter.startswith('^'):
+        ip_filter = ip_filter[1:]
+    pattern = []
+    anchored = False
+    i = 0
+    while i < len(ip_filter):
+        char = ip_filter[i]
+        if char == '\\' and ip_filter[i + 1:i + 2] in ('.', ':'):
+            pattern.append(ip_filter[i + 1])
+            i += 1
+        elif char == '.':
+            pattern.append('_')
+        elif char == '$' and i == len(ip_filter) - 1:
+            anchored = True
+        elif char.isalnum() or char == ':':
+            pattern.append(char)
+        else:
+            return None
+        i += 1
+    if not anchored:
+        pattern.append('%')
+    return ''.join(pattern)
+
+
 class RPCAllocateFixedIP(object):
     """Mixin class originally for FlatDCHP and VLAN network managers.
 
@@ -409,6 +442,43 @@ class NetworkManager(manager.Manager):
         return []
 
     def get_instance_uuids_by_ip_filter(self, context, filters):
+        # NOTE: IPv6 addresses are worked out from the MAC address of each
+        # VIF rather than stored, so they can only be found by a scan.
+        if 'ip6' in filters:
+            return self._scan_instance_uuids_by_ip_filter(context, filters)
+
+        fixed_ip_filter = filters.get('fixed_ip')
+        ip_filter = re.compile(str(filters.get('ip')))
+        patterns = []
+        if fixed_ip_filter:
+            patterns.append(str(fixed_ip_filter))
+        if 'ip' in filters:
+            pattern = _ip_filter_to_like_pattern(str(filters['ip']))
+            if pattern is None:
+                return self._scan_instance_uuids_by_ip_filter(context,
+                                                              filters)
+            patterns.append(pattern)
+
+        results = []
+        seen = set()
+        for pattern in patterns:
+            for row in self.db.fixed_ip_search_by_address(context, pattern):
+                address = str(row['address'])
+                floating_address = row['floating_address']
+                if address == fixed_ip_filter or ip_filter.match(address):
+                    ip = address
+                elif (floating_address is not None and
+                        ip_filter.match(str(floating_address))):
+                    ip = str(floating_address)
+                else:
+                    continue
+                if (row['instance_uuid'], ip) not in seen:
+                    seen.add((row['instance_uuid'], ip))
+                    results.append({'instance_uuid': row['instance_uuid'],
+                                    'ip': ip})
+        return results
+
+    def _scan_instance_uuids_by_ip_filter(self, context, filters):
         fixed_ip_filter = filters.get('fixed_ip')
         ip_filter = re.compile(str(filters.get('ip')))
         ipv6_filter = re.compile(str(filters.get('ip6')))
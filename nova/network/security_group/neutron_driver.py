@@ -23,6 +23,7 @@ from webob import exc
 
 from nova.compute import api as compute_api
 from nova import exception
+from nova import metadata_cache
 from nova.network import neutronv2
 from nova.network.security_group import security_group_base
 from nova.objects import security_group
@@ -442,6 +443,7 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
             except Exception:
                 with excutils.save_and_reraise_exception():
                     LOG.exception(_("Neutron Error:"))
+        metadata_cache.invalidate(instance['uuid'])
 
     @wrap_check_security_groups_policy
     def remove_from_instance(self, context, instance, security_group_name):
@@ -496,6 +498,8 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
             except Exception:
                 with excutils.save_and_reraise_exception():
                     LOG.exception(_("Neutron Error:"))
+        if found_security_group:
+            metadata_cache.invalidate(instance['uuid'])
         if not found_security_group:
             msg = (_("Security group %(security_group_name)s not associated "
                      "with the instance %(instance)s") %
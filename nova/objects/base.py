@@ -17,6 +17,7 @@
 import collections
 import copy
 import functools
+import hashlib
 
 import netaddr
 from oslo import messaging
@@ -26,6 +27,7 @@ from nova import context
 from nova import exception
 from nova.objects import fields
 from nova.openstack.common.gettextutils import _
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import versionutils
 
@@ -77,6 +79,31 @@ def make_class_properties(cls):
         setattr(cls, name, property(getter, setter))
 
 
+def make_class_codecs(cls):
+    """Precompile the primitive codecs for each of a class' fields.
+
+    This is done once, when the class is defined, so that serializing and
+    hydrating an object is a tight loop over the resulting
+    (name, attrname, to_primitive, from_primitive) tuples rather than a
+    trip through the property and Field machinery for every value.
+    """
+    cls._obj_codecs = tuple(
+        (name, get_attrname(name)) + _get_primitive_codecs(field)
+        for name, field in cls.fields.iteritems())
+
+
+def _get_primitive_codecs(field):
+    if hasattr(field, 'get_primitive_codecs'):
+        return field.get_primitive_codecs()
+
+    # NOTE: A bare FieldType may be used in place of a Field, in which
+    # case there is nothing to precompile and we mirror what the property
+    # setter would have done with the deserialized value.
+    def from_primitive(obj, attr, value):
+        return field.coerce(obj, attr, field.from_primitive(obj, attr, value))
+    return field.to_primitive, from_primitive
+
+
 class NovaObjectMetaclass(type):
     """Metaclass that allows tracking of object classes."""
 
@@ -91,6 +118,7 @@ class NovaObjectMetaclass(type):
         else:
             # Add the subclass to NovaObject._obj_classes
             make_class_properties(cls)
+            make_class_codecs(cls)
             cls._obj_classes[cls.obj_name()].append(cls)
 
 
@@ -138,8 +166,11 @@ def remotable(fn):
         # Force this to be set if it wasn't before.
         self._context = ctxt
         if NovaObject.indirection_api:
-            updates, result = NovaObject.indirection_api.object_action(
-                ctxt, self, fn.__name__, args, kwargs)
+            if fn.__name__ in self.obj_delta_methods:
+                action = NovaObject.indirection_api.object_delta_action
+            else:
+                action = NovaObject.indirection_api.object_action
+            updates, result = action(ctxt, self, fn.__name__, args, kwargs)
             for key, value in updates.iteritems():
                 if key in self.fields:
                     field = self.fields[key]
@@ -179,6 +210,15 @@ class NovaObject(object):
     fields = {}
     obj_extra_fields = []
 
+    # The precompiled field codecs, see make_class_codecs()
+    _obj_codecs = ()
+
+    # Remotable methods which only need the changed fields of the object
+    # to do their job, and the fields which are sent along with those to
+    # identify the object on the remote side. See obj_to_delta_primitive().
+    obj_delta_methods = []
+    obj_identity_fields = []
+
     def __init__(self, context=None, **kwargs):
         self._changed_fields = set()
         self._context = context
@@ -230,10 +270,13 @@ class NovaObject(object):
         self.VERSION = objver
         objdata = primitive['nova_object.data']
         changes = primitive.get('nova_object.changes', [])
-        for name, field in self.fields.items():
+        # NOTE: Set the underlying storage directly instead of going
+        # through the property setters. The codec already returns the
+        # coerced value, and change tracking is overwritten below anyway.
+        for name, attrname, _to_primitive, from_primitive in cls._obj_codecs:
             if name in objdata:
-                setattr(self, name, field.from_primitive(self, name,
-                                                         objdata[name]))
+                setattr(self, attrname,
+                        from_primitive(self, name, objdata[name]))
         self._changed_fields = set([x for x in changes if x in self.fields])
         return self
 
@@ -295,20 +338,44 @@ class NovaObject(object):
         This calls to_primitive() for each item in fields.
         """
         primitive = dict()
-        for name, field in self.fields.items():
-            if self.obj_attr_is_set(name):
-                primitive[name] = field.to_primitive(self, name,
-                                                     getattr(self, name))
+        for name, attrname, to_primitive, _from_primitive in self._obj_codecs:
+            if hasattr(self, attrname):
+                value = getattr(self, attrname)
+                if to_primitive is not None:
+                    value = to_primitive(self, name, value)
+                primitive[name] = value
         if target_version:
             self.obj_make_compatible(primitive, target_version)
         obj = {'nova_object.name': self.obj_name(),
                'nova_object.namespace': 'nova',
                'nova_object.version': target_version or self.VERSION,
                'nova_object.data': primitive}
-        if self.obj_what_changed():
-            obj['nova_object.changes'] = list(self.obj_what_changed())
+        changes = self.obj_what_changed()
+        if changes:
+            obj['nova_object.changes'] = list(changes)
         return obj
 
+    def obj_to_delta_primitive(self):
+        """Dehydrate only the changes of this object.
+
+        The primitive carries the fields named in obj_identity_fields and
+        those which have changed. Every other field which is set is only
+        summarized by a fingerprint of its serialized form, which lets the
+        remote side figure out which values it needs to send back.
+
+        :returns: A (primitive, fingerprints) tuple, where fingerprints is a
+                  dict of field name to obj_fingerprint() of its primitive.
+        """
+        primitive = self.obj_to_primitive()
+        data = primitive['nova_object.data']
+        keep = set(self.obj_identity_fields)
+        keep.update(primitive.get('nova_object.changes', []))
+        fingerprints = {}
+        for name in data.keys():
+            if name not in keep:
+                fingerprints[name] = obj_fingerprint(data.pop(name))
+        return primitive, fingerprints
+
     def obj_load_attr(self, attrname):
         """Load an additional attribute from the real object.
 
@@ -329,11 +396,10 @@ class NovaObject(object):
     def obj_what_changed(self):
         """Returns a set of fields that have been modified."""
         changes = set(self._changed_fields)
-        for field in self.fields:
-            if (self.obj_attr_is_set(field) and
-                    isinstance(self[field], NovaObject) and
-                    self[field].obj_what_changed()):
-                changes.add(field)
+        for name, attrname, _to_primitive, _from_primitive in self._obj_codecs:
+            value = getattr(self, attrname, None)
+            if isinstance(value, NovaObject) and value.obj_what_changed():
+                changes.add(name)
         return changes
 
     def obj_get_changes(self):
@@ -600,6 +666,11 @@ def obj_to_primitive(obj):
         return obj
 
 
+def obj_fingerprint(primitive):
+    """Return a short, stable digest of a serialized field value."""
+    return hashlib.md5(jsonutils.dumps(primitive, sort_keys=True)).hexdigest()
+
+
 def obj_make_list(context, list_obj, item_cls, db_list, **extra_args):
     """Construct an object list from a list of primitives.
 
@@ -96,6 +96,14 @@ class AbstractFieldType(six.with_metaclass(abc.ABCMeta, object)):
 
 
 class FieldType(AbstractFieldType):
+    # NOTE: These are hints for the precompiled codecs built by
+    # Field.get_primitive_codecs(). A type sets primitive_passthrough if
+    # its to_primitive() and from_primitive() return the value unchanged,
+    # and primitive_coerced if its from_primitive() already returns a
+    # properly-typed value which does not need another pass of coerce().
+    primitive_passthrough = False
+    primitive_coerced = False
+
     @staticmethod
     def coerce(obj, attr, value):
         return value
@@ -199,6 +207,46 @@ class Field(object):
         else:
             return self._type.to_primitive(obj, attr, value)
 
+    def get_primitive_codecs(self):
+        """Return a pair of fast (de)serialization functions for this field.
+
+        The first item serializes a value exactly like to_primitive(),
+        or is None if the value can be used as-is. The second item takes
+        a primitive and returns the value that from_primitive() followed by
+        coerce() would produce, skipping the coerce() step where the type
+        guarantees that its deserialized form is already trusted.
+
+        Both functions take the same (obj, attr, value) arguments as
+        to_primitive() and from_primitive().
+        """
+        field_type = self._type
+        coerce = self.coerce
+
+        if field_type.primitive_passthrough:
+            return None, coerce
+
+        type_to_primitive = field_type.to_primitive
+        type_from_primitive = field_type.from_primitive
+
+        def to_primitive(obj, attr, value):
+            if value is None:
+                return None
+            return type_to_primitive(obj, attr, value)
+
+        if field_type.primitive_coerced:
+            def from_primitive(obj, attr, value):
+                if value is None:
+                    return coerce(obj, attr, None)
+                return type_from_primitive(obj, attr, value)
+        else:
+            def from_primitive(obj, attr, value):
+                if value is None:
+                    return coerce(obj, attr, None)
+                return coerce(obj, attr,
+                              type_from_primitive(obj, attr, value))
+
+        return to_primitive, from_primitive
+
     def describe(self):
         """Return a short string describing the type of this field."""
         name = self._type.describe()
@@ -207,6 +255,8 @@ class Field(object):
 
 
 class String(FieldType):
+    primitive_passthrough = True
+
     @staticmethod
     def coerce(obj, attr, value):
         # FIXME(danms): We should really try to avoid the need to do this
@@ -219,6 +269,8 @@ class String(FieldType):
 
 
 class UUID(FieldType):
+    primitive_passthrough = True
+
     @staticmethod
     def coerce(obj, attr, value):
         # FIXME(danms): We should actually verify the UUIDness here
@@ -226,23 +278,31 @@ class UUID(FieldType):
 
 
 class Integer(FieldType):
+    primitive_passthrough = True
+
     @staticmethod
     def coerce(obj, attr, value):
         return int(value)
 
 
 class Float(FieldType):
+    primitive_passthrough = True
+
     def coerce(self, obj, attr, value):
         return float(value)
 
 
 class Boolean(FieldType):
+    primitive_passthrough = True
+
     @staticmethod
     def coerce(obj, attr, value):
         return bool(value)
 
 
 class DateTime(FieldType):
+    primitive_coerced = True
+
     @staticmethod
     def coerce(obj, attr, value):
         if isinstance(value, six.string_types):
@@ -263,6 +323,8 @@ class DateTime(FieldType):
 
 
 class IPAddress(FieldType):
+    primitive_coerced = True
+
     @staticmethod
     def coerce(obj, attr, value):
         try:
@@ -335,6 +397,10 @@ class IPV6Network(IPNetwork):
 class CompoundFieldType(FieldType):
     def __init__(self, element_type, **field_args):
         self._element_type = Field(element_type, **field_args)
+        # NOTE: A container is only as trusted as its elements. The
+        # container itself is always rebuilt during (de)serialization, so
+        # it is never a passthrough.
+        self.primitive_coerced = element_type.primitive_coerced
 
 
 class List(CompoundFieldType):
@@ -384,6 +450,10 @@ class Dict(CompoundFieldType):
 
 
 class Object(FieldType):
+    # NOTE: obj_from_primitive() hydrates the exact class named in
+    # the primitive, so the type check done by coerce() is redundant there.
+    primitive_coerced = True
+
     def __init__(self, obj_name, **kwargs):
         self._obj_name = obj_name
         super(Object, self).__init__(**kwargs)
@@ -414,6 +484,8 @@ class Object(FieldType):
 
 
 class NetworkModel(FieldType):
+    primitive_coerced = True
+
     @staticmethod
     def coerce(obj, attr, value):
         if isinstance(value, network_model.NetworkInfo):
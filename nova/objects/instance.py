@@ -166,6 +166,11 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
 
     obj_extra_fields = ['name']
 
+    # NOTE: save() only looks at what has changed, plus cell_name to
+    # decide how to propagate the update, so it can be remoted as a delta.
+    obj_delta_methods = ['save']
+    obj_identity_fields = ['id', 'uuid', 'cell_name']
+
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
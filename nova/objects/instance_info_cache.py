@@ -16,6 +16,7 @@ from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova import db
 from nova import exception
+from nova import metadata_cache
 from nova.objects import base
 from nova.objects import fields
 from nova.openstack.common.gettextutils import _
@@ -89,6 +90,8 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
                 self, 'network_info', self.network_info)
             rv = db.instance_info_cache_update(context, self.instance_uuid,
                                                {'network_info': nw_info_json})
+            metadata_cache.network_info_updated(self.instance_uuid,
+                                                nw_info_json)
             if update_cells and rv:
                 self._info_cache_cells_update(context, rv)
         self.obj_reset_changes()
@@ -96,6 +99,7 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
     @base.remotable
     def delete(self, context):
         db.instance_info_cache_delete(context, self.instance_uuid)
+        metadata_cache.invalidate(self.instance_uuid)
 
     @base.remotable
     def refresh(self, context):
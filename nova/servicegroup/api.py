@@ -33,8 +33,21 @@ servicegroup_driver_opt = cfg.StrOpt('servicegroup_driver',
                                           'service (valid options are: '
                                           'db, zk, mc)')
 
+# NOTE: This is read by both the db servicegroup driver and the conductor,
+# which is why it lives here rather than in the conductor manager.
+heartbeat_flush_window_opt = cfg.FloatOpt(
+        'heartbeat_flush_window',
+        default=0,
+        help='If set, services send their periodic heartbeats to the '
+             'conductor without waiting for a reply, and the conductor '
+             'writes the heartbeats received within this many seconds in a '
+             'single database update. Heartbeats are recorded at the time '
+             'the first of them was received, so this must be well below '
+             'service_down_time.')
+
 CONF = cfg.CONF
 CONF.register_opt(servicegroup_driver_opt)
+CONF.register_opt(heartbeat_flush_window_opt, group='conductor')
 
 # NOTE(geekinutah): By default drivers wait 5 seconds before reporting
 INITIAL_REPORTING_DELAY = 5
@@ -138,6 +151,14 @@ class API(object):
         LOG.debug(_('Returns one member of the [%s] group'), group_id)
         return self._driver.get_one(group_id)
 
+    def get_liveness(self, group_id):
+        """Returns a dict mapping members of the given group to whether
+        they are up.
+        """
+        LOG.debug(_('Returns the liveness of the members of the [%s] '
+                    'group'), group_id)
+        return self._driver.get_liveness(group_id)
+
 
 class ServiceGroupDriver(object):
     """Base class for ServiceGroup drivers."""
@@ -170,3 +191,11 @@ class ServiceGroupDriver(object):
         if length == 0:
             return None
         return random.choice(members)
+
+    def get_liveness(self, group_id):
+        """The default behavior of get_liveness is to map each member
+        returned by get_all() to True, so members which are down are left
+        out.
+        """
+        members = self.get_all(group_id) or []
+        return dict((member, True) for member in members)
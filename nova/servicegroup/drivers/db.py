@@ -24,7 +24,20 @@ from nova.openstack.common import timeutils
 from nova.servicegroup import api
 
 
+db_driver_opts = [
+    cfg.BoolOpt('servicegroup_db_liveness_cache',
+                default=False,
+                help='Keep the last heartbeat of every member of a '
+                     'servicegroup in memory, refreshed from the database '
+                     'at most every report_interval seconds, and answer '
+                     'liveness checks from it'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(db_driver_opts)
+CONF.import_opt('heartbeat_flush_window', 'nova.servicegroup.api',
+                group='conductor')
+CONF.import_opt('report_interval', 'nova.service')
 CONF.import_opt('service_down_time', 'nova.service')
 
 LOG = logging.getLogger(__name__)
@@ -35,6 +48,9 @@ class DbDriver(api.ServiceGroupDriver):
     def __init__(self, *args, **kwargs):
         self.db_allowed = kwargs.get('db_allowed', True)
         self.conductor_api = conductor.API(use_local=self.db_allowed)
+        # NOTE: Maps a group to the time it was last read from the database
+        # and the last heartbeat of each host in it.
+        self._heartbeats = {}
 
     def join(self, member_id, group_id, service=None):
         """Join the given service with it's group."""
@@ -51,10 +67,8 @@ class DbDriver(api.ServiceGroupDriver):
             service.tg.add_timer(report_interval, self._report_state,
                                  api.INITIAL_REPORTING_DELAY, service)
 
-    def is_up(self, service_ref):
-        """Moved from nova.utils
-        Check whether a service is up based on last heartbeat.
-        """
+    @staticmethod
+    def _last_heartbeat(service_ref):
         last_heartbeat = service_ref['updated_at'] or service_ref['created_at']
         if isinstance(last_heartbeat, six.string_types):
             # NOTE(russellb) If this service_ref came in over rpc via
@@ -65,34 +79,94 @@ class DbDriver(api.ServiceGroupDriver):
             # Objects have proper UTC timezones, but the timeutils comparison
             # below does not (and will fail)
             last_heartbeat = last_heartbeat.replace(tzinfo=None)
+        return last_heartbeat
+
+    @staticmethod
+    def _heartbeat_is_recent(last_heartbeat, now):
         # Timestamps in DB are UTC.
-        elapsed = timeutils.delta_seconds(last_heartbeat, timeutils.utcnow())
-        LOG.debug('DB_Driver.is_up last_heartbeat = %(lhb)s elapsed = %(el)s',
-                  {'lhb': str(last_heartbeat), 'el': str(elapsed)})
+        elapsed = timeutils.delta_seconds(last_heartbeat, now)
         return abs(elapsed) <= CONF.service_down_time
 
+    def _get_heartbeats(self, group_id):
+        """Return the last heartbeat of each host in the group, reading
+        the group from the database if it has not been read in the last
+        report_interval seconds.
+        """
+        now = timeutils.utcnow()
+        cached = self._heartbeats.get(group_id)
+        if (cached is not None and
+                timeutils.delta_seconds(cached[0], now) <
+                CONF.report_interval):
+            return cached[1]
+        ctxt = context.get_admin_context()
+        services = self.conductor_api.service_get_all_by_topic(ctxt, group_id)
+        heartbeats = dict((service['host'], self._last_heartbeat(service))
+                          for service in services)
+        self._heartbeats[group_id] = (now, heartbeats)
+        return heartbeats
+
+    def is_up(self, service_ref):
+        """Moved from nova.utils
+        Check whether a service is up based on last heartbeat.
+        """
+        now = timeutils.utcnow()
+        if CONF.servicegroup_db_liveness_cache and service_ref.get('topic'):
+            # NOTE: A recent heartbeat in the cache is enough to call the
+            # service up.  Otherwise the service_ref may be newer than the
+            # cache, so it is checked as well.
+            heartbeats = self._get_heartbeats(service_ref['topic'])
+            cached = heartbeats.get(service_ref['host'])
+            if (cached is not None and
+                    self._heartbeat_is_recent(cached, now)):
+                return True
+        last_heartbeat = self._last_heartbeat(service_ref)
+        LOG.debug('DB_Driver.is_up last_heartbeat = %(lhb)s now = %(now)s',
+                  {'lhb': str(last_heartbeat), 'now': str(now)})
+        return self._heartbeat_is_recent(last_heartbeat, now)
+
+    def get_liveness(self, group_id):
+        """Returns a dict mapping each member of the given group to
+        whether it is up.
+        """
+        now = timeutils.utcnow()
+        if CONF.servicegroup_db_liveness_cache:
+            heartbeats = self._get_heartbeats(group_id)
+        else:
+            ctxt = context.get_admin_context()
+            services = self.conductor_api.service_get_all_by_topic(ctxt,
+                                                                   group_id)
+            heartbeats = dict((service['host'],
+                               self._last_heartbeat(service))
+                              for service in services)
+        return dict((host, self._heartbeat_is_recent(last_heartbeat, now))
+                    for host, last_heartbeat in heartbeats.iteritems())
+
     def get_all(self, group_id):
         """Returns ALL members of the given group
         """
         LOG.debug(_('DB_Driver: get_all members of the %s group') % group_id)
-        rs = []
-        ctxt = context.get_admin_context()
-        services = self.conductor_api.service_get_all_by_topic(ctxt, group_id)
-        for service in services:
-            if self.is_up(service):
-                rs.append(service['host'])
-        return rs
+        return [host for host, is_up in self.get_liveness(group_id).items()
+                if is_up]
 
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
         ctxt = context.get_admin_context()
         state_catalog = {}
         try:
-            report_count = service.service_ref['report_count'] + 1
-            state_catalog['report_count'] = report_count
-
-            service.service_ref = self.conductor_api.service_update(ctxt,
-                    service.service_ref, state_catalog)
+            if CONF.conductor.heartbeat_flush_window > 0:
+                # NOTE: The conductor increments report_count itself and
+                # returns nothing, unless it is too old for heartbeats and
+                # the service had to be updated in full.
+                service_ref = self.conductor_api.service_heartbeat(ctxt,
+                        service.service_ref)
+                if service_ref is not None:
+                    service.service_ref = service_ref
+            else:
+                report_count = service.service_ref['report_count'] + 1
+                state_catalog['report_count'] = report_count
+
+                service.service_ref = self.conductor_api.service_update(ctxt,
+                        service.service_ref, state_catalog)
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(service, 'model_disconnected', False):
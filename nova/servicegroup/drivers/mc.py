@@ -19,11 +19,11 @@
 
 from oslo.config import cfg
 
+from nova import cache_utils
 from nova import conductor
 from nova import context
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova.openstack.common import timeutils
 from nova.servicegroup import api
 
@@ -42,7 +42,7 @@ class MemcachedDriver(api.ServiceGroupDriver):
         test = kwargs.get('test')
         if not CONF.memcached_servers and not test:
             raise RuntimeError(_('memcached_servers not defined'))
-        self.mc = memorycache.get_client()
+        self.mc = cache_utils.get_client()
         self.db_allowed = kwargs.get('db_allowed', True)
         self.conductor_api = conductor.API(use_local=self.db_allowed)
 
@@ -69,18 +69,25 @@ class MemcachedDriver(api.ServiceGroupDriver):
         key = "%(topic)s:%(host)s" % service_ref
         return self.mc.get(str(key)) is not None
 
+    def get_liveness(self, group_id):
+        """Returns a dict mapping each member of the given group to
+        whether it is up.
+        """
+        ctxt = context.get_admin_context()
+        services = self.conductor_api.service_get_all_by_topic(ctxt, group_id)
+        keys = dict((service['host'], str("%(topic)s:%(host)s" % service))
+                    for service in services)
+        heartbeats = self.mc.get_multi(keys.values())
+        return dict((host, key in heartbeats)
+                    for host, key in keys.iteritems())
+
     def get_all(self, group_id):
         """Returns ALL members of the given group
         """
         LOG.debug(_('Memcached_Driver: get_all members of the %s group') %
                   group_id)
-        rs = []
-        ctxt = context.get_admin_context()
-        services = self.conductor_api.service_get_all_by_topic(ctxt, group_id)
-        for service in services:
-            if self.is_up(service):
-                rs.append(service['host'])
-        return rs
+        return [host for host, is_up in self.get_liveness(group_id).items()
+                if is_up]
 
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
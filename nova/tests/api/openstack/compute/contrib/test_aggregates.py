@@ -15,9 +15,11 @@
 
 """Tests for the aggregates admin api."""
 
+import mock
 from webob import exc
 
 from nova.api.openstack.compute.contrib import aggregates
+from nova.api.openstack import extensions
 from nova import context
 from nova import exception
 from nova import test
@@ -45,7 +47,9 @@ class AggregateTestCase(test.NoDBTestCase):
 
     def setUp(self):
         super(AggregateTestCase, self).setUp()
-        self.controller = aggregates.AggregateController()
+        self.ext_mgr = extensions.ExtensionManager()
+        self.ext_mgr.extensions = {'os-image-precache': True}
+        self.controller = aggregates.AggregateController(self.ext_mgr)
         self.req = FakeRequest()
         self.user_req = fakes.HTTPRequest.blank('/v2/os-aggregates')
         self.context = self.req.environ['nova.context']
@@ -457,6 +461,47 @@ class AggregateTestCase(test.NoDBTestCase):
         self.assertRaises(exc.HTTPBadRequest, self.controller.action,
                           self.req, "1", body=body)
 
+    def test_cache_image(self):
+        body = {"cache_image": {"image_id": "fake-image"}}
+        with mock.patch.object(self.controller.api,
+                               "cache_image") as cache_image:
+            result = self.controller.action(self.req, "1", body=body)
+        self.assertEqual(202, result.status_int)
+        cache_image.assert_called_once_with(self.context, "1", "fake-image")
+
+    def test_cache_image_with_bad_aggregate(self):
+        body = {"cache_image": {"image_id": "fake-image"}}
+        with mock.patch.object(self.controller.api, "cache_image",
+                side_effect=exception.AggregateNotFound(aggregate_id="1")):
+            self.assertRaises(exc.HTTPNotFound, self.controller.action,
+                              self.req, "1", body=body)
+
+    def test_cache_image_with_bad_image(self):
+        body = {"cache_image": {"image_id": "fake-image"}}
+        with mock.patch.object(self.controller.api, "cache_image",
+                side_effect=exception.ImageNotFound(image_id="fake-image")):
+            self.assertRaises(exc.HTTPBadRequest, self.controller.action,
+                              self.req, "1", body=body)
+
+    def test_cache_image_with_missing_image_id(self):
+        body = {"cache_image": {"image": "fake-image"}}
+        self.assertRaises(exc.HTTPBadRequest, self.controller.action,
+                          self.req, "1", body=body)
+
+    def test_cache_image_extension_not_loaded(self):
+        self.ext_mgr.extensions = {}
+        body = {"cache_image": {"image_id": "fake-image"}}
+        with mock.patch.object(self.controller.api,
+                               "cache_image") as cache_image:
+            self.assertRaises(exc.HTTPBadRequest, self.controller.action,
+                              self.req, "1", body=body)
+        self.assertFalse(cache_image.called)
+
+    def test_cache_image_no_admin(self):
+        self.assertRaises(exception.PolicyNotAuthorized,
+                          self.controller._cache_image, self.user_req, "1",
+                          {"image_id": "fake-image"})
+
     def test_delete_aggregate(self):
         def stub_delete_aggregate(context, aggregate):
             self.assertEqual(context, self.context, "context")
@@ -14,10 +14,12 @@
 #    under the License.
 
 from lxml import etree
+import mock
 import testtools
 import webob.exc
 
 from nova.api.openstack.compute.contrib import hosts as os_hosts
+from nova.api.openstack import extensions
 from nova.compute import power_state
 from nova.compute import vm_states
 from nova import context as context_maker
@@ -132,7 +134,9 @@ class HostTestCase(test.TestCase):
 
     def setUp(self):
         super(HostTestCase, self).setUp()
-        self.controller = os_hosts.HostController()
+        self.ext_mgr = extensions.ExtensionManager()
+        self.ext_mgr.extensions = {'os-image-precache': True}
+        self.controller = os_hosts.HostController(self.ext_mgr)
         self.hosts_api = self.controller.api
         self.req = FakeRequest()
 
@@ -277,6 +281,45 @@ class HostTestCase(test.TestCase):
         self.assertEqual(result["status"], "disabled")
         self.assertEqual(result["maintenance_mode"], "on_maintenance")
 
+    def test_cache_image(self):
+        body = {'cache_image': {'image_id': 'fake-image'}}
+        with mock.patch.object(self.hosts_api, 'cache_image') as cache_image:
+            result = self.controller.cache_image(self.req, 'host_c1', body)
+        self.assertEqual(202, result.status_int)
+        cache_image.assert_called_once_with(
+            self.req.environ['nova.context'], 'fake-image', ['host_c1'])
+
+    def test_cache_image_bad_host(self):
+        body = {'cache_image': {'image_id': 'fake-image'}}
+        with mock.patch.object(self.hosts_api, 'cache_image',
+                side_effect=exception.ComputeHostNotFound(host='dummydest')):
+            self.assertRaises(webob.exc.HTTPNotFound,
+                              self.controller.cache_image,
+                              self.req, 'dummydest', body)
+
+    def test_cache_image_bad_image(self):
+        body = {'cache_image': {'image_id': 'fake-image'}}
+        with mock.patch.object(self.hosts_api, 'cache_image',
+                side_effect=exception.ImageNotFound(image_id='fake-image')):
+            self.assertRaises(webob.exc.HTTPBadRequest,
+                              self.controller.cache_image,
+                              self.req, 'host_c1', body)
+
+    def test_cache_image_missing_image_id(self):
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          self.controller.cache_image,
+                          self.req, 'host_c1',
+                          {'cache_image': {'image': 'fake-image'}})
+
+    def test_cache_image_extension_not_loaded(self):
+        self.ext_mgr.extensions = {}
+        body = {'cache_image': {'image_id': 'fake-image'}}
+        with mock.patch.object(self.hosts_api, 'cache_image') as cache_image:
+            self.assertRaises(webob.exc.HTTPNotFound,
+                              self.controller.cache_image,
+                              self.req, 'host_c1', body)
+        self.assertFalse(cache_image.called)
+
     def test_show_forbidden(self):
         self.req.environ["nova.context"].is_admin = False
         dest = 'dummydest'
@@ -15,6 +15,7 @@
 """
 Tests For CellsManager
 """
+import contextlib
 import copy
 import datetime
 
@@ -24,6 +25,7 @@ from oslo.config import cfg
 from nova.cells import messaging
 from nova.cells import utils as cells_utils
 from nova import context
+from nova import exception
 from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.cells import fakes
@@ -251,6 +253,55 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
         self.assertEqual(call_info['sync_instances'],
                 [instances[-1], instances[0]])
 
+    def test_heal_changed_instances(self):
+        self.flags(instance_updated_at_threshold=1000,
+                   instance_heal_batch_size=2, group='cells')
+        fake_context = context.RequestContext('fake', 'fake')
+        now = timeutils.utcnow()
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(now)
+        start = now - datetime.timedelta(seconds=1000)
+
+        updated = [{'uuid': 'uuid1', 'updated_at': start, 'deleted': 0},
+                   {'uuid': 'uuid2', 'updated_at': now, 'deleted': 0}]
+        deleted = [{'uuid': 'uuid3', 'deleted_at': now, 'deleted': 3}]
+
+        def get_batch(cursor, context, limit):
+            self.assertEqual('yes', context.read_deleted)
+            self.assertEqual(2, limit)
+            if cursor.column == 'updated_at':
+                return [inst for inst in updated
+                        if inst['updated_at'] > cursor.position]
+            return [inst for inst in deleted
+                    if inst['deleted_at'] > cursor.position]
+
+        with contextlib.nested(
+                mock.patch.object(cells_utils.InstanceChangeCursor,
+                                  'get_batch', autospec=True,
+                                  side_effect=get_batch),
+                mock.patch.object(self.msg_runner, 'instance_update_at_top'),
+                mock.patch.object(self.msg_runner,
+                                  'instance_destroy_at_top'),
+                mock.patch.object(self.msg_runner, 'flush_instance_syncs')
+        ) as (_get_batch, update_at_top, destroy_at_top, flush):
+            self.cells_manager._heal_instances(fake_context)
+            self.assertEqual([mock.call(fake_context, updated[1])],
+                             update_at_top.call_args_list)
+            destroy_at_top.assert_called_once_with(fake_context, deleted[0])
+            flush.assert_called_once_with()
+
+            cursors = self.cells_manager.instance_change_cursors
+            self.assertEqual(['updated_at', 'deleted_at'],
+                             [cursor.column for cursor in cursors])
+            self.assertEqual([datetime.timedelta(seconds=10)] * 2,
+                             [cursor.lookback for cursor in cursors])
+            self.assertEqual([now, now],
+                             [cursor.position for cursor in cursors])
+
+            update_at_top.reset_mock()
+            self.cells_manager._heal_instances(fake_context)
+            self.assertFalse(update_at_top.called)
+
     def test_sync_instances(self):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'sync_instances')
@@ -287,6 +338,43 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
                                                       filters='fake-filters')
         self.assertEqual(expected_response, response)
 
+    def _test_service_get_all_with_timeout(self, skip):
+        self.flags(skip_timed_out_cells=skip, group='cells')
+        services = [copy.deepcopy(FAKE_SERVICES[0])]
+        responses = [messaging.Response('path!to!cell0', services, False),
+                     messaging.Response('path!to!cell1',
+                                        exception.CellTimeout(), True)]
+        self.mox.StubOutWithMock(self.msg_runner,
+                                 'service_get_all')
+        self.msg_runner.service_get_all(self.ctxt,
+                                        'fake-filters').AndReturn(responses)
+        self.mox.ReplayAll()
+        return self.cells_manager.service_get_all(self.ctxt,
+                                                  filters='fake-filters')
+
+    def test_service_get_all_skips_timed_out_cells(self):
+        response = self._test_service_get_all_with_timeout(True)
+        self.assertEqual(1, len(response))
+        self.assertEqual('path!to!cell0@host1', response[0]['host'])
+
+    def test_service_get_all_raises_on_timed_out_cells(self):
+        self.assertRaises(exception.CellTimeout,
+                          self._test_service_get_all_with_timeout, False)
+
+    def test_service_get_all_raises_other_failures(self):
+        self.flags(skip_timed_out_cells=True, group='cells')
+        responses = [messaging.Response('path!to!cell0',
+                                        exception.CellRoutingInconsistency(
+                                            reason='fake'), True)]
+        self.mox.StubOutWithMock(self.msg_runner,
+                                 'service_get_all')
+        self.msg_runner.service_get_all(self.ctxt,
+                                        'fake-filters').AndReturn(responses)
+        self.mox.ReplayAll()
+        self.assertRaises(exception.CellRoutingInconsistency,
+                          self.cells_manager.service_get_all,
+                          self.ctxt, filters='fake-filters')
+
     def test_service_get_by_compute_host(self):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'service_get_by_compute_host')
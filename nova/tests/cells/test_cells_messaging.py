@@ -17,6 +17,9 @@
 Tests For Cells Messaging module
 """
 
+import contextlib
+
+import mock
 import mox
 from oslo.config import cfg
 from oslo import messaging as oslo_messaging
@@ -528,6 +531,117 @@ class CellsMessageClassesTestCase(test.TestCase):
             self.assertEqual('response-%s' % response.cell_name,
                     response.value_or_raise())
 
+    def test_broadcast_routing_with_response_partial_timeout(self):
+        self.flags(call_timeout=0, group='cells')
+        method = 'our_fake_method'
+        method_kwargs = dict(arg1=1, arg2=2)
+        direction = 'down'
+
+        def our_fake_method(message, **kwargs):
+            return 'response-%s' % message.routing_path
+
+        fakes.stub_bcast_methods(self, 'our_fake_method', our_fake_method)
+
+        real_put_response = self.msg_runner._put_response
+
+        def fake_put_response(response_uuid, response, sender=None):
+            # Lose everything child-cell3 sends back.
+            if sender != 'child-cell3':
+                real_put_response(response_uuid, response, sender=sender)
+
+        self.stubs.Set(self.msg_runner, '_put_response', fake_put_response)
+
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt, method,
+                                                    method_kwargs,
+                                                    direction,
+                                                    run_locally=True,
+                                                    need_response=True)
+        responses = bcast_message.process()
+        # Everything but child-cell3 and its 2 children, plus a timeout
+        # for child-cell3.
+        self.assertEqual(6, len(responses))
+        failures = [response for response in responses if response.failure]
+        self.assertEqual(1, len(failures))
+        self.assertEqual('api-cell!child-cell3', failures[0].cell_name)
+        self.assertRaises(exception.CellTimeout, failures[0].value_or_raise)
+        for response in responses:
+            if not response.failure:
+                self.assertEqual('response-%s' % response.cell_name,
+                                 response.value_or_raise())
+        self.assertEqual({}, self.msg_runner.response_queues)
+
+    def test_broadcast_timeout_shrinks_at_each_hop(self):
+        self.flags(call_timeout=60, group='cells')
+        timeouts = {}
+
+        def our_fake_method(message, **kwargs):
+            timeouts[message.routing_path] = message.timeout
+
+        fakes.stub_bcast_methods(self, 'our_fake_method', our_fake_method)
+
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt,
+                                                    'our_fake_method', {},
+                                                    'down',
+                                                    run_locally=True,
+                                                    need_response=True)
+        bcast_message.process()
+        api = timeouts['api-cell']
+        child = timeouts['api-cell!child-cell2']
+        grandchild = timeouts['api-cell!child-cell2!grandchild-cell1']
+        # NOTE: Each cell has passed on a share of its time by the time
+        # it processes the message locally.
+        self.assertTrue(0 < grandchild < child < api <= 60)
+        self.assertAlmostEqual(60 * messaging._NEIGHBOR_TIMEOUT_SHARE, api,
+                               places=2)
+
+    def test_broadcast_grandchild_timeout_reported_by_child(self):
+        def our_fake_method(message, **kwargs):
+            return 'response-%s' % message.routing_path
+
+        fakes.stub_bcast_methods(self, 'our_fake_method', our_fake_method)
+
+        child_runner = fakes.get_message_runner('child-cell2')
+        real_put_response = child_runner._put_response
+
+        def fake_put_response(response_uuid, response, sender=None):
+            # Lose everything grandchild-cell1 sends back.
+            if sender != 'grandchild-cell1':
+                real_put_response(response_uuid, response, sender=sender)
+
+        self.stubs.Set(child_runner, '_put_response', fake_put_response)
+
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt,
+                                                    'our_fake_method', {},
+                                                    'down',
+                                                    run_locally=True,
+                                                    need_response=True,
+                                                    timeout=0.5)
+        responses = bcast_message.process()
+        # NOTE: child-cell2 gives up on grandchild-cell1 before the api
+        # cell gives up on child-cell2, so only the grandchild is missing.
+        self.assertEqual(8, len(responses))
+        failures = [response for response in responses if response.failure]
+        self.assertEqual(1, len(failures))
+        self.assertEqual('api-cell!child-cell2!grandchild-cell1',
+                         failures[0].cell_name)
+        self.assertRaises(exception.CellTimeout, failures[0].value_or_raise)
+
+    def test_broadcast_timeout_defaults_to_call_timeout(self):
+        self.flags(call_timeout=30, group='cells')
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt,
+                                                    'our_fake_method', {},
+                                                    'down')
+        self.assertEqual(30, bcast_message.timeout)
+        json_message = bcast_message.to_json()
+        self.assertEqual(30, jsonutils.loads(json_message)['timeout'])
+
+        message = self.msg_runner.message_from_json(json_message)
+        self.assertEqual(30, message.timeout)
+
     def test_broadcast_routing_with_response_max_hops(self):
         self.flags(max_hop_count=2, group='cells')
         method = 'our_fake_method'
@@ -1568,6 +1682,74 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.instance_destroy_at_top(self.ctxt, fake_instance)
 
+    def test_instance_sync_batch_at_top(self):
+        self.flags(instance_sync_batch_size=3, group='cells')
+        self.mox.StubOutWithMock(self.mid_db_inst, 'instance_update')
+        self.mox.StubOutWithMock(self.mid_db_inst, 'instance_destroy')
+        self.mox.ReplayAll()
+
+        with contextlib.nested(
+                mock.patch.object(self.tgt_db_inst, 'instance_update'),
+                mock.patch.object(self.tgt_db_inst, 'instance_destroy'),
+                mock.patch.object(messaging.greenthread, 'spawn_after')
+        ) as (inst_update, inst_destroy, spawn_after):
+            self.src_msg_runner.instance_update_at_top(
+                    self.ctxt, {'uuid': 'uuid1', 'display_name': 'old'})
+            self.src_msg_runner.instance_update_at_top(
+                    self.ctxt, {'uuid': 'uuid1', 'display_name': 'new'})
+            self.src_msg_runner.instance_destroy_at_top(
+                    self.ctxt, {'uuid': 'uuid2'})
+            self.assertFalse(inst_update.called)
+            self.assertFalse(inst_destroy.called)
+            self.assertEqual(1, spawn_after.call_count)
+
+            self.src_msg_runner.instance_update_at_top(
+                    self.ctxt, {'uuid': 'uuid3', 'display_name': 'foo'})
+
+        self.assertEqual(['uuid1', 'uuid3'],
+                         [c[0][1] for c in inst_update.call_args_list])
+        self.assertEqual('new',
+                         inst_update.call_args_list[0][0][2]['display_name'])
+        inst_destroy.assert_called_once_with(mock.ANY, 'uuid2',
+                                             update_cells=False)
+        spawn_after.return_value.cancel.assert_called_once_with()
+        self.assertEqual({}, self.src_msg_runner._instance_syncs)
+
+    def test_instance_sync_batch_sent_after_latency(self):
+        self.flags(instance_sync_batch_size=10,
+                   instance_sync_batch_latency=2.5, group='cells')
+        with contextlib.nested(
+                mock.patch.object(self.tgt_db_inst, 'instance_destroy'),
+                mock.patch.object(messaging.greenthread, 'spawn_after')
+        ) as (inst_destroy, spawn_after):
+            self.src_msg_runner.instance_destroy_at_top(
+                    self.ctxt, {'uuid': 'uuid1'})
+            spawn_after.assert_called_once_with(
+                    2.5, self.src_msg_runner.flush_instance_syncs)
+            self.assertFalse(inst_destroy.called)
+            # Run the timer.
+            spawn_after.call_args[0][1]()
+        inst_destroy.assert_called_once_with(mock.ANY, 'uuid1',
+                                             update_cells=False)
+
+    def test_instance_sync_batch_failure_does_not_stop_batch(self):
+        self.flags(instance_sync_batch_size=2, group='cells')
+        with contextlib.nested(
+                mock.patch.object(self.tgt_db_inst, 'instance_destroy',
+                                  side_effect=[test.TestingException, None]),
+                mock.patch.object(messaging.greenthread, 'spawn_after')
+        ) as (inst_destroy, spawn_after):
+            self.src_msg_runner.instance_destroy_at_top(
+                    self.ctxt, {'uuid': 'uuid1'})
+            self.src_msg_runner.instance_destroy_at_top(
+                    self.ctxt, {'uuid': 'uuid2'})
+        self.assertEqual(2, inst_destroy.call_count)
+
+    def test_flush_instance_syncs_empty(self):
+        with mock.patch.object(messaging, '_BroadcastMessage') as msg:
+            self.src_msg_runner.flush_instance_syncs()
+        self.assertFalse(msg.called)
+
     def test_instance_hard_delete_everywhere(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
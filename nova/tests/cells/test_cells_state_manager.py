@@ -135,6 +135,22 @@ class TestCellsStateManager(test.TestCase):
         units = 2  # 2 on host 3
         self.assertEqual(units, cap['disk_free']['units_by_mb'][str(sz)])
 
+    def test_capacity_updates_changed_hosts(self):
+        state_manager = self._get_state_manager()
+        computes = _fake_compute_node_get_all(None)
+        # host2 goes away, host3 is disabled and host4 frees some memory.
+        del computes[1]
+        computes[1]['service']['disabled'] = True
+        computes[2]['free_ram_mb'] = 600
+        self.stubs.Set(db, 'compute_node_get_all', lambda context: computes)
+        state_manager._update_our_capacity()
+
+        cap = state_manager.get_my_state().capacities
+        self.assertEqual(600, cap['ram_free']['total_mb'])
+        self.assertEqual(30 * 1024, cap['disk_free']['total_mb'])
+        self.assertEqual(12, cap['ram_free']['units_by_mb']['50'])
+        self.assertEqual(1, cap['disk_free']['units_by_mb'][str(25 * 1024)])
+
     def _get_state_manager(self, reserve_percent=0.0):
         self.flags(reserve_percent=reserve_percent, group='cells')
         return state.CellStateManager()
@@ -145,6 +161,40 @@ class TestCellsStateManager(test.TestCase):
         return my_state.capacities
 
 
+class TestFreeCapacity(test.NoDBTestCase):
+    def _brute_force_units(self, usable, per_inst):
+        if not per_inst:
+            return 0
+        return sum(int(free / per_inst) for free in usable)
+
+    def test_units(self):
+        capacity = state.FreeCapacity()
+        usable = [0, 0, 100, 512, 512, 1000, 2048, 4096.5, 65536]
+        for i, free in enumerate(usable):
+            capacity.update_host('host%d' % i, free, free)
+        self.assertEqual(sum(usable), capacity.total_free)
+        for per_inst in (0, 1, 64, 100, 512, 513, 2048, 4096, 8192, 16384,
+                         70000):
+            self.assertEqual(self._brute_force_units(usable, per_inst),
+                             capacity.units(per_inst))
+
+    def test_update_and_remove_host(self):
+        capacity = state.FreeCapacity()
+        capacity.update_host('host1', 1024, 512)
+        capacity.update_host('host2', 2048, 1024)
+        capacity.update_host('host1', 4096, 2048)
+        self.assertEqual(6144, capacity.total_free)
+        self.assertEqual(6, capacity.units(512))
+        capacity.remove_host('host2')
+        capacity.remove_host('host3')
+        self.assertEqual(4096, capacity.total_free)
+        self.assertEqual(4, capacity.units(512))
+        self.assertEqual(['host1'], capacity.hosts())
+
+    def test_units_empty(self):
+        self.assertEqual(0, state.FreeCapacity().units(512))
+
+
 class TestCellsGetCapacity(TestCellsStateManager):
     def setUp(self):
         super(TestCellsGetCapacity, self).setUp()
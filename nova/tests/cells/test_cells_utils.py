@@ -15,11 +15,13 @@
 """
 Tests For Cells Utility methods
 """
+import datetime
 import inspect
 import random
 
 from nova.cells import utils as cells_utils
 from nova import db
+from nova.openstack.common import timeutils
 from nova import test
 
 
@@ -81,6 +83,113 @@ class CellsUtilsTestCase(test.NoDBTestCase):
                  'project_id': 'fake-project'})
         self.assertEqual(call_info['shuffle'], 2)
 
+    def _stub_instance_changes(self, instances, calls):
+        def instance_get_all_by_filters(context, filters, sort_key,
+                                        sort_dir, limit=None):
+            calls.append((filters, sort_key, sort_dir, limit))
+            since = filters.values()[0]
+            result = [inst for inst in instances
+                      if inst[sort_key] is not None and
+                      inst[sort_key] >= since]
+            result.sort(key=lambda inst: inst[sort_key])
+            return result[:limit]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters',
+                instance_get_all_by_filters)
+
+    def test_instance_change_cursor(self):
+        start = datetime.datetime(2013, 12, 5, 15, 0, 0)
+        instances = []
+        for i, seconds in enumerate([1, 2, 2, 2, 3]):
+            instances.append(
+                {'uuid': 'uuid%d' % i,
+                 'updated_at': start + datetime.timedelta(seconds=seconds)})
+        calls = []
+        self._stub_instance_changes(instances, calls)
+
+        cursor = cells_utils.InstanceChangeCursor('updated_at', start)
+        batch = cursor.get_batch('fake_context', 2)
+        self.assertEqual(['uuid0', 'uuid1'], [i['uuid'] for i in batch])
+        self.assertEqual(({'changes-since': start}, 'updated_at', 'asc', 2),
+                         calls[-1])
+        # NOTE: Nothing moves until the batch is acknowledged.
+        self.assertEqual(batch, cursor.get_batch('fake_context', 2))
+        cursor.ack(batch)
+
+        # NOTE: uuid1 was already sent at the current position.
+        batch = cursor.get_batch('fake_context', 2)
+        self.assertEqual(['uuid2', 'uuid3'], [i['uuid'] for i in batch])
+        self.assertEqual(3, calls[-1][3])
+        cursor.ack(batch)
+
+        batch = cursor.get_batch('fake_context', 2)
+        self.assertEqual(['uuid4'], [i['uuid'] for i in batch])
+        cursor.ack(batch)
+        self.assertEqual([], cursor.get_batch('fake_context', 2))
+
+        # NOTE: An instance sent earlier comes back once it changes again.
+        instances[0]['updated_at'] = start + datetime.timedelta(seconds=4)
+        batch = cursor.get_batch('fake_context', 2)
+        self.assertEqual(['uuid0'], [i['uuid'] for i in batch])
+
+    def test_instance_change_cursor_same_second(self):
+        now = datetime.datetime(2013, 12, 5, 15, 0, 0)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(now)
+        instances = [{'uuid': 'uuid0', 'updated_at': now, 'vm_state': 'a'}]
+        self._stub_instance_changes(instances, [])
+
+        cursor = cells_utils.InstanceChangeCursor(
+                'updated_at', now - datetime.timedelta(seconds=60), 10)
+        batch = cursor.get_batch('fake_context', 5)
+        self.assertEqual(['a'], [i['vm_state'] for i in batch])
+        cursor.ack(batch)
+
+        # NOTE: Updated again within the same second.
+        instances[0]['vm_state'] = 'b'
+        batch = cursor.get_batch('fake_context', 5)
+        self.assertEqual(['b'], [i['vm_state'] for i in batch])
+        cursor.ack(batch)
+
+        # NOTE: Sent once more after the second has settled, then no more.
+        timeutils.advance_time_seconds(11)
+        batch = cursor.get_batch('fake_context', 5)
+        self.assertEqual(['uuid0'], [i['uuid'] for i in batch])
+        cursor.ack(batch)
+        self.assertEqual([], cursor.get_batch('fake_context', 5))
+
+    def test_instance_change_cursor_late_commit(self):
+        now = datetime.datetime(2013, 12, 5, 15, 0, 0)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(now + datetime.timedelta(seconds=30))
+        instances = [{'uuid': 'uuid0', 'updated_at': now}]
+        self._stub_instance_changes(instances, [])
+
+        cursor = cells_utils.InstanceChangeCursor(
+                'updated_at', now - datetime.timedelta(seconds=60), 10)
+        cursor.ack(cursor.get_batch('fake_context', 5))
+        self.assertEqual(now, cursor.position)
+
+        # NOTE: A transaction which started before uuid0 was updated
+        # commits afterwards.
+        instances.append({'uuid': 'uuid1',
+                          'updated_at': now - datetime.timedelta(seconds=2)})
+        batch = cursor.get_batch('fake_context', 5)
+        self.assertEqual(['uuid1'], [i['uuid'] for i in batch])
+
+    def test_instance_change_cursor_deleted_at(self):
+        start = datetime.datetime(2013, 12, 5, 15, 0, 0)
+        instances = [{'uuid': 'uuid0', 'deleted_at': None},
+                     {'uuid': 'uuid1', 'deleted_at': start}]
+        calls = []
+        self._stub_instance_changes(instances, calls)
+
+        cursor = cells_utils.InstanceChangeCursor('deleted_at', start)
+        batch = cursor.get_batch('fake_context', 5)
+        self.assertEqual(['uuid1'], [i['uuid'] for i in batch])
+        self.assertEqual(({'deleted-since': start}, 'deleted_at', 'asc', 5),
+                         calls[-1])
+
     def test_split_cell_and_item(self):
         path = 'australia', 'queensland', 'gold_coast'
         cell = cells_utils.PATH_CELL_SEP.join(path)
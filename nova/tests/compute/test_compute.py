@@ -7776,6 +7776,20 @@ class ComputeAPITestCase(BaseTestCase):
 
         db.instance_destroy(_context, instance['uuid'])
 
+    @mock.patch('nova.metadata_cache.invalidate')
+    def test_instance_metadata_invalidates_metadata_cache(self,
+                                                          mock_invalidate):
+        self.stubs.Set(compute_rpcapi.ComputeAPI, 'change_instance_metadata',
+                       lambda *args, **kwargs: None)
+        _context = context.get_admin_context()
+        instance = self._create_fake_instance_obj({'metadata':
+                                                       {'key1': 'value1'}})
+        self.compute_api.update_instance_metadata(_context, instance,
+                                                  {'key2': 'value2'})
+        self.compute_api.delete_instance_metadata(_context, instance, 'key1')
+        self.assertEqual([mock.call(instance['uuid'])] * 2,
+                         mock_invalidate.call_args_list)
+
     def test_disallow_metadata_changes_during_building(self):
         def fake_change_instance_metadata(inst, ctxt, diff, instance=None,
                                           instance_uuid=None):
@@ -145,6 +145,9 @@ class CellsComputeAPITestCase(test_compute.ComputeAPITestCase):
     def test_instance_metadata(self):
         self.skipTest("Test is incompatible with cells.")
 
+    def test_instance_metadata_invalidates_metadata_cache(self):
+        self.skipTest("Test is incompatible with cells.")
+
     def test_evacuate(self):
         self.skipTest("Test is incompatible with cells.")
 
@@ -1049,6 +1049,13 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                             events[1])
         do_test()
 
+    def test_cache_image(self):
+        with mock.patch.object(self.compute.driver, 'cache_image',
+                               return_value=True) as cache_image:
+            self.assertTrue(self.compute.cache_image(self.context,
+                                                     'fake-image'))
+            cache_image.assert_called_once_with(self.context, 'fake-image')
+
     def test_retry_reboot_pending_soft(self):
         instance = instance_obj.Instance(self.context)
         instance.uuid = 'foo'
@@ -1753,6 +1760,30 @@ class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
         self.compute._build_networks_for_instance(self.context, instance,
                 self.requested_networks, self.security_groups)
 
+    @mock.patch('nova.api.metadata.base.warm_lookup_cache')
+    @mock.patch('nova.utils.spawn_n')
+    def test_warm_metadata_cache_disabled(self, mock_spawn, mock_warm):
+        self.compute._warm_metadata_cache(self.instance, self.network_info)
+        self.assertFalse(mock_spawn.called)
+        self.assertFalse(mock_warm.called)
+
+    @mock.patch('nova.api.metadata.base.warm_lookup_cache')
+    @mock.patch('nova.utils.spawn_n', side_effect=lambda func: func())
+    def test_warm_metadata_cache(self, mock_spawn, mock_warm):
+        self.flags(metadata_cache_warming=True)
+        self.compute._warm_metadata_cache(self.instance, self.network_info)
+        mock_warm.assert_called_once_with(
+            self.instance, self.network_info,
+            conductor_api=self.compute.conductor_api)
+
+    @mock.patch('nova.api.metadata.base.warm_lookup_cache',
+                side_effect=test.TestingException())
+    @mock.patch('nova.utils.spawn_n', side_effect=lambda func: func())
+    def test_warm_metadata_cache_failure(self, mock_spawn, mock_warm):
+        self.flags(metadata_cache_warming=True)
+        self.compute._warm_metadata_cache(self.instance, self.network_info)
+        self.assertTrue(mock_warm.called)
+
 
 class ComputeManagerMigrationTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -16,10 +16,13 @@
 
 import contextlib
 
+import eventlet
 import mock
+from oslo import messaging
 
 from nova.cells import utils as cells_utils
 from nova import compute
+from nova.compute import api as compute_api
 from nova import context
 from nova import exception
 from nova.objects import service as service_obj
@@ -322,6 +325,70 @@ class ComputeHostAPITestCase(test.TestCase):
             get_by_id.assert_called_once_with(self.ctxt, 1)
             destroy.assert_called_once_with()
 
+    @mock.patch('nova.utils.spawn_n')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_cache_image(self, show, spawn_n):
+        self._mock_assert_host_exists()
+        self.host_api.cache_image(self.ctxt, 'fake-image', ['fake_host'])
+        show.assert_called_once_with(self.ctxt, 'fake-image')
+        spawn_n.assert_called_once_with(compute_api._precache_image,
+                                        self.ctxt, self.host_api.rpcapi,
+                                        'fake-image', ['fake_host'])
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_cache_image_unknown_host(self, spawn_n):
+        self.assertRaises(exception.HostNotFound,
+                          self.host_api.cache_image, self.ctxt,
+                          'fake-image', ['bogus_host'])
+        self.assertFalse(spawn_n.called)
+
+
+class PrecacheImageTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(PrecacheImageTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.rpcapi = mock.Mock()
+
+    def test_precache_image(self):
+        self.flags(image_precache_concurrency=2, image_precache_timeout=30)
+        running = []
+        max_running = []
+
+        def cache_image(context, host, image_id, timeout=None):
+            self.assertEqual(30, timeout)
+            running.append(host)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(host)
+            if host == 'host3':
+                raise messaging.MessagingTimeout()
+            return host != 'host2'
+
+        self.rpcapi.cache_image.side_effect = cache_image
+        results = compute_api._precache_image(
+            self.ctxt, self.rpcapi, 'fake-image',
+            ['host1', 'host2', 'host3', 'host4'])
+        self.assertEqual({'downloaded': ['host1', 'host4'],
+                          'cached': ['host2'],
+                          'failed': ['host3']},
+                         dict((key, sorted(hosts))
+                              for key, hosts in results.items()))
+        self.assertEqual(2, max(max_running))
+
+    @mock.patch('nova.utils.spawn_n')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    @mock.patch('nova.objects.aggregate.Aggregate.get_by_id')
+    def test_aggregate_cache_image(self, get_by_id, show, spawn_n):
+        get_by_id.return_value = mock.Mock(hosts=['host1', 'host2'])
+        aggregate_api = compute_api.AggregateAPI()
+        aggregate_api.cache_image(self.ctxt, 1, 'fake-image')
+        get_by_id.assert_called_once_with(self.ctxt, 1)
+        show.assert_called_once_with(self.ctxt, 'fake-image')
+        spawn_n.assert_called_once_with(compute_api._precache_image,
+                                        self.ctxt,
+                                        aggregate_api.compute_rpcapi,
+                                        'fake-image', ['host1', 'host2'])
+
 
 class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
     def setUp(self):
@@ -345,7 +412,9 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
         cells_rpcapi.proxy_rpc_to_manager(self.ctxt,
                                           rpc_message,
                                           'compute.fake_host',
-                                          call=True).AndReturn('fake-result')
+                                          call=True,
+                                          timeout=None).AndReturn(
+                                              'fake-result')
 
     def test_service_get_all_no_zones(self):
         services = [dict(test_service.fake_service,
@@ -468,6 +537,25 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
         # _assert_host_exists which is a no-op in the cells api
         pass
 
+    def test_cache_image_unknown_host(self):
+        # The corresponing Compute test case depends on the
+        # _assert_host_exists which is a no-op in the cells api
+        pass
+
+    def test_rpcapi_cache_image_timeout(self):
+        cells_rpcapi = self.host_api.rpcapi.client.cells_rpcapi
+        with mock.patch.object(cells_rpcapi, 'proxy_rpc_to_manager',
+                               return_value=True) as proxy:
+            self.assertTrue(self.host_api.rpcapi.cache_image(
+                self.ctxt, 'cell1@fake_host', 'fake-image', timeout=30))
+        rpc_message = {'method': 'cache_image',
+                       'namespace': None,
+                       'args': {'image_id': 'fake-image'},
+                       'version': '3.24'}
+        proxy.assert_called_once_with(self.ctxt, rpc_message,
+                                      'compute.cell1@fake_host',
+                                      call=True, timeout=30)
+
     def test_get_host_uptime(self):
         self.mox.StubOutWithMock(self.host_api.cells_rpcapi,
                                  'get_host_uptime')
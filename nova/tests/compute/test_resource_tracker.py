@@ -535,6 +535,21 @@ class TrackerTestCase(BaseTrackerTestCase):
         self.assertEqual(driver.pci_stats,
             jsonutils.loads(self.tracker.compute_node['pci_stats']))
 
+    def test_disk_pending_wipe_is_used(self):
+        get_available_resource = self.tracker.driver.get_available_resource
+
+        def fake_get_available_resource(nodename):
+            resources = get_available_resource(nodename)
+            resources['local_gb_pending_wipe'] = 2
+            return resources
+
+        self.stubs.Set(self.tracker.driver, 'get_available_resource',
+                       fake_get_available_resource)
+        self.tracker.update_available_resource(self.context)
+        self._assert(2, 'local_gb_used')
+        self._assert(FAKE_VIRT_LOCAL_GB - 2, 'free_disk_gb')
+        self.assertNotIn('local_gb_pending_wipe', self.tracker.compute_node)
+
 
 class TrackerPciStatsTestCase(BaseTrackerTestCase):
 
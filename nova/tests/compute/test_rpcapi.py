@@ -816,3 +816,19 @@ class ComputeRpcAPITestCase(test.TestCase):
                                instances=[self.fake_instance],
                                events=['event'],
                                version='3.23')
+
+    def test_cache_image(self):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = compute_rpcapi.ComputeAPI()
+        with contextlib.nested(
+            mock.patch.object(rpcapi.client, 'call'),
+            mock.patch.object(rpcapi.client, 'prepare'),
+        ) as (call_mock, prepare_mock):
+            prepare_mock.return_value = rpcapi.client
+            call_mock.return_value = True
+            self.assertTrue(rpcapi.cache_image(ctxt, 'fake_host',
+                                               'fake-image', timeout=30))
+            prepare_mock.assert_called_once_with(server='fake_host',
+                                                 version='3.24', timeout=30)
+            call_mock.assert_called_once_with(ctxt, 'cache_image',
+                                              image_id='fake-image')
@@ -802,6 +802,62 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertIn('dict', updates)
         self.assertEqual({'foo': 'bar'}, updates['dict'])
 
+    def test_service_heartbeat(self):
+        with mock.patch.object(db, 'service_update_heartbeats') as update:
+            self.conductor.service_heartbeat(self.context, 1)
+        update.assert_called_once_with(self.context, [1], mock.ANY)
+
+    def test_service_heartbeat_coalesced(self):
+        self.flags(heartbeat_flush_window=5, group='conductor')
+        self.useFixture(test.TimeOverride())
+        first = timeutils.utcnow()
+        with contextlib.nested(
+            mock.patch.object(db, 'service_update_heartbeats'),
+            mock.patch.object(conductor_manager.greenthread, 'spawn_after'),
+        ) as (update, spawn_after):
+            self.conductor.service_heartbeat(self.context, 1)
+            timeutils.advance_time_seconds(1)
+            self.conductor.service_heartbeat(self.context, 2)
+            self.conductor.service_heartbeat(self.context, 1)
+            spawn_after.assert_called_once_with(
+                5, self.conductor.flush_heartbeats)
+            self.assertFalse(update.called)
+
+            self.conductor.flush_heartbeats()
+            self.assertEqual(1, update.call_count)
+            ctxt, service_ids, updated_at = update.call_args[0]
+            self.assertEqual([1, 2], sorted(service_ids))
+            self.assertEqual(first, updated_at)
+            spawn_after.return_value.cancel.assert_called_once_with()
+
+            self.conductor.flush_heartbeats()
+            self.assertEqual(1, update.call_count)
+
+    def test_object_delta_action(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField(),
+                      'bar': fields.StringField(),
+                      'baz': fields.StringField(),
+                      'missing': fields.StringField()}
+
+            def touch(self, context):
+                self.foo += 1
+                self.bar = 'server-bar'
+                self.baz = 'caller-baz'
+                self.missing = 'server-missing'
+                self.obj_reset_changes()
+
+        obj = TestObject(foo=1)
+        fingerprints = {
+            'bar': obj_base.obj_fingerprint('caller-bar'),
+            'baz': obj_base.obj_fingerprint('caller-baz'),
+            }
+        updates, result = self.conductor.object_delta_action(
+            self.context, obj, 'touch', tuple(), {}, fingerprints)
+        self.assertEqual({'foo': 2, 'bar': 'server-bar',
+                          'missing': 'server-missing',
+                          'obj_what_changed': set()}, updates)
+
     def test_aggregate_metadata_add(self):
         aggregate = {'name': 'fake aggregate', 'id': 'fake-id'}
         metadata = {'foo': 'bar'}
@@ -965,6 +1021,68 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor.security_groups_trigger_handler(self.context,
                                                        'event', ['arg'])
 
+    def _test_object_delta_action(self, can_send):
+        obj = mock.Mock()
+        obj.obj_to_delta_primitive.return_value = ('fake-prim', 'fake-fps')
+        cctxt = mock.Mock()
+        cctxt.call.return_value = 'fake-result'
+        with contextlib.nested(
+            mock.patch.object(self.conductor.client, 'can_send_version',
+                              return_value=can_send),
+            mock.patch.object(self.conductor.client, 'prepare',
+                              return_value=cctxt),
+        ) as (mock_can_send, mock_prepare):
+            result = self.conductor.object_delta_action(
+                self.context, obj, 'save', ('arg',), {'kwarg': 1})
+        self.assertEqual('fake-result', result)
+        mock_can_send.assert_called_once_with('2.1')
+        if can_send:
+            mock_prepare.assert_called_once_with(version='2.1')
+            cctxt.call.assert_called_once_with(
+                self.context, 'object_delta_action', objinst='fake-prim',
+                objmethod='save', args=('arg',), kwargs={'kwarg': 1},
+                fingerprints='fake-fps')
+        else:
+            self.assertFalse(obj.obj_to_delta_primitive.called)
+            mock_prepare.assert_called_once_with()
+            cctxt.call.assert_called_once_with(
+                self.context, 'object_action', objinst=obj,
+                objmethod='save', args=('arg',), kwargs={'kwarg': 1})
+
+    def test_object_delta_action(self):
+        self._test_object_delta_action(True)
+
+    def test_object_delta_action_old_conductor(self):
+        self._test_object_delta_action(False)
+
+    def test_service_heartbeat(self):
+        cctxt = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(self.conductor.client, 'can_send_version',
+                              return_value=True),
+            mock.patch.object(self.conductor.client, 'prepare',
+                              return_value=cctxt),
+        ) as (mock_can_send, mock_prepare):
+            self.conductor.service_heartbeat(self.context,
+                                             {'id': 1, 'report_count': 3})
+        mock_can_send.assert_called_once_with('2.2')
+        mock_prepare.assert_called_once_with(version='2.2')
+        cctxt.cast.assert_called_once_with(self.context, 'service_heartbeat',
+                                           service_id=1)
+
+    def test_service_heartbeat_old_conductor(self):
+        service = {'id': 1, 'report_count': 3}
+        with contextlib.nested(
+            mock.patch.object(self.conductor.client, 'can_send_version',
+                              return_value=False),
+            mock.patch.object(self.conductor, 'service_update',
+                              return_value={'id': 1, 'report_count': 4}),
+        ) as (mock_can_send, mock_update):
+            result = self.conductor.service_heartbeat(self.context, service)
+        mock_update.assert_called_once_with(self.context, service,
+                                            {'report_count': 4})
+        self.assertEqual({'id': 1, 'report_count': 4}, result)
+
 
 class ConductorAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor API Tests."""
@@ -1078,6 +1196,13 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
         result = self.conductor.service_update(self.context, {'id': ''}, {})
         self.assertEqual(result, 'fake-result')
 
+    def test_service_heartbeat(self):
+        self.useFixture(cast_as_call.CastAsCall(self.stubs))
+        with mock.patch.object(db, 'service_update_heartbeats') as update:
+            self.conductor.service_heartbeat(self.context,
+                                             {'id': 1, 'report_count': 3})
+        update.assert_called_once_with(mock.ANY, [1], mock.ANY)
+
     def test_instance_get_all_by_host_and_node(self):
         self._test_stubbed('instance_get_all_by_host_and_node',
                            self.context.elevated(), 'host', 'node')
@@ -1774,6 +1899,8 @@ class ConductorV2ManagerProxyTestCase(test.NoDBTestCase):
             ('object_class_action', 5),
             ('object_action', 4),
             ('object_backport', 2),
+            ('object_delta_action', 5),
+            ('service_heartbeat', 1),
         ]
 
         for method, num_args in methods:
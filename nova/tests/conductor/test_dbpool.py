@@ -0,0 +1,162 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the conductor DB thread pool."""
+
+import eventlet
+from eventlet import event
+import fixtures
+import mock
+
+from nova.conductor import dbpool
+from nova.conductor import manager as conductor_manager
+from nova import exception
+from nova import test
+
+
+class FakeDBAPI(object):
+    backend_name = 'fake'
+
+    def __init__(self):
+        self.events = {}
+
+    def instance_get(self, context, instance_id):
+        return {'id': instance_id}
+
+    def instance_destroy(self, context, instance_uuid):
+        raise exception.InstanceNotFound(instance_id=instance_uuid)
+
+    def blocking_call(self, key):
+        self.events[key].wait()
+        return key
+
+
+def _fake_execute(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+class ThreadPoolDBAPITestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ThreadPoolDBAPITestCase, self).setUp()
+        self.useFixture(fixtures.MonkeyPatch(
+            'eventlet.tpool.set_num_threads', lambda n: None))
+        # NOTE: Run the calls in the calling greenthread, so that tests can
+        # block them on eventlet events.
+        self.useFixture(fixtures.MonkeyPatch(
+            'eventlet.tpool.execute', _fake_execute))
+        self.backend = FakeDBAPI()
+
+    def test_sets_thread_count(self):
+        with mock.patch('eventlet.tpool.set_num_threads') as set_num:
+            dbpool.ThreadPoolDBAPI(self.backend, 4)
+        set_num.assert_called_once_with(4)
+
+    def test_call_runs_on_tpool(self):
+        pool = dbpool.ThreadPoolDBAPI(self.backend, 2)
+        with mock.patch('eventlet.tpool.execute',
+                        side_effect=_fake_execute) as execute:
+            self.assertEqual({'id': 1}, pool.instance_get('ctxt', 1))
+        execute.assert_called_once_with(mock.ANY, 'ctxt', 1)
+
+    def test_non_callable_passthrough(self):
+        pool = dbpool.ThreadPoolDBAPI(self.backend, 2)
+        self.assertEqual('fake', pool.backend_name)
+
+    def test_stats(self):
+        pool = dbpool.ThreadPoolDBAPI(self.backend, 2)
+        pool.instance_get('ctxt', 1)
+        pool.instance_get('ctxt', 2)
+        self.assertRaises(exception.InstanceNotFound,
+                          pool.instance_destroy, 'ctxt', 'fake-uuid')
+
+        stats = pool.get_stats()
+        self.assertEqual(2, stats['pool_size'])
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(0, stats['rejected'])
+        self.assertEqual(2, stats['methods']['instance_get']['calls'])
+        self.assertEqual(0, stats['methods']['instance_get']['errors'])
+        self.assertEqual(0, stats['methods']['instance_get']['active'])
+        self.assertEqual(1, stats['methods']['instance_get']['max_active'])
+        self.assertEqual(1, stats['methods']['instance_destroy']['calls'])
+        self.assertEqual(1, stats['methods']['instance_destroy']['errors'])
+
+    def _start_blocked(self, pool, keys):
+        threads = []
+        for key in keys:
+            self.backend.events[key] = event.Event()
+            threads.append(eventlet.spawn(pool.blocking_call, key))
+        eventlet.sleep(0)
+        return threads
+
+    def test_bounded_concurrency_and_queue(self):
+        pool = dbpool.ThreadPoolDBAPI(self.backend, 2, max_queue=1)
+        threads = self._start_blocked(pool, ['a', 'b', 'c'])
+
+        stats = pool.get_stats()
+        self.assertEqual(2, stats['methods']['blocking_call']['active'])
+        self.assertEqual(1, stats['queue_depth'])
+        self.assertRaises(exception.ConductorDBQueueFull,
+                          pool.blocking_call, 'd')
+
+        for key in ['a', 'b', 'c']:
+            self.backend.events[key].send()
+        self.assertEqual(['a', 'b', 'c'], [t.wait() for t in threads])
+
+        stats = pool.get_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(1, stats['max_queue_depth'])
+        self.assertEqual(1, stats['rejected'])
+        self.assertEqual(3, stats['methods']['blocking_call']['calls'])
+        self.assertEqual(2, stats['methods']['blocking_call']['max_active'])
+
+    def test_unbounded_queue(self):
+        pool = dbpool.ThreadPoolDBAPI(self.backend, 1)
+        threads = self._start_blocked(pool, ['a', 'b', 'c'])
+        self.assertEqual(2, pool.get_stats()['queue_depth'])
+        for key in ['a', 'b', 'c']:
+            self.backend.events[key].send()
+        self.assertEqual(['a', 'b', 'c'], [t.wait() for t in threads])
+        self.assertEqual(0, pool.get_stats()['rejected'])
+
+
+class ConductorDBStatsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ConductorDBStatsTestCase, self).setUp()
+        self.conductor = conductor_manager.ConductorManager()
+
+    def test_get_db_stats_without_pool(self):
+        self.assertIsNone(self.conductor.get_db_stats())
+
+    def test_get_db_stats_with_pool(self):
+        with mock.patch('eventlet.tpool.set_num_threads'):
+            pool = dbpool.ThreadPoolDBAPI(FakeDBAPI(), 3)
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.db.api.IMPL', pool))
+        self.assertEqual(3, self.conductor.get_db_stats()['pool_size'])
+
+    @mock.patch.object(conductor_manager.LOG, 'info')
+    def test_log_db_stats(self, mock_info):
+        stats = {'pool_size': 2, 'max_queue': 0, 'queue_depth': 0,
+                 'max_queue_depth': 1, 'rejected': 0,
+                 'methods': {'instance_get': {
+                     'calls': 1, 'errors': 0, 'active': 0, 'max_active': 1,
+                     'total_time': 0.5, 'avg_time': 0.5, 'max_time': 0.5,
+                     'avg_wait': 0.0}}}
+        with mock.patch.object(self.conductor, 'get_db_stats',
+                               return_value=stats):
+            self.conductor._log_db_stats('ctxt')
+        self.assertEqual(2, mock_info.call_count)
+
+    @mock.patch.object(conductor_manager.LOG, 'info')
+    def test_log_db_stats_without_pool(self, mock_info):
+        self.conductor._log_db_stats('ctxt')
+        self.assertFalse(mock_info.called)
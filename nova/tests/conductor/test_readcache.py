@@ -0,0 +1,163 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the conductor read cache."""
+
+import mock
+
+from nova.conductor import manager as conductor_manager
+from nova.conductor import readcache
+from nova import context
+from nova import db
+from nova.objects import service as service_obj
+from nova import test
+
+
+class ReadCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ReadCacheTestCase, self).setUp()
+        self.cache = readcache.ReadCache(30)
+        self.context = context.get_admin_context()
+        self.calls = []
+
+    def _func(self, context, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return {'args': list(args), 'kwargs': kwargs}
+
+    def test_hit_and_miss(self):
+        result = self.cache.call('group', 'meth', self._func,
+                                 self.context, 1, key='a')
+        self.assertEqual({'args': [1], 'kwargs': {'key': 'a'}}, result)
+        result['args'].append(2)
+        result = self.cache.call('group', 'meth', self._func,
+                                 self.context, 1, key='a')
+        self.assertEqual({'args': [1], 'kwargs': {'key': 'a'}}, result)
+        self.cache.call('group', 'meth', self._func, self.context, 2)
+        self.assertEqual(2, len(self.calls))
+
+        stats = self.cache.get_stats()
+        self.assertEqual(2, stats['entries'])
+        self.assertEqual({'hits': 1, 'misses': 2}, stats['methods']['meth'])
+
+    def test_key_includes_context(self):
+        self.cache.call('group', 'meth', self._func, self.context, 1)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        self.cache.call('group', 'meth', self._func, ctxt, 1)
+        self.assertEqual(2, len(self.calls))
+
+    @mock.patch('time.time')
+    def test_expiry(self, mock_time):
+        mock_time.return_value = 100
+        self.cache.call('group', 'meth', self._func, self.context, 1)
+        mock_time.return_value = 129
+        self.cache.call('group', 'meth', self._func, self.context, 1)
+        self.assertEqual(1, len(self.calls))
+        mock_time.return_value = 130
+        self.cache.call('group', 'meth', self._func, self.context, 1)
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual(1, self.cache.get_stats()['entries'])
+
+    def test_invalidate(self):
+        self.cache.call('one', 'meth', self._func, self.context, 1)
+        self.cache.call('two', 'meth', self._func, self.context, 2)
+        self.cache.invalidate('one')
+        self.cache.call('one', 'meth', self._func, self.context, 1)
+        self.cache.call('two', 'meth', self._func, self.context, 2)
+        self.assertEqual(3, len(self.calls))
+        stats = self.cache.get_stats()
+        self.assertEqual(2, stats['entries'])
+        self.assertEqual({'one': 1}, stats['invalidations'])
+
+    @mock.patch('time.time')
+    def test_max_entries(self, mock_time):
+        mock_time.return_value = 100
+        self.cache = readcache.ReadCache(30, max_entries=2)
+        self.cache.call('group', 'meth', self._func, self.context, 1)
+        mock_time.return_value = 120
+        self.cache.call('group', 'meth', self._func, self.context, 2)
+        # NOTE: The expired first entry makes room for the third.
+        mock_time.return_value = 131
+        self.cache.call('group', 'meth', self._func, self.context, 3)
+        self.assertEqual(2, self.cache.get_stats()['entries'])
+        # NOTE: Nothing has expired, so the cache is emptied.
+        self.cache.call('group', 'meth', self._func, self.context, 4)
+        self.assertEqual(1, self.cache.get_stats()['entries'])
+
+
+class ConductorReadCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(ConductorReadCacheTestCase, self).setUp()
+        self.flags(read_cache_ttl=60, group='conductor')
+        self.conductor = conductor_manager.ConductorManager()
+        self.context = context.get_admin_context()
+
+    def test_disabled_by_default(self):
+        self.flags(read_cache_ttl=0, group='conductor')
+        conductor = conductor_manager.ConductorManager()
+        self.assertIsNone(conductor.read_cache)
+        self.assertIsNone(conductor.get_read_cache_stats())
+
+    def test_service_reads_cached(self):
+        db.service_create(self.context, {'host': 'fake-host',
+                                         'topic': 'fake-topic',
+                                         'binary': 'fake-binary'})
+        with mock.patch.object(db, 'service_get_all_by_host',
+                               wraps=db.service_get_all_by_host) as get:
+            first = self.conductor.service_get_all_by(self.context,
+                                                      host='fake-host')
+            second = self.conductor.service_get_all_by(self.context,
+                                                       host='fake-host')
+        self.assertEqual(1, get.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual({'hits': 1, 'misses': 1},
+                         self.conductor.get_read_cache_stats()['methods']
+                         ['service_get_all_by'])
+
+    def test_service_update_invalidates(self):
+        service = db.service_create(self.context, {'host': 'fake-host',
+                                                   'topic': 'fake-topic',
+                                                   'binary': 'fake-binary'})
+        self.conductor.service_get_all_by(self.context, host='fake-host')
+        self.conductor.service_update(self.context, service,
+                                      {'disabled': True})
+        result = self.conductor.service_get_all_by(self.context,
+                                                   host='fake-host')
+        self.assertTrue(result[0]['disabled'])
+
+    def test_aggregate_metadata_add_invalidates(self):
+        aggr = db.aggregate_create(self.context, {'name': 'fake-aggr'})
+        db.aggregate_host_add(self.context, aggr['id'], 'fake-host')
+        result = self.conductor.aggregate_metadata_get_by_host(
+            self.context, 'fake-host', key='foo')
+        self.assertEqual({}, result)
+        self.conductor.aggregate_metadata_add(self.context, aggr,
+                                              {'foo': 'bar'})
+        result = self.conductor.aggregate_metadata_get_by_host(
+            self.context, 'fake-host', key='foo')
+        self.assertEqual({'foo': ['bar']}, result)
+
+    def test_object_action_invalidates(self):
+        db_service = db.service_create(self.context,
+                                       {'host': 'fake-host',
+                                        'topic': 'fake-topic',
+                                        'binary': 'fake-binary'})
+        self.conductor.service_get_all_by(self.context, host='fake-host')
+        service = service_obj.Service.get_by_id(self.context,
+                                                db_service['id'])
+        service.disabled = True
+        self.conductor.object_action(self.context, service, 'save', (), {})
+        result = self.conductor.service_get_all_by(self.context,
+                                                   host='fake-host')
+        self.assertTrue(result[0]['disabled'])
+        self.assertEqual({'service': 1},
+                         self.conductor.get_read_cache_stats()
+                         ['invalidations'])
@@ -152,11 +152,12 @@ class ControlauthMemcacheEncodingTestCase(test.TestCase):
         self.manager.check_token(self.context, self.u_token)
 
     def test_delete_tokens_for_instance_encoding(self):
-        self.mox.StubOutWithMock(self.manager.mc, "delete")
+        self.mox.StubOutWithMock(self.manager.mc, "delete_multi")
         self.mox.StubOutWithMock(self.manager.mc, "get")
         self.manager.mc.get(mox.IsA(str)).AndReturn('["token"]')
-        self.manager.mc.delete(mox.IsA(str)).AndReturn(True)
-        self.manager.mc.delete(mox.IsA(str)).AndReturn(True)
+        self.manager.mc.delete_multi(
+            mox.Func(lambda keys: [type(key) for key in keys] == [str, str])
+            ).AndReturn(True)
 
         self.mox.ReplayAll()
 
@@ -24,6 +24,7 @@ import iso8601
 import types
 import uuid as stdlib_uuid
 
+import mock
 import mox
 import netaddr
 from oslo.config import cfg
@@ -1590,6 +1591,28 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                  changes_since})
         self._assertEqualListsOfInstances([i2], result)
 
+    def test_instance_get_all_by_filters_deleted_since(self):
+        i1 = self.create_instance_with_args()
+        i2 = self.create_instance_with_args()
+        self.create_instance_with_args()
+        timeutils.set_time_override(datetime.datetime(2013, 12, 5, 15, 3, 25))
+        self.addCleanup(timeutils.clear_time_override)
+        db.instance_destroy(self.ctxt, i1['uuid'])
+        timeutils.advance_time_seconds(1)
+        db.instance_destroy(self.ctxt, i2['uuid'])
+
+        ctxt = self.ctxt.elevated(read_deleted='yes')
+        deleted_since = iso8601.parse_date('2013-12-05T15:03:25.000000')
+        result = db.instance_get_all_by_filters(ctxt, {'deleted-since':
+                                                       deleted_since})
+        self.assertEqual(set([i1['uuid'], i2['uuid']]),
+                         set(inst['uuid'] for inst in result))
+
+        deleted_since = iso8601.parse_date('2013-12-05T15:03:26.000000')
+        result = db.instance_get_all_by_filters(ctxt, {'deleted-since':
+                                                       deleted_since})
+        self.assertEqual([i2['uuid']], [inst['uuid'] for inst in result])
+
     def test_instance_get_all_by_filters_exact_match(self):
         instance = self.create_instance_with_args(host='host1')
         self.create_instance_with_args(host='host12')
@@ -1802,6 +1825,120 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                     db.instance_update, self.ctxt, instance['uuid'],
                     {'host': 'h1', 'expected_vm_state': ('spam', 'bar')})
 
+    def test_instance_update_with_expected_task_state(self):
+        instance = self.create_instance_with_args(task_state=None)
+        result = db.instance_update(self.ctxt, instance['uuid'],
+                                    {'task_state': 'spawning',
+                                     'expected_task_state': (None, 'foo')})
+        self.assertEqual('spawning', result['task_state'])
+        self.assertIsNotNone(result['updated_at'])
+
+    def test_instance_update_with_unexpected_task_state(self):
+        instance = self.create_instance_with_args(task_state='foo')
+        self.assertRaises(exception.UnexpectedTaskStateError,
+                          db.instance_update, self.ctxt, instance['uuid'],
+                          {'task_state': 'spawning',
+                           'expected_task_state': None})
+        instance = db.instance_get_by_uuid(self.ctxt, instance['uuid'])
+        self.assertEqual('foo', instance['task_state'])
+
+    def test_instance_update_with_unexpected_deleting_task_state(self):
+        instance = self.create_instance_with_args(task_state='deleting')
+        self.assertRaises(exception.UnexpectedDeletingTaskStateError,
+                          db.instance_update, self.ctxt, instance['uuid'],
+                          {'task_state': 'spawning',
+                           'expected_task_state': 'foo'})
+
+    def test_instance_update_with_expected_state_not_found(self):
+        self.assertRaises(exception.InstanceNotFound,
+                          db.instance_update, self.ctxt,
+                          'ce9e6d4c-b5a6-4c83-a4c5-1e1f3e4ae1ae',
+                          {'task_state': 'spawning',
+                           'expected_task_state': None})
+
+    def test_instance_update_with_expected_state_does_not_read_first(self):
+        instance = self.create_instance_with_args(task_state=None)
+        with mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid',
+                        wraps=sqlalchemy_api._instance_get_by_uuid) as get:
+            db.instance_update(self.ctxt, instance['uuid'],
+                               {'task_state': 'spawning',
+                                'expected_task_state': None})
+        # NOTE: The only read is the one returning the updated instance.
+        self.assertEqual(1, get.call_count)
+
+    def test_instance_update_and_get_original_reads_once(self):
+        instance = self.create_instance_with_args(task_state=None)
+        with mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid',
+                        wraps=sqlalchemy_api._instance_get_by_uuid) as get:
+            old_ref, new_ref = db.instance_update_and_get_original(
+                self.ctxt, instance['uuid'],
+                {'task_state': 'spawning', 'expected_task_state': None})
+        # NOTE: The read of the original also returns the updated instance.
+        self.assertEqual(1, get.call_count)
+        self.assertIsNone(old_ref['task_state'])
+        self.assertEqual('spawning', new_ref['task_state'])
+
+    def test_instance_update_and_get_original_state_changed_after_read(self):
+        instance = self.create_instance_with_args(task_state=None)
+        real_get = sqlalchemy_api._instance_get_by_uuid
+        raced = []
+
+        def racing_get(context, uuid, session=None, **kwargs):
+            # NOTE: Another writer changes the state after the row is read,
+            # which only the conditional UPDATE can notice.
+            instance_ref = real_get(context, uuid, session=session, **kwargs)
+            if not raced:
+                raced.append(True)
+                db.instance_update(self.ctxt, uuid, {'task_state': 'foo'})
+            return instance_ref
+
+        with mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid',
+                               side_effect=racing_get):
+            self.assertRaises(exception.UnexpectedTaskStateError,
+                              db.instance_update_and_get_original,
+                              self.ctxt, instance['uuid'],
+                              {'task_state': 'spawning',
+                               'expected_task_state': None})
+        instance = db.instance_get_by_uuid(self.ctxt, instance['uuid'])
+        self.assertEqual('foo', instance['task_state'])
+
+    def test_instance_update_and_get_original_with_expected_state(self):
+        instance = self.create_instance_with_args(task_state=None,
+                                                  vm_state='foo')
+        old_ref, new_ref = db.instance_update_and_get_original(
+            self.ctxt, instance['uuid'],
+            {'task_state': 'spawning', 'metadata': {'mk1': 'mv1'},
+             'expected_task_state': None, 'expected_vm_state': 'foo'})
+        self.assertIsNone(old_ref['task_state'])
+        self.assertEqual('spawning', new_ref['task_state'])
+        instance = db.instance_get_by_uuid(self.ctxt, instance['uuid'])
+        self.assertEqual('spawning', instance['task_state'])
+        self.assertEqual({'mk1': 'mv1'},
+                         db.instance_metadata_get(self.ctxt,
+                                                  instance['uuid']))
+
+    def test_instance_update_and_get_original_state_changed_under_us(self):
+        instance = self.create_instance_with_args(task_state=None)
+        real_update = sqlalchemy_api._instance_update_expected
+
+        def fake_update(context, session, *args, **kwargs):
+            # NOTE: Change the state between the read of the original
+            # instance and the conditional update.
+            model_query = sqlalchemy_api.model_query
+            model_query(context, models.Instance, session=session).\
+                filter_by(uuid=instance['uuid']).\
+                update({'task_state': 'deleting'},
+                       synchronize_session=False)
+            return real_update(context, session, *args, **kwargs)
+
+        with mock.patch.object(sqlalchemy_api, '_instance_update_expected',
+                               side_effect=fake_update):
+            self.assertRaises(exception.UnexpectedDeletingTaskStateError,
+                              db.instance_update_and_get_original,
+                              self.ctxt, instance['uuid'],
+                              {'task_state': 'spawning',
+                               'expected_task_state': None})
+
     def test_instance_update_with_instance_uuid(self):
         # test instance_update() works when an instance UUID is passed.
         ctxt = context.get_admin_context()
@@ -2114,6 +2251,26 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         for key, value in new_values.iteritems():
             self.assertEqual(value, updated_service[key])
 
+    def test_service_update_heartbeats(self):
+        service1 = self._create_service({'report_count': 4})
+        service2 = self._create_service({'host': 'fake_host2',
+                                         'report_count': 1})
+        service3 = self._create_service({'host': 'fake_host3'})
+        updated_at = datetime.datetime(2013, 12, 5, 15, 3, 25)
+        count = db.service_update_heartbeats(
+            self.ctxt, [service1['id'], service2['id'], 100500], updated_at)
+        self.assertEqual(2, count)
+
+        for service, report_count in [(service1, 5), (service2, 2)]:
+            updated_service = db.service_get(self.ctxt, service['id'])
+            self.assertEqual(report_count, updated_service['report_count'])
+            self.assertEqual(updated_at, updated_service['updated_at'])
+        updated_service = db.service_get(self.ctxt, service3['id'])
+        self.assertIsNone(updated_service['updated_at'])
+
+        self.assertEqual(0, db.service_update_heartbeats(self.ctxt, [],
+                                                         updated_at))
+
     def test_service_update_not_found_exception(self):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
@@ -3345,6 +3502,38 @@ class FixedIPTestCase(BaseInstanceTypeTestCase):
         ips_list = db.fixed_ips_by_virtual_interface(self.ctxt, vif.id)
         self.assertEqual(0, len(ips_list))
 
+    def test_fixed_ip_search_by_address(self):
+        instance_uuid = self._create_instance()
+        vif = db.virtual_interface_create(
+            self.ctxt, dict(instance_uuid=instance_uuid))
+        fixed_1 = db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif.id, address='192.168.1.5'))
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif.id, address='192.168.2.5'))
+        db.floating_ip_create(self.ctxt, dict(
+            address='10.0.0.5', fixed_ip_id=fixed_1['id']))
+        # NOTE: Neither an ip without a vif nor a deleted ip is found.
+        db.fixed_ip_create(self.ctxt, dict(address='192.168.1.6'))
+        deleted = db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif.id, address='192.168.1.7'))
+        db.fixed_ip_update(self.ctxt, deleted['address'],
+                           dict(deleted=deleted['id']))
+
+        self.assertEqual(
+            [{'instance_uuid': instance_uuid, 'address': '192.168.1.5',
+              'floating_address': None}],
+            db.fixed_ip_search_by_address(self.ctxt, '192.168.1.%'))
+        self.assertEqual(
+            [{'instance_uuid': instance_uuid, 'address': '192.168.1.5',
+              'floating_address': '10.0.0.5'}],
+            db.fixed_ip_search_by_address(self.ctxt, '10.0.0.5'))
+        self.assertEqual(
+            ['192.168.1.5', '192.168.2.5'],
+            sorted(row['address'] for row in
+                   db.fixed_ip_search_by_address(self.ctxt, '192.168._.5')))
+        self.assertEqual([],
+                         db.fixed_ip_search_by_address(self.ctxt, '172.%'))
+
     def create_fixed_ip(self, **params):
         default_params = {'address': '192.168.0.1'}
         default_params.update(params)
@@ -13,6 +13,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import re
+
 from oslo.config import cfg
 
 from nova.compute import api as compute_api
@@ -170,6 +172,29 @@ class FakeNetworkManager(network_manager.NetworkManager):
             return [ip for ip in self.fixed_ips
                     if ip['virtual_interface_id'] == vif_id]
 
+        def fixed_ip_search_by_address(self, context, address_pattern):
+            regex = re.compile('^%s$' % ''.join(
+                {'%': '.*', '_': '.'}.get(char, re.escape(char))
+                for char in address_pattern))
+            instance_uuids = dict((vif['id'], vif['instance_uuid'])
+                                  for vif in self.vifs)
+            fixed_ips = dict((ip['id'], ip) for ip in self.fixed_ips)
+            rows = []
+            for ip in self.fixed_ips:
+                if regex.match(ip['address']):
+                    rows.append({'instance_uuid': instance_uuids[
+                                     ip['virtual_interface_id']],
+                                 'address': ip['address'],
+                                 'floating_address': None})
+            for floating_ip in self.floating_ips:
+                if regex.match(floating_ip['address']):
+                    ip = fixed_ips[floating_ip['fixed_ip_id']]
+                    rows.append({'instance_uuid': instance_uuids[
+                                     ip['virtual_interface_id']],
+                                 'address': ip['address'],
+                                 'floating_address': floating_ip['address']})
+            return rows
+
         def fixed_ip_disassociate(self, context, address):
             return True
 
@@ -163,7 +163,7 @@ class _FakeImageService(object):
         self.show(context, image_id)
         if data:
             data.write(self._imagedata.get(image_id, ''))
-        elif dst_path:
+        if dst_path:
             with open(dst_path, 'wb') as data:
                 data.write(self._imagedata.get(image_id, ''))
 
@@ -0,0 +1,158 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for copying base images from peer compute hosts."""
+
+import hashlib
+import os
+
+import fixtures
+from glanceclient.common import http as glance_http
+import mock
+import six.moves.urllib.parse as urlparse
+
+from nova import context
+from nova import exception
+from nova.image.download import peer
+from nova.image import glance
+from nova import test
+from nova.tests.glance import stubs as glance_stubs
+from nova.tests.image import test_ranged
+from nova.virt.libvirt import imagecache
+
+
+class PeerTransferTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(PeerTransferTestCase, self).setUp()
+        self.data = os.urandom(1000)
+        self.metadata = {'checksum': hashlib.md5(self.data).hexdigest(),
+                         'size': len(self.data)}
+        self.fname = imagecache.get_cache_fname({'image_id': 'fake-image'},
+                                                'image_id')
+        self.peers = [self.useFixture(test_ranged.ImageServerFixture())
+                      for _i in range(3)]
+        self.flags(peer_urls=['http://127.0.0.1:%d/_base/' % p.port
+                              for p in self.peers],
+                   allow_http=True, group='image_peer')
+        self.dst_path = self.useFixture(fixtures.TempDir()).join('image')
+        self.transfer = peer.get_download_handler()
+
+    def _download(self, **kwargs):
+        self.transfer.download(None, urlparse.urlparse('peer:///fake-image'),
+                               self.dst_path, self.metadata, **kwargs)
+        with open(self.dst_path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+
+    def test_download_from_peer(self):
+        self.peers[1].server.images[self.fname] = self.data
+        self._download()
+
+    def test_skips_bad_peers(self):
+        # NOTE: One peer has a converted image of another size, and another
+        # has corrupt data.
+        self.peers[0].server.images[self.fname] = self.data * 2
+        self.peers[1].server.images[self.fname] = self.data[::-1]
+        self.peers[2].server.images[self.fname] = self.data
+        self._download()
+
+    def test_skips_unreachable_peer(self):
+        self.peers[0].server.images[self.fname] = self.data
+        self.flags(peer_urls=['http://127.0.0.1:1/_base/',
+                              'http://127.0.0.1:%d/_base/'
+                              % self.peers[0].port],
+                   group='image_peer')
+        self._download()
+
+    def test_no_peer_has_image(self):
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self.transfer.download, None,
+                          urlparse.urlparse('peer:///fake-image'),
+                          self.dst_path, self.metadata)
+
+    def test_http_refused_by_default(self):
+        self.flags(allow_http=False, group='image_peer')
+        self.peers[0].server.images[self.fname] = self.data
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self.transfer.download, None,
+                          urlparse.urlparse('peer:///fake-image'),
+                          self.dst_path, self.metadata)
+        self.assertEqual([], self.peers[0].server.requests)
+
+    @mock.patch.object(glance_http, 'VerifiedHTTPSConnection')
+    def test_connect_https_verified(self, mock_conn):
+        self.flags(ca_file='/etc/ca.pem', cert_file='/etc/cert.pem',
+                   timeout=5, group='image_peer')
+        conn = self.transfer._connect(
+            urlparse.urlparse('https://compute2:8443/_base/x'))
+        self.assertEqual(mock_conn.return_value, conn)
+        mock_conn.assert_called_once_with('compute2', 8443, key_file=None,
+                                          cert_file='/etc/cert.pem',
+                                          cacert='/etc/ca.pem', timeout=5)
+
+    def test_requires_checksum(self):
+        self.assertRaises(exception.ImageDownloadModuleMetaDataError,
+                          self.transfer.download, None,
+                          urlparse.urlparse('peer:///fake-image'),
+                          self.dst_path, {'size': 1000})
+
+    def test_observer(self):
+        self.peers[2].server.images[self.fname] = self.data
+        observed = []
+
+        class Observer(object):
+            def write(self, chunk):
+                observed.append(chunk)
+
+        self._download(observer=Observer())
+        self.assertEqual(self.data, ''.join(observed))
+
+
+class GlancePeerDownloadTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(GlancePeerDownloadTestCase, self).setUp()
+        self.data = os.urandom(1000)
+        self.peer = self.useFixture(test_ranged.ImageServerFixture())
+        self.flags(allowed_direct_url_schemes=['peer'])
+        self.flags(peer_urls=['http://127.0.0.1:%d/' % self.peer.port],
+                   allow_http=True, group='image_peer')
+        self.stubs.Set(glance.image_xfers, 'load_transfer_modules',
+                       lambda: {'peer': peer})
+
+        self.client = glance_stubs.StubGlanceClient()
+        self.client.create(id='1', is_public=True, size=len(self.data),
+                           checksum=hashlib.md5(self.data).hexdigest(),
+                           properties={})
+        self.glance_data = self.data
+        self.client.images.data = lambda image_id: iter([self.glance_data])
+        self.stubs.Set(glance, '_create_glance_client',
+                       lambda *args: self.client)
+        self.service = glance.GlanceImageService(
+            client=glance.GlanceClientWrapper('fake', 'fake_host', 9292))
+        self.context = context.RequestContext('fake', 'fake')
+        self.dst_path = self.useFixture(fixtures.TempDir()).join('image')
+
+    def _download(self):
+        self.service.download(self.context, '1', dst_path=self.dst_path)
+        with open(self.dst_path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+
+    def test_download_from_peer(self):
+        self.peer.server.images[imagecache.get_cache_fname(
+            {'image_id': '1'}, 'image_id')] = self.data
+        self.glance_data = 'not from glance'
+        self._download()
+
+    def test_download_falls_back_to_glance(self):
+        self.peer.server.images[imagecache.get_cache_fname(
+            {'image_id': '1'}, 'image_id')] = 'not the image'
+        self._download()
+        self.assertEqual(1, len(self.peer.server.requests))
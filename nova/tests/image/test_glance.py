@@ -1075,6 +1075,104 @@ class TestGlanceClientWrapper(test.NoDBTestCase):
         self.assertEqual(info['num_calls'], 2)
 
 
+class TestGlanceMetadataCache(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestGlanceMetadataCache, self).setUp()
+        self.flags(glance_metadata_cache_ttl=60)
+        self.addCleanup(glance.reset_metadata_cache)
+        self.client = glance_stubs.StubGlanceClient()
+        self.client.create(id='1', name='image', status='active',
+                           is_public=True, properties={})
+        self.client.create(id='2', name='image', status='queued',
+                           is_public=True, properties={})
+        self.gets = []
+        self._get = self.client.images.get
+
+        def _counting_get(image_id):
+            self.gets.append(image_id)
+            return self._get(image_id)
+
+        self.client.images.get = _counting_get
+        self.stubs.Set(glance, '_create_glance_client',
+                       lambda *args: self.client)
+        client_wrapper = glance.GlanceClientWrapper('fake', 'fake_host', 9292)
+        self.service = glance.GlanceImageService(client=client_wrapper)
+        self.context = context.RequestContext('fake', 'fake',
+                                              auth_token='token')
+
+    def test_cached(self):
+        image = self.service.show(self.context, '1')
+        image['name'] = 'changed'
+        self.assertEqual('image', self.service.show(self.context, '1')['name'])
+        self.assertEqual(['1'], self.gets)
+        self.assertEqual({'hits': 1, 'misses': 1},
+                         glance.get_metadata_cache_stats())
+
+    def test_cached_per_visibility(self):
+        self.service.show(self.context, '1')
+        other = context.RequestContext('fake', 'other', auth_token='token')
+        self.service.show(other, '1')
+        self.assertEqual(['1', '1'], self.gets)
+
+    def test_not_found_cached(self):
+        for _i in range(2):
+            self.assertRaises(exception.ImageNotFound,
+                              self.service.show, self.context, '3')
+        self.assertEqual(['3'], self.gets)
+
+    def test_inactive_not_cached(self):
+        self.service.show(self.context, '2')
+        self.service.show(self.context, '2')
+        self.assertEqual(['2', '2'], self.gets)
+
+    def test_update_invalidates(self):
+        self.service.show(self.context, '1')
+        self.service.update(self.context, '1', {'name': 'renamed'})
+        self.assertEqual('renamed',
+                         self.service.show(self.context, '1')['name'])
+        self.assertEqual(['1', '1'], self.gets)
+
+    def test_update_invalidates_every_visibility(self):
+        other = context.RequestContext('fake', 'other', auth_token='token')
+        admin = context.get_admin_context()
+        for ctxt in (self.context, other, admin):
+            self.service.show(ctxt, '1')
+        self.service.update(self.context, '1', {'name': 'renamed'})
+        for ctxt in (self.context, other, admin):
+            self.assertEqual('renamed', self.service.show(ctxt, '1')['name'])
+        self.assertEqual(['1'] * 6, self.gets)
+
+    def test_update_invalidates_after_concurrent_show(self):
+        update = self.client.images.update
+
+        def racing_update(image_id, **metadata):
+            # NOTE: Another request reads and caches the image while the
+            # update is on its way to glance.
+            self.service.show(self.context, image_id)
+            return update(image_id, **metadata)
+
+        self.client.images.update = racing_update
+        self.service.update(self.context, '1', {'name': 'renamed'})
+        self.assertEqual('renamed',
+                         self.service.show(self.context, '1')['name'])
+
+    def test_delete_invalidates_every_visibility(self):
+        other = context.RequestContext('fake', 'other', auth_token='token')
+        self.service.show(other, '1')
+        self.service.delete(self.context, '1')
+        self.assertTrue(self.service.show(other, '1')['deleted'])
+        self.assertEqual(['1', '1'], self.gets)
+
+    def test_disabled(self):
+        self.flags(glance_metadata_cache_ttl=0)
+        self.service.show(self.context, '1')
+        self.service.show(self.context, '1')
+        self.assertEqual(['1', '1'], self.gets)
+        self.assertEqual({'hits': 0, 'misses': 0},
+                         glance.get_metadata_cache_stats())
+
+
 class TestGlanceUrl(test.NoDBTestCase):
 
     def test_generate_glance_http_url(self):
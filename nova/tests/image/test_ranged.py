@@ -0,0 +1,284 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for parallel ranged image downloads."""
+
+import BaseHTTPServer
+import hashlib
+import httplib
+import os
+import re
+import SocketServer
+
+import eventlet
+import fixtures
+from glanceclient.common import http as glance_http
+
+from nova import context
+from nova import exception
+from nova.image import glance
+from nova.image import ranged
+from nova import test
+from nova.tests.glance import stubs as glance_stubs
+from nova.virt import images
+
+
+class _ImageRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        data = server.images.get(self.path.split('/')[-1])
+        if data is None:
+            self.send_error(404)
+            return
+
+        byte_range = self.headers.get('range')
+        server.requests.append(byte_range)
+        if byte_range and server.serve_ranges:
+            start, end = map(int, re.match(r'bytes=(\d+)-(\d+)',
+                                           byte_range).groups())
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, len(data)))
+        else:
+            start = 0
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if start in server.fail_ranges:
+            # NOTE: Send half of the range and drop the connection.
+            server.fail_ranges.remove(start)
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = 1
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ImageServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ImageServerFixture(fixtures.Fixture):
+    """A local HTTP server standing in for the glance image data API."""
+
+    def setUp(self):
+        super(ImageServerFixture, self).setUp()
+        self.server = _ImageServer(('127.0.0.1', 0), _ImageRequestHandler)
+        self.server.images = {}
+        self.server.requests = []
+        self.server.serve_ranges = True
+        self.server.fail_ranges = set()
+        self.port = self.server.server_address[1]
+        thread = eventlet.spawn(self.server.serve_forever, 0.01)
+        self.addCleanup(thread.wait)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, image_id):
+        return 'http://127.0.0.1:%d/v1/images/%s' % (self.port, image_id)
+
+
+class RangedDownloadTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(RangedDownloadTestCase, self).setUp()
+        self.image_server = self.useFixture(ImageServerFixture())
+        self.data = os.urandom(1000)
+        self.image_server.server.images['fake-image'] = self.data
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        self.dst_path = self.useFixture(fixtures.TempDir()).join('image')
+
+    def _download(self, size=None, workers=3, num_retries=0):
+        download = ranged.RangedDownload(
+            self.image_server.url('fake-image'),
+            {'X-Auth-Token': 'fake-token', 'X-Roles': None},
+            size or len(self.data), workers, 100, num_retries=num_retries)
+        return download.fetch(self.dst_path, 'fake-image',
+                              checksum=self.checksum)
+
+    def _read_dst(self):
+        with open(self.dst_path, 'rb') as f:
+            return f.read()
+
+    def test_fetch(self):
+        stats = self._download()
+        self.assertEqual(self.data, self._read_dst())
+        self.assertEqual(self.checksum, stats['md5'])
+        self.assertEqual(3, stats['workers'])
+        self.assertEqual(sorted('bytes=%d-%d' % (start, start + 99)
+                                for start in range(0, 1000, 100)),
+                         sorted(self.image_server.server.requests))
+
+    def test_fetch_uneven_last_range(self):
+        self.data = self.data[:950]
+        self.image_server.server.images['fake-image'] = self.data
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        self._download()
+        self.assertEqual(self.data, self._read_dst())
+        self.assertIn('bytes=900-949', self.image_server.server.requests)
+
+    def test_checksum_mismatch(self):
+        self.checksum = 'bad'
+        self.assertRaises(exception.ImageUnacceptable, self._download)
+
+    def test_ranges_not_supported(self):
+        self.image_server.server.serve_ranges = False
+        self.assertRaises(ranged.RangeNotSupported, self._download)
+
+    def test_retry_range(self):
+        self.image_server.server.fail_ranges.add(300)
+        self._download(num_retries=1)
+        self.assertEqual(self.data, self._read_dst())
+        self.assertEqual(2, self.image_server.server.requests.count(
+            'bytes=300-399'))
+
+    def test_retries_exhausted(self):
+        self.image_server.server.fail_ranges.add(300)
+        self.assertRaises((IOError, httplib.HTTPException), self._download)
+
+    def test_connect_https_verified(self):
+        download = ranged.RangedDownload('https://[::1]:9292/v1/images/1',
+                                         {}, 1000, 3, 100, timeout=30)
+        conn = download._connect()
+        self.assertIsInstance(conn, glance_http.VerifiedHTTPSConnection)
+        self.assertEqual(('::1', 9292), (conn.host, conn.port))
+        self.assertFalse(conn.insecure)
+        self.assertEqual(30, conn.timeout)
+
+    def test_connect_https_insecure(self):
+        download = ranged.RangedDownload('https://host/v1/images/1', {},
+                                         1000, 3, 100, insecure=True)
+        self.assertTrue(download._connect().insecure)
+
+    def test_connect_http_timeout(self):
+        download = ranged.RangedDownload(self.image_server.url('1'), {},
+                                         1000, 3, 100, timeout=30)
+        conn = download._connect()
+        self.assertIsInstance(conn, httplib.HTTPConnection)
+        self.assertEqual(30, conn.timeout)
+
+
+class GlanceRangedDownloadTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(GlanceRangedDownloadTestCase, self).setUp()
+        self.image_server = self.useFixture(ImageServerFixture())
+        self.data = os.urandom(1000)
+        self.image_server.server.images['1'] = self.data
+        self.flags(glance_download_workers=4, glance_download_range_mb=1)
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.openstack.common.units.Mi', 100))
+
+        self.client = glance_stubs.StubGlanceClient()
+        self.client.create(id='1', is_public=True, status='active',
+                           size=len(self.data),
+                           checksum=hashlib.md5(self.data).hexdigest(),
+                           properties={})
+        self.client.images.data = lambda image_id: iter([self.data])
+        self.stubs.Set(glance, '_create_glance_client',
+                       lambda *args: self.client)
+        client_wrapper = glance.GlanceClientWrapper(
+            'fake', '127.0.0.1', self.image_server.port)
+        self.service = glance.GlanceImageService(client=client_wrapper)
+        self.context = context.RequestContext('fake', 'fake',
+                                              auth_token='fake-token')
+        self.dst_path = self.useFixture(fixtures.TempDir()).join('image')
+
+    def _download(self):
+        self.service.download(self.context, '1', dst_path=self.dst_path)
+        with open(self.dst_path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+
+    def test_download_ranges(self):
+        self._download()
+        self.assertEqual(10, len(self.image_server.server.requests))
+
+    def test_download_small_image_as_stream(self):
+        self.flags(glance_download_range_mb=6)
+        self._download()
+        self.assertEqual([], self.image_server.server.requests)
+
+    def test_download_falls_back_without_ranges(self):
+        self.image_server.server.serve_ranges = False
+        self._download()
+
+    def _download_observed(self):
+        observed = []
+
+        class Observer(object):
+            def write(self, chunk):
+                observed.append(chunk)
+
+        self.service.download(self.context, '1', data=Observer(),
+                              dst_path=self.dst_path)
+        self.assertEqual(self.data, ''.join(observed))
+
+    def test_download_ranges_observed(self):
+        self._download_observed()
+        self.assertEqual(10, len(self.image_server.server.requests))
+
+    def test_download_stream_observed(self):
+        self.flags(glance_download_workers=1)
+        self._download_observed()
+        self.assertEqual([], self.image_server.server.requests)
+
+    def test_download_ranges_aborted_by_observer(self):
+        class Observer(object):
+            def write(self, chunk):
+                raise exception.FlavorDiskTooSmall()
+
+        self.assertRaises(exception.FlavorDiskTooSmall,
+                          self.service.download, self.context, '1',
+                          data=Observer(), dst_path=self.dst_path)
+        self.assertTrue(len(self.image_server.server.requests) < 10)
+
+    def test_download_ranges_failed_then_streamed(self):
+        # NOTE: The 600-699 range fails after earlier ranges have been
+        # shown to the inspector, and the stream arrives in other chunks.
+        self.image_server.server.fail_ranges.add(600)
+        self.client.images.data = lambda image_id: iter(
+            [self.data[i:i + 300] for i in range(0, len(self.data), 300)])
+        inspector = images._DownloadInspector('1', max_size=len(self.data))
+        self.service.download(self.context, '1', data=inspector,
+                              dst_path=self.dst_path)
+        self.assertEqual(len(self.data), inspector.bytes_seen)
+        with open(self.dst_path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+        self.assertIn('bytes=600-699', self.image_server.server.requests)
+
+    def test_download_checksum_mismatch(self):
+        self.client.get('1').checksum = 'bad'
+        self.assertRaises(exception.ImageUnacceptable,
+                          self.service.download, self.context, '1',
+                          dst_path=self.dst_path)
+
+    def test_download_ranges_with_cached_metadata(self):
+        self.flags(glance_metadata_cache_ttl=60,
+                   glance_api_servers=['127.0.0.1:%d' %
+                                       self.image_server.port])
+        self.addCleanup(glance.reset_metadata_cache)
+        glance.GlanceImageService().show(self.context, '1')
+        self.service = glance.GlanceImageService()
+        self._download()
+        self.assertEqual(10, len(self.image_server.server.requests))
+        self.assertEqual({'hits': 1, 'misses': 1},
+                         glance.get_metadata_cache_stats())
+
+    def test_download_disabled_by_default(self):
+        self.flags(glance_download_workers=1)
+        self._download()
+        self.assertEqual([], self.image_server.server.requests)
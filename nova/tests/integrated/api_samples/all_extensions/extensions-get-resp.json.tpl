@@ -408,6 +408,14 @@
             "namespace": "http://docs.openstack.org/compute/ext/hypervisors/api/v1.1",
             "updated": "%(timestamp)s"
         },
+        {
+            "alias": "os-image-precache",
+            "description": "%(text)s",
+            "links": [],
+            "name": "ImagePrecache",
+            "namespace": "http://docs.openstack.org/compute/ext/image_precache/api/v2",
+            "updated": "%(timestamp)s"
+        },
         {
             "alias": "os-extended-hypervisors",
             "description": "%(text)s",
@@ -147,6 +147,9 @@
   <extension alias="os-hypervisors" updated="%(timestamp)s" namespace="http://docs.openstack.org/compute/ext/hypervisors/api/v1.1" name="Hypervisors">
     <description>%(text)s</description>
   </extension>
+  <extension alias="os-image-precache" updated="%(timestamp)s" namespace="http://docs.openstack.org/compute/ext/image_precache/api/v2" name="ImagePrecache">
+    <description>%(text)s</description>
+  </extension>
   <extension alias="os-extended-hypervisors" name="ExtendedHypervisors" namespace="http://docs.openstack.org/compute/ext/extended_hypervisors/api/v1.1" updated="%(timestamp)s">
     <description>%(text)s</description>
   </extension>
@@ -0,0 +1,5 @@
+{
+    "cache_image": {
+        "image_id": "%(image_id)s"
+    }
+}
@@ -0,0 +1,2 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<cache_image image_id="%(image_id)s" />
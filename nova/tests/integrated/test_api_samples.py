@@ -1552,6 +1552,51 @@ class AggregatesSampleXmlTest(AggregatesSampleJsonTest):
     ctype = 'xml'
 
 
+@mock.patch.object(compute_api.HostAPI, 'cache_image')
+class ImagePrecacheHostJsonTest(ApiSampleTestBaseV2):
+    extends_name = "nova.api.openstack.compute.contrib.hosts.Hosts"
+    extension_name = ("nova.api.openstack.compute.contrib."
+                      "image_precache.Image_precache")
+
+    def test_host_cache_image(self, mock_cache_image):
+        image_id = fake.get_valid_image_id()
+        response = self._do_post('os-hosts/%s/cache_image' %
+                                 self.compute.host,
+                                 'host-cache-image-req',
+                                 {'image_id': image_id})
+        self.assertEqual(response.status, 202)
+        self.assertEqual(response.read(), '')
+        mock_cache_image.assert_called_once_with(mock.ANY, image_id,
+                                                 [self.compute.host])
+
+
+class ImagePrecacheHostXmlTest(ImagePrecacheHostJsonTest):
+    ctype = 'xml'
+
+
+@mock.patch.object(compute_api.AggregateAPI, 'cache_image')
+class ImagePrecacheAggregateJsonTest(ApiSampleTestBaseV2):
+    extends_name = ("nova.api.openstack.compute.contrib."
+                    "aggregates.Aggregates")
+    extension_name = ("nova.api.openstack.compute.contrib."
+                      "image_precache.Image_precache")
+
+    def test_aggregate_cache_image(self, mock_cache_image):
+        aggregate_id = '1'
+        image_id = fake.get_valid_image_id()
+        response = self._do_post('os-aggregates/%s/action' % aggregate_id,
+                                 'aggregate-cache-image-req',
+                                 {'image_id': image_id})
+        self.assertEqual(response.status, 202)
+        self.assertEqual(response.read(), '')
+        mock_cache_image.assert_called_once_with(mock.ANY, aggregate_id,
+                                                 image_id)
+
+
+class ImagePrecacheAggregateXmlTest(ImagePrecacheAggregateJsonTest):
+    ctype = 'xml'
+
+
 class CertificatesSamplesJsonTest(ApiSampleTestBaseV2):
     extension_name = ("nova.api.openstack.compute.contrib.certificates."
                       "Certificates")
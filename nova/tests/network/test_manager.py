@@ -1880,6 +1880,38 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(res[0]['instance_uuid'], _vifs[1]['instance_uuid'])
         self.assertEqual(res[1]['instance_uuid'], _vifs[2]['instance_uuid'])
 
+        # Get instance 2 by its floating ip
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': '^173\\.16\\.1'})
+        self.assertEqual([{'instance_uuid': _vifs[2]['instance_uuid'],
+                           'ip': '173.16.1.2'}], res)
+
+    @mock.patch('nova.db.fixed_ips_by_virtual_interface')
+    def test_get_instance_uuids_by_ip_uses_index(self, fixed_get):
+        manager = fake_network.FakeNetworkManager(self.stubs)
+        fake_context = context.RequestContext('user', 'project')
+
+        with mock.patch.object(manager.db, 'fixed_ip_search_by_address',
+                side_effect=manager.db.fixed_ip_search_by_address) as search:
+            res = manager.get_instance_uuids_by_ip_filter(
+                fake_context, {'ip': '^172\\.16\\.0\\.2$'})
+        instance_uuid = manager.db.vifs[1]['instance_uuid']
+        self.assertEqual([{'instance_uuid': instance_uuid,
+                           'ip': '172.16.0.2'}], res)
+        search.assert_called_once_with(fake_context, '172.16.0.2')
+        self.assertFalse(fixed_get.called)
+
+    def test_ip_filter_to_like_pattern(self):
+        for ip_filter, pattern in [('^10\\.0\\.0\\.1$', '10.0.0.1'),
+                                   ('10.0.', '10_0_%'),
+                                   ('', '%'),
+                                   ('^fe80\\:', 'fe80:%'),
+                                   ('10.0.0.*', None),
+                                   ('10\\.0\\.0\\.[12]', None),
+                                   ('10%', None)]:
+            self.assertEqual(
+                pattern, network_manager._ip_filter_to_like_pattern(ip_filter))
+
     @mock.patch('nova.db.network_get')
     def test_get_instance_uuids_by_ipv6_regex(self, network_get):
         manager = fake_network.FakeNetworkManager(self.stubs)
@@ -66,6 +66,33 @@ class TestField(test.NoDBTestCase):
             self.assertEqual(out_val, self.field.from_primitive(
                     ObjectLikeThing, 'attr', prim_val))
 
+    def test_primitive_codecs(self):
+        class ObjectLikeThing:
+            _context = 'context'
+
+        to_primitive, from_primitive = self.field.get_primitive_codecs()
+        for in_val, prim_val in self.to_primitive_values:
+            if to_primitive is None:
+                self.assertEqual(prim_val, in_val)
+            else:
+                self.assertEqual(prim_val, to_primitive('obj', 'attr',
+                                                        in_val))
+        for prim_val, out_val in self.from_primitive_values:
+            expected = self.field.coerce(
+                ObjectLikeThing, 'attr',
+                self.field.from_primitive(ObjectLikeThing, 'attr', prim_val))
+            self.assertEqual(expected, from_primitive(ObjectLikeThing,
+                                                      'attr', prim_val))
+
+    def test_primitive_codecs_none(self):
+        to_primitive, from_primitive = self.field.get_primitive_codecs()
+        if to_primitive is not None:
+            self.assertIsNone(to_primitive('obj', 'attr', None))
+        if self.field.nullable:
+            self.assertIsNone(from_primitive('obj', 'attr', None))
+        else:
+            self.assertRaises(ValueError, from_primitive, 'obj', 'attr', None)
+
 
 class TestString(TestField):
     def setUp(self):
@@ -41,6 +41,9 @@ from nova import utils
 
 
 class _TestInstanceObject(object):
+    save_columns_to_join = ['info_cache', 'security_groups',
+                            'system_metadata']
+
     @property
     def fake_instance(self):
         fake_instance = fakes.stub_instance(id=2,
@@ -284,8 +287,7 @@ class _TestInstanceObject(object):
         db.instance_update_and_get_original(
                 self.context, fake_uuid, expected_updates,
                 update_cells=False,
-                columns_to_join=['info_cache', 'security_groups',
-                    'system_metadata']
+                columns_to_join=self.save_columns_to_join
                 ).AndReturn((old_ref, new_ref))
         if cell_type == 'api':
             cells_rpcapi.CellsAPI().AndReturn(cells_api_mock)
@@ -363,8 +365,7 @@ class _TestInstanceObject(object):
                                 ).AndReturn(old_ref)
         db.instance_update_and_get_original(
                 self.context, fake_uuid, expected_updates, update_cells=False,
-                columns_to_join=['info_cache', 'security_groups',
-                    'system_metadata']
+                columns_to_join=self.save_columns_to_join
                 ).AndReturn((old_ref, new_ref))
         notifications.send_update(self.context, mox.IgnoreArg(),
                                   mox.IgnoreArg())
@@ -844,7 +845,52 @@ class TestInstanceObject(test_objects._LocalTest,
 
 class TestRemoteInstanceObject(test_objects._RemoteTest,
                                _TestInstanceObject):
-    pass
+    # NOTE: save() is remoted as a delta, so the conductor only joins what
+    # was changed (plus system_metadata for the notification).
+    save_columns_to_join = ['system_metadata']
+
+    def test_save_sends_delta(self):
+        self.mox.StubOutWithMock(db, 'instance_get_by_uuid')
+        self.mox.StubOutWithMock(db, 'instance_update_and_get_original')
+        self.mox.StubOutWithMock(notifications, 'send_update')
+        old_ref = dict(self.fake_instance, task_state='old')
+        new_ref = dict(old_ref, task_state='new', host='newhost')
+        db.instance_get_by_uuid(self.context, old_ref['uuid'],
+                                columns_to_join=['info_cache',
+                                                 'security_groups'],
+                                use_slave=False
+                                ).AndReturn(old_ref)
+        db.instance_update_and_get_original(
+                self.context, old_ref['uuid'],
+                {'task_state': 'new', 'expected_task_state': 'old'},
+                update_cells=False, columns_to_join=['system_metadata']
+                ).AndReturn((old_ref, new_ref))
+        notifications.send_update(self.context, mox.IgnoreArg(),
+                                  mox.IgnoreArg())
+        self.mox.ReplayAll()
+
+        inst = instance.Instance.get_by_uuid(self.context, old_ref['uuid'])
+        real_delta = inst.obj_to_delta_primitive
+        deltas = []
+
+        def fake_delta():
+            deltas.append(real_delta())
+            return deltas[-1]
+
+        self.stubs.Set(inst, 'obj_to_delta_primitive', fake_delta)
+        inst.task_state = 'new'
+        inst.save(expected_task_state='old')
+
+        primitive, fingerprints = deltas[0]
+        self.assertEqual(set(['id', 'uuid', 'cell_name', 'task_state']),
+                         set(primitive['nova_object.data'].keys()))
+        self.assertEqual(['task_state'], primitive['nova_object.changes'])
+        self.assertIn('host', fingerprints)
+        self.assertIn('info_cache', fingerprints)
+        self.assertNotIn('task_state', fingerprints)
+        self.assertEqual('new', inst.task_state)
+        self.assertEqual('newhost', inst.host)
+        self.assertEqual(set(), inst.obj_what_changed())
 
 
 class _TestInstanceListObject(object):
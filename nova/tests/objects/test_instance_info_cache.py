@@ -12,10 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova import db
 from nova import exception
+from nova import metadata_cache
 from nova.network import model as network_model
 from nova.objects import instance_info_cache
 from nova.tests.objects import test_objects
@@ -96,6 +99,22 @@ class _TestInstanceInfoCacheObject(object):
     def test_save_without_update_cells(self):
         self._save_helper(None, False)
 
+    @mock.patch.object(metadata_cache, 'network_info_updated')
+    def test_save_updates_metadata_cache(self, mock_updated):
+        self._save_helper(None, False)
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        mock_updated.assert_called_once_with('fake-uuid', nwinfo.json())
+
+    @mock.patch.object(metadata_cache, 'invalidate')
+    def test_delete(self, mock_invalidate):
+        obj = instance_info_cache.InstanceInfoCache.new(self.context,
+                                                        'fake-uuid')
+        self.mox.StubOutWithMock(db, 'instance_info_cache_delete')
+        db.instance_info_cache_delete(self.context, 'fake-uuid')
+        self.mox.ReplayAll()
+        obj.delete()
+        mock_invalidate.assert_called_once_with('fake-uuid')
+
     def test_refresh(self):
         obj = instance_info_cache.InstanceInfoCache.new(self.context,
                                                         'fake-uuid1')
@@ -411,6 +411,18 @@ class _RemoteTest(_BaseTestCase):
         self.stubs.Set(self.conductor_service.manager, 'object_action',
                        fake_object_action)
 
+        orig_object_delta_action = \
+            self.conductor_service.manager.object_delta_action
+
+        def fake_object_delta_action(*args, **kwargs):
+            self.remote_object_calls.append((kwargs.get('objinst'),
+                                             kwargs.get('objmethod')))
+            with things_temporarily_local():
+                result = orig_object_delta_action(*args, **kwargs)
+            return result
+        self.stubs.Set(self.conductor_service.manager, 'object_delta_action',
+                       fake_object_delta_action)
+
         # Things are remoted by default in this session
         base.NovaObject.indirection_api = conductor_rpcapi.ConductorAPI()
 
@@ -454,6 +466,37 @@ class _TestObject(object):
             ofp.assert_called_once_with(None, '1.5', primitive)
         self.assertEqual(obj.foo, 1)
 
+    def test_hydration_coerces_untrusted(self):
+        primitive = {'nova_object.name': 'MyObj',
+                     'nova_object.namespace': 'nova',
+                     'nova_object.version': '1.5',
+                     'nova_object.data': {'foo': '1', 'bar': 'baz'},
+                     'nova_object.changes': ['bar']}
+        obj = MyObj.obj_from_primitive(primitive)
+        self.assertEqual(1, obj.foo)
+        self.assertEqual(u'baz', obj.bar)
+        self.assertIsInstance(obj.bar, unicode)
+        self.assertEqual(set(['bar']), obj.obj_what_changed())
+
+    def test_hydration_trusts_sub_objects(self):
+        class ParentObj(base.NovaObject):
+            fields = {'child': fields.ObjectField('MyObj')}
+
+        child = MyObj(foo=1)
+        primitive = ParentObj(child=child).obj_to_primitive()
+        with mock.patch.object(fields.Object, 'coerce') as mock_coerce:
+            obj = ParentObj.obj_from_primitive(primitive)
+            self.assertFalse(mock_coerce.called)
+        self.assertIsInstance(obj.child, MyObj)
+        self.assertEqual(1, obj.child.foo)
+
+    def test_class_codecs(self):
+        self.assertEqual(sorted(MyObj.fields.keys()),
+                         sorted(codec[0] for codec in MyObj._obj_codecs))
+        for name, attrname, to_primitive, from_primitive in MyObj._obj_codecs:
+            self.assertEqual(base.get_attrname(name), attrname)
+            self.assertTrue(callable(from_primitive))
+
     def test_hydration_version_different(self):
         primitive = {'nova_object.name': 'MyObj',
                      'nova_object.namespace': 'nova',
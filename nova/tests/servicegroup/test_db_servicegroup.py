@@ -12,9 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import datetime
 
 import fixtures
+import mock
 
 from nova import context
 from nova import db
@@ -142,3 +144,90 @@ class DBServiceGroupTestCase(test.TestCase):
         self.mox.ReplayAll()
         result = self.servicegroup_api.service_is_up(service)
         self.assertFalse(result)
+
+    def test_get_liveness(self):
+        host1 = self._host + '_1'
+        host2 = self._host + '_2'
+        serv1 = self.useFixture(
+            ServiceFixture(host1, self._binary, self._topic)).serv
+        serv1.start()
+        serv2 = self.useFixture(
+            ServiceFixture(host2, self._binary, self._topic)).serv
+        serv2.start()
+        self.assertEqual({host1: True, host2: True},
+                         self.servicegroup_api.get_liveness(self._topic))
+
+        serv2.stop()
+        self.useFixture(test.TimeOverride())
+        timeutils.advance_time_seconds(self.down_time + 1)
+        self.servicegroup_api._driver._report_state(serv1)
+        self.assertEqual({host1: True, host2: False},
+                         self.servicegroup_api.get_liveness(self._topic))
+        self.assertEqual([host1], self.servicegroup_api.get_all(self._topic))
+
+    def test_liveness_cache(self):
+        self.flags(servicegroup_db_liveness_cache=True, report_interval=10)
+        driver = self.servicegroup_api._driver
+        serv = self.useFixture(
+            ServiceFixture(self._host, self._binary, self._topic)).serv
+        serv.start()
+        self.useFixture(test.TimeOverride())
+        service_ref = db.service_get_by_args(self._ctx, self._host,
+                                             self._binary)
+
+        with mock.patch.object(driver.conductor_api,
+                               'service_get_all_by_topic',
+                               wraps=driver.conductor_api.
+                               service_get_all_by_topic) as get_all:
+            self.assertEqual({self._host: True},
+                             self.servicegroup_api.get_liveness(self._topic))
+            self.assertTrue(self.servicegroup_api.service_is_up(service_ref))
+            self.assertEqual([self._host],
+                             self.servicegroup_api.get_all(self._topic))
+            self.assertEqual(1, get_all.call_count)
+
+            # NOTE: The group is read again once report_interval has passed.
+            serv.stop()
+            timeutils.advance_time_seconds(self.down_time + 1)
+            self.assertEqual({self._host: False},
+                             self.servicegroup_api.get_liveness(self._topic))
+            self.assertEqual(2, get_all.call_count)
+
+            # NOTE: A service_ref newer than the cache is still up.
+            service_ref = dict(service_ref, updated_at=timeutils.utcnow())
+            self.assertTrue(self.servicegroup_api.service_is_up(service_ref))
+            self.assertEqual(2, get_all.call_count)
+
+    def test_report_state_heartbeat(self):
+        self.flags(heartbeat_flush_window=1, group='conductor')
+        driver = self.servicegroup_api._driver
+        serv = self.useFixture(
+            ServiceFixture(self._host, self._binary, self._topic)).serv
+        serv.start()
+        service_ref = serv.service_ref
+        with contextlib.nested(
+            mock.patch.object(driver.conductor_api, 'service_heartbeat',
+                              return_value=None),
+            mock.patch.object(driver.conductor_api, 'service_update'),
+        ) as (heartbeat, update):
+            driver._report_state(serv)
+        heartbeat.assert_called_once_with(mock.ANY, service_ref)
+        self.assertFalse(update.called)
+        self.assertIs(service_ref, serv.service_ref)
+
+    def test_report_state_heartbeat_old_conductor(self):
+        self.flags(heartbeat_flush_window=1, group='conductor')
+        driver = self.servicegroup_api._driver
+        serv = self.useFixture(
+            ServiceFixture(self._host, self._binary, self._topic)).serv
+        serv.start()
+        report_count = serv.service_ref['report_count']
+
+        def fake_heartbeat(context, service):
+            return dict(service, report_count=service['report_count'] + 1)
+
+        with mock.patch.object(driver.conductor_api, 'service_heartbeat',
+                               side_effect=fake_heartbeat):
+            driver._report_state(serv)
+            driver._report_state(serv)
+        self.assertEqual(report_count + 2, serv.service_ref['report_count'])
@@ -126,6 +126,8 @@ class MemcachedServiceGroupTestCase(test.TestCase):
         self.assertIn(host1, services)
         self.assertIn(host2, services)
         self.assertNotIn(host3, services)
+        self.assertEqual({host1: True, host2: True, host3: False},
+                         self.servicegroup_api.get_liveness(self._topic))
 
         service_id = self.servicegroup_api.get_one(self._topic)
         self.assertIn(service_id, services)
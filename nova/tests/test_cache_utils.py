@@ -0,0 +1,103 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the in process cache client."""
+
+from nova import cache_utils
+from nova.openstack.common import timeutils
+from nova import test
+
+
+class MemorycacheClientTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(MemorycacheClientTestCase, self).setUp()
+        self.useFixture(test.TimeOverride())
+        self.client = cache_utils.Client()
+
+    def test_get_set(self):
+        self.assertIsNone(self.client.get('foo'))
+        self.assertTrue(self.client.set('foo', 'bar'))
+        self.assertEqual('bar', self.client.get('foo'))
+        self.client.delete('foo')
+        self.assertIsNone(self.client.get('foo'))
+
+        stats = self.client.get_cache_stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(0, stats['entries'])
+
+    def test_expiry(self):
+        self.client.set('foo', 'bar', time=10)
+        self.client.set('baz', 'qux')
+        timeutils.advance_time_seconds(9)
+        self.assertEqual('bar', self.client.get('foo'))
+        timeutils.advance_time_seconds(1)
+        self.assertIsNone(self.client.get('foo'))
+        self.assertEqual('qux', self.client.get('baz'))
+        self.assertEqual(1, self.client.get_cache_stats()['expirations'])
+
+    def test_sweep(self):
+        self.client.set('foo', 'bar', time=10)
+        self.client.get('baz')
+        timeutils.advance_time_seconds(self.client.sweep_interval)
+        # NOTE: Expired entries are swept even if they are not looked up.
+        self.client.get('baz')
+        self.assertEqual(0, self.client.get_cache_stats()['entries'])
+        self.assertEqual(1, self.client.get_cache_stats()['expirations'])
+
+    def test_lru_eviction(self):
+        self.client = cache_utils.Client(max_entries=2)
+        self.client.set('a', 1)
+        self.client.set('b', 2)
+        self.client.get('a')
+        self.client.set('c', 3)
+        self.assertEqual({'a': 1, 'c': 3},
+                         self.client.get_multi(['a', 'b', 'c']))
+        self.assertEqual(1, self.client.get_cache_stats()['evictions'])
+
+        # NOTE: Updating an entry does not evict anything.
+        self.client.set('a', 4)
+        self.assertEqual({'a': 4, 'c': 3}, self.client.get_multi(['a', 'c']))
+
+    def test_bounded_by_default(self):
+        max_entries = self.client.max_entries
+        self.assertTrue(max_entries > 0)
+        for i in range(max_entries + 1):
+            self.client.set('key%d' % i, i)
+        self.assertEqual(max_entries, len(self.client.cache))
+        self.assertIsNone(self.client.get('key0'))
+        self.assertEqual(max_entries, self.client.get('key%d' % max_entries))
+        self.assertEqual(1, self.client.evictions)
+
+    def test_max_entries_option(self):
+        self.flags(memorycache_max_entries=5)
+        self.assertEqual(5, cache_utils.Client().max_entries)
+
+    def test_multi(self):
+        self.assertEqual([], self.client.set_multi({'a': 1, 'b': 2},
+                                                   key_prefix='p:', time=10))
+        self.assertEqual(1, self.client.get('p:a'))
+        self.assertEqual({'a': 1, 'b': 2},
+                         self.client.get_multi(['a', 'b', 'c'],
+                                               key_prefix='p:'))
+        self.client.delete_multi(['a', 'c'], key_prefix='p:')
+        self.assertEqual({'b': 2}, self.client.get_multi(['a', 'b'],
+                                                         key_prefix='p:'))
+        timeutils.advance_time_seconds(10)
+        self.assertEqual({}, self.client.get_multi(['b'], key_prefix='p:'))
+
+    def test_add_incr(self):
+        self.assertTrue(self.client.add('foo', '1'))
+        self.assertFalse(self.client.add('foo', '2'))
+        self.assertEqual(3, self.client.incr('foo', 2))
+        self.assertEqual('3', self.client.get('foo'))
+        self.assertIsNone(self.client.incr('bar'))
@@ -27,10 +27,12 @@ try:
 except ImportError:
     import pickle
 
+import mock
 import mox
 from oslo.config import cfg
 import webob
 
+from nova.api.ec2 import ec2utils
 from nova.api.metadata import base
 from nova.api.metadata import handler
 from nova.api.metadata import password
@@ -41,8 +43,11 @@ from nova import context
 from nova import db
 from nova.db.sqlalchemy import api
 from nova import exception
+from nova import metadata_cache
 from nova.network import api as network_api
+from nova.network import model as network_model
 from nova.objects import instance as instance_obj
+from nova.objects import security_group as secgroup_obj
 from nova import test
 from nova.tests import fake_block_device
 from nova.tests import fake_instance
@@ -548,11 +553,105 @@ class OpenStackMetadataTestCase(test.TestCase):
             self.assertEqual(vd[k], v)
 
 
+class MetadataLookupTestCase(test.TestCase):
+    def setUp(self):
+        super(MetadataLookupTestCase, self).setUp()
+        self.context = context.RequestContext('fake', 'fake')
+        self.instance = fake_inst_obj(self.context)
+        self.instance.system_metadata = get_default_sys_meta()
+        self.flags(use_local=True, group='conductor')
+        self.flags(metadata_lookup_cache_expiration=60)
+        metadata_cache.reset()
+        self.addCleanup(metadata_cache.reset)
+        self.cache = metadata_cache.get_client()
+
+        self.lookups = {}
+        for name, obj, attr, value in [
+                ('availability_zone', ec2utils,
+                 'get_availability_zone_by_host', 'nova'),
+                ('security_groups', secgroup_obj.SecurityGroupList,
+                 'get_by_instance', []),
+                ('mappings', base, '_format_instance_mapping',
+                 {'ami': 'sda1'}),
+                ('ec2_ids', conductor_api.LocalAPI, 'get_ec2_ids',
+                 {'ami-id': 'ami-00000001'}),
+                ('network_info', network_api.API, 'get_instance_nw_info',
+                 network_model.NetworkInfo())]:
+            patcher = mock.patch.object(obj, attr, return_value=value)
+            self.addCleanup(patcher.stop)
+            self.lookups[name] = patcher.start()
+
+    def _metadata(self):
+        return base.InstanceMetadata(self.instance.obj_clone(),
+                                     lookup_cache=self.cache)
+
+    def _assert_looked_up(self, count, names=None):
+        for name in names or self.lookups:
+            self.assertEqual(count, self.lookups[name].call_count, name)
+
+    def test_lookups(self):
+        md = base.InstanceMetadata(self.instance.obj_clone())
+        self.assertEqual('nova', md.availability_zone)
+        self.assertEqual({'ami': 'sda1'}, md.mappings)
+        self.assertEqual({'ami-id': 'ami-00000001'}, md.ec2_ids)
+        base.InstanceMetadata(self.instance.obj_clone())
+        self._assert_looked_up(2)
+
+    def test_lookups_are_cached(self):
+        self._metadata()
+        md = self._metadata()
+        self.assertEqual('nova', md.availability_zone)
+        self.assertEqual({'ami': 'sda1'}, md.mappings)
+        self._assert_looked_up(1)
+
+    def test_zero_expiration_disables_cache(self):
+        self.flags(metadata_lookup_cache_expiration=0)
+        self._metadata()
+        self._metadata()
+        self._assert_looked_up(2)
+
+    def test_warm_lookup_cache_disabled(self):
+        self.flags(metadata_lookup_cache_expiration=0)
+        base.warm_lookup_cache(self.instance)
+        self._assert_looked_up(0)
+
+    def test_failed_lookup_keeps_others(self):
+        self.lookups['security_groups'].side_effect = [
+            test.TestingException(), []]
+        self.assertRaises(test.TestingException, self._metadata)
+        self._metadata()
+        self._assert_looked_up(1, ['availability_zone', 'mappings',
+                                   'ec2_ids', 'network_info'])
+        self._assert_looked_up(2, ['security_groups'])
+
+    def test_get_metadata_by_instance_id_uses_cache(self):
+        with mock.patch.object(instance_obj.Instance, 'get_by_uuid',
+                               side_effect=lambda *a: self.instance):
+            base.get_metadata_by_instance_id(None, self.instance.uuid, None)
+            base.get_metadata_by_instance_id(None, self.instance.uuid, None)
+        self._assert_looked_up(1)
+
+    def test_warm_lookup_cache(self):
+        nw_info = fake_network.fake_get_instance_nw_info(self.stubs,
+                                                         num_networks=1)
+        base.warm_lookup_cache(self.instance, nw_info)
+        self._assert_looked_up(0, ['network_info'])
+        md = self._metadata()
+        self._assert_looked_up(1, ['availability_zone', 'security_groups',
+                                   'mappings', 'ec2_ids'])
+        self._assert_looked_up(0, ['network_info'])
+        self.assertEqual(
+            ec2utils.get_ip_info_for_instance_from_nw_info(nw_info),
+            md.ip_info)
+
+
 class MetadataHandlerTestCase(test.TestCase):
     """Test that metadata is returning proper values."""
 
     def setUp(self):
         super(MetadataHandlerTestCase, self).setUp()
+        metadata_cache.reset()
+        self.addCleanup(metadata_cache.reset)
 
         fake_network.stub_out_nw_api_get_instance_nw_info(self.stubs)
         self.context = context.RequestContext('fake', 'fake')
@@ -758,6 +857,153 @@ class MetadataHandlerTestCase(test.TestCase):
         self.assertEqual(response.status_int, 500)
 
 
+class MetadataResponseCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(MetadataResponseCacheTestCase, self).setUp()
+        metadata_cache.reset()
+        self.addCleanup(metadata_cache.reset)
+        fake_network.stub_out_nw_api_get_instance_nw_info(self.stubs)
+        self.context = context.RequestContext('fake', 'fake')
+        self.instance = fake_inst_obj(self.context)
+        self.instance.system_metadata = get_default_sys_meta()
+        self.flags(use_local=True, group='conductor')
+        self.mdinst = fake_InstanceMetadata(self.stubs, self.instance)
+        self.app = handler.MetadataRequestHandler()
+        self.get_metadata = mock.Mock(return_value=self.mdinst)
+        self.stubs.Set(self.app, 'get_metadata_by_remote_address',
+                       self.get_metadata)
+        # NOTE: Invalidation is only done with memcached_servers, which is
+        # set once the in process cache clients exist.
+        metadata_cache.get_client()
+        self.flags(memcached_servers=['localhost:11211'])
+
+    def _request(self, relpath='/2009-04-04/user-data', app=None,
+                 headers=None):
+        request = webob.Request.blank(relpath)
+        request.remote_addr = '127.0.0.1'
+        if headers is not None:
+            request.headers.update(headers)
+        return request.get_response(app or self.app)
+
+    def test_response_is_cached(self):
+        for _i in range(2):
+            response = self._request()
+            self.assertEqual(200, response.status_int)
+            self.assertEqual(USER_DATA_STRING, response.body)
+        self.assertEqual(1, self.get_metadata.call_count)
+        self.assertEqual({'hits': 1, 'misses': 1, 'stale': 0,
+                          'hit_rate': 0.5}, self.app.get_cache_stats())
+
+    def test_paths_are_cached_separately(self):
+        self._request()
+        response = self._request('/2009-04-04/meta-data/hostname')
+        self.assertEqual('%s.%s' % (self.instance['hostname'],
+                                    CONF.dhcp_domain), response.body)
+        self.assertEqual(2, self.get_metadata.call_count)
+
+    def test_shared_between_workers(self):
+        self._request()
+        other = handler.MetadataRequestHandler()
+        other._cache = self.app._cache
+        self.stubs.Set(other, 'get_metadata_by_remote_address',
+                       self.get_metadata)
+        response = self._request(app=other)
+        self.assertEqual(USER_DATA_STRING, response.body)
+        self.assertEqual(1, self.get_metadata.call_count)
+
+    def test_invalidate(self):
+        self._request()
+        metadata_cache.invalidate(self.instance.uuid)
+        self._request()
+        self.assertEqual(2, self.get_metadata.call_count)
+        self.assertEqual(1, self.app.get_cache_stats()['stale'])
+
+    def test_disabled(self):
+        self.flags(metadata_response_cache_expiration=0)
+        self._request()
+        self._request()
+        self.assertEqual(2, self.get_metadata.call_count)
+
+    def test_callable_response_is_not_cached(self):
+        self._request('/openstack/2013-04-04/password')
+        self._request('/openstack/2013-04-04/password')
+        self.assertEqual(2, self.get_metadata.call_count)
+
+    def test_instance_metadata_is_invalidated(self):
+        self.stubs.Set(self.app, 'get_metadata_by_remote_address',
+                       handler.MetadataRequestHandler.
+                       get_metadata_by_remote_address.__get__(self.app))
+        with mock.patch.object(base, 'get_metadata_by_address',
+                               return_value=self.mdinst) as mock_get:
+            self._request()
+            self._request('/2009-04-04/meta-data/hostname')
+            self.assertEqual(1, mock_get.call_count)
+            metadata_cache.invalidate(self.instance.uuid)
+            self._request('/2009-04-04/meta-data/instance-id')
+            self.assertEqual(2, mock_get.call_count)
+
+    def test_neutron_tenant_is_checked(self):
+        self.flags(service_neutron_metadata_proxy=True)
+        get_metadata = mock.Mock(return_value=self.mdinst)
+        self.stubs.Set(self.app, 'get_metadata_by_instance_id', get_metadata)
+        signed = hmac.new(CONF.neutron_metadata_proxy_shared_secret,
+                          'a-b-c-d', hashlib.sha256).hexdigest()
+        headers = {'X-Forwarded-For': '192.192.192.2',
+                   'X-Instance-ID': 'a-b-c-d',
+                   'X-Tenant-ID': 'test',
+                   'X-Instance-ID-Signature': signed}
+        self.assertEqual(200, self._request(headers=headers).status_int)
+        self.assertEqual(200, self._request(headers=headers).status_int)
+        self.assertEqual(1, get_metadata.call_count)
+
+        headers['X-Tenant-ID'] = 'other'
+        self.assertEqual(404, self._request(headers=headers).status_int)
+        self.assertEqual(2, get_metadata.call_count)
+
+
+class MetadataCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(MetadataCacheTestCase, self).setUp()
+        metadata_cache.reset()
+        self.addCleanup(metadata_cache.reset)
+        self.client = metadata_cache.get_client()
+        self.flags(memcached_servers=['localhost:11211'])
+
+    def test_get_generation(self):
+        generation = metadata_cache.get_generation('uuid')
+        self.assertIsNotNone(generation)
+        self.assertEqual(generation, metadata_cache.get_generation('uuid'))
+        self.assertNotEqual(generation, metadata_cache.get_generation('other'))
+
+    def test_invalidate(self):
+        generation = metadata_cache.get_generation('uuid')
+        for name in metadata_cache.LOOKUPS:
+            self.client.set(metadata_cache.lookup_key(name, 'uuid'), 'value')
+        metadata_cache.invalidate('uuid')
+        self.assertNotEqual(generation, metadata_cache.get_generation('uuid'))
+        for name in metadata_cache.LOOKUPS:
+            self.assertIsNone(
+                self.client.get(metadata_cache.lookup_key(name, 'uuid')))
+
+    def test_invalidate_needs_memcached_servers(self):
+        self.flags(memcached_servers=None)
+        generation = metadata_cache.get_generation('uuid')
+        metadata_cache.invalidate('uuid')
+        metadata_cache.network_info_updated('uuid', '[]')
+        self.assertEqual(generation, metadata_cache.get_generation('uuid'))
+
+    def test_network_info_updated(self):
+        nw_info = network_model.NetworkInfo(
+            [network_model.VIF(id='vif', address='aa:bb:cc:dd:ee:ff')])
+        metadata_cache.network_info_updated('uuid', nw_info.json())
+        generation = metadata_cache.get_generation('uuid')
+        metadata_cache.network_info_updated(
+            'uuid', network_model.NetworkInfo.hydrate(nw_info.json()).json())
+        self.assertEqual(generation, metadata_cache.get_generation('uuid'))
+        metadata_cache.network_info_updated('uuid', '[]')
+        self.assertNotEqual(generation, metadata_cache.get_generation('uuid'))
+
+
 class MetadataPasswordTestCase(test.TestCase):
     def setUp(self):
         super(MetadataPasswordTestCase, self).setUp()
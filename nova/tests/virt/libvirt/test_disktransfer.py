@@ -0,0 +1,132 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+import mock
+
+from nova.openstack.common import processutils
+from nova.openstack.common import units
+from nova import test
+from nova.virt.libvirt import disktransfer
+
+
+class DiskTransferTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(DiskTransferTestCase, self).setUp()
+        self.path = self.useFixture(fixtures.TempDir()).join('disk')
+        self.data = {0: os.urandom(units.Mi + 10),
+                     5 * units.Mi + 10: os.urandom(100)}
+        with open(self.path, 'wb') as f:
+            for offset, data in self.data.items():
+                f.seek(offset)
+                f.write(data)
+            f.truncate(12 * units.Mi)
+
+        self.written = {}
+        self.truncated = []
+        self.fail_writes = 0
+        patcher = mock.patch.object(disktransfer.utils, 'execute',
+                                    side_effect=self._fake_execute)
+        self.addCleanup(patcher.stop)
+        self.mock_execute = patcher.start()
+        self.mock_sleep = self._patch(disktransfer.greenthread, 'sleep')
+
+    def _patch(self, obj, name):
+        patcher = mock.patch.object(obj, name)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.assertEqual(('ssh', 'dest'), cmd[:2])
+        if cmd[2] == 'truncate':
+            self.assertEqual('/inst/disk', cmd[-1])
+            self.truncated.append(cmd[4])
+        else:
+            self.assertEqual(('dd', 'of=/inst/disk', 'bs=%d' % units.Mi),
+                             cmd[2:5])
+            self.assertEqual('conv=notrunc', cmd[6])
+            if self.fail_writes:
+                self.fail_writes -= 1
+                raise processutils.ProcessExecutionError()
+            offset = int(cmd[5][len('seek='):]) * units.Mi
+            self.written[offset] = kwargs['process_input']
+
+    def _transfer(self, **kwargs):
+        kwargs.setdefault('streams', 3)
+        kwargs.setdefault('chunk_size', 2 * units.Mi)
+        return disktransfer.DiskTransfer(self.path, 'dest', '/inst/disk',
+                                         **kwargs)
+
+    def _assert_copied(self):
+        self.assertEqual([0, 12 * units.Mi], self.truncated)
+        copy = bytearray(12 * units.Mi)
+        for offset, data in self.written.items():
+            copy[offset:offset + len(data)] = data
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), str(copy))
+
+    def test_allocated_extents(self):
+        extents = disktransfer.allocated_extents(self.path)
+        for offset, data in self.data.items():
+            self.assertTrue([start for start, end in extents
+                             if start <= offset and
+                             offset + len(data) <= end])
+
+    def test_allocated_extents_without_holes(self):
+        with mock.patch.object(disktransfer.os, 'lseek',
+                               side_effect=OSError(22, 'Invalid argument')):
+            self.assertEqual([(0, 12 * units.Mi)],
+                             disktransfer.allocated_extents(self.path))
+
+    @mock.patch.object(disktransfer, 'allocated_extents',
+                       return_value=[(0, 100),
+                                     (5 * units.Mi + 10, 9 * units.Mi + 10),
+                                     (11 * units.Mi + 10, 11 * units.Mi + 20)])
+    def test_run_sends_allocated_chunks(self, mock_extents):
+        stats = self._transfer().run()
+        self.assertEqual([0, 5 * units.Mi, 6 * units.Mi, 8 * units.Mi,
+                          11 * units.Mi], sorted(self.written))
+        self.assertEqual(
+            [units.Mi, units.Mi, 2 * units.Mi, 2 * units.Mi, units.Mi],
+            [len(self.written[offset]) for offset in sorted(self.written)])
+        self.assertEqual(12 * units.Mi, stats['size'])
+        self.assertEqual(7 * units.Mi, stats['sent_bytes'])
+        self.assertEqual(3, stats['streams'])
+        self.assertEqual([0, 12 * units.Mi], self.truncated)
+
+    def test_run(self):
+        progress = mock.Mock()
+        transfer = self._transfer(progress=progress)
+        transfer.run()
+        self._assert_copied()
+        self.assertEqual(mock.call(transfer.total_bytes, transfer.total_bytes),
+                         progress.call_args)
+
+    def test_retries_failed_chunk(self):
+        self.fail_writes = 2
+        self._transfer(retries=2).run()
+        self._assert_copied()
+
+    def test_fails_after_retries(self):
+        self.fail_writes = 3
+        self.assertRaises(processutils.ProcessExecutionError,
+                          self._transfer(retries=2).run)
+
+    @mock.patch.object(disktransfer, 'allocated_extents',
+                       return_value=[(0, 6 * units.Mi)])
+    @mock.patch('time.time', return_value=100)
+    def test_throttle(self, mock_time, mock_extents):
+        self._transfer(bytes_per_second=4 * units.Mi).run()
+        self.assertEqual([mock.call(0), mock.call(0.5), mock.call(1.0)],
+                         self.mock_sleep.call_args_list)
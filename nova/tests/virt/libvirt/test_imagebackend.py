@@ -18,6 +18,7 @@ import shutil
 import tempfile
 
 import fixtures
+import mock
 from oslo.config import cfg
 
 import inspect
@@ -880,6 +881,129 @@ class RbdTestCase(_ImageTestCase, test.NoDBTestCase):
         self.assertEqual(image.path, rbd_path)
 
 
+class FakeRbdError(Exception):
+    pass
+
+
+class RbdCloneTestCase(test.NoDBTestCase):
+    INSTANCE = {'name': 'instance', 'uuid': uuidutils.generate_uuid()}
+    NAME = 'disk'
+    TEMPLATE_PATH = '/instances/_base/template'
+    LOCATION = 'rbd://fake-fsid/images/fake-image/snap'
+    SIZE = 10 * units.Gi
+
+    def setUp(self):
+        super(RbdCloneTestCase, self).setUp()
+        self.flags(images_rbd_pool='FakePool', group='libvirt')
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.virt.libvirt.imagebackend.libvirt_utils',
+            fake_libvirt_utils))
+        self.rbd = mock.Mock(Error=FakeRbdError, RBD_FEATURE_LAYERING=1)
+        self.rados = mock.Mock(Error=FakeRbdError)
+        self.client = self.rados.Rados.return_value
+        self.client.get_fsid.return_value = 'fake-fsid'
+        self.volume = self.rbd.Image.return_value
+        self.volume.size.return_value = self.SIZE
+
+        self.image_service = mock.Mock()
+        self.image_service.show.return_value = {'disk_format': 'raw'}
+        self.image_service._get_locations.return_value = [
+            {'url': 'file:///var/lib/glance/images/fake-image',
+             'metadata': {}},
+            {'url': self.LOCATION, 'metadata': {}}]
+        self.stubs.Set(imagebackend.glance, 'get_default_image_service',
+                       lambda: self.image_service)
+
+        self.image = imagebackend.Rbd(self.INSTANCE, self.NAME, rbd=self.rbd,
+                                      rados=self.rados)
+        self.stubs.Set(self.image, 'check_image_exists', lambda: False)
+        self.prepare_template = mock.Mock()
+
+    def _create_image(self, size=None, **kwargs):
+        kwargs.setdefault('context', 'fake-context')
+        kwargs.setdefault('image_id', 'fake-image')
+        with mock.patch.object(imagebackend.disk, 'get_disk_size',
+                               return_value=self.SIZE):
+            self.image.create_image(self.prepare_template,
+                                    self.TEMPLATE_PATH, size, **kwargs)
+
+    def _assert_cloned(self):
+        self.assertFalse(self.prepare_template.called)
+        self.rbd.Image.assert_any_call(self.client.open_ioctx.return_value,
+                                       'fake-image', snapshot='snap',
+                                       read_only=True)
+        ioctx = self.client.open_ioctx.return_value
+        self.rbd.RBD.return_value.clone.assert_called_once_with(
+            ioctx, 'fake-image', 'snap', ioctx, self.image.rbd_name,
+            features=1)
+        self.assertEqual([mock.call('FakePool'), mock.call('images'),
+                          mock.call('images'), mock.call('FakePool')],
+                         self.client.open_ioctx.call_args_list[:4])
+
+    def _assert_imported(self):
+        self.prepare_template.assert_called_once_with(
+            target=self.TEMPLATE_PATH, max_size=None, context='fake-context',
+            image_id='fake-image')
+
+    def test_clone(self):
+        self._create_image()
+        self._assert_cloned()
+        self.assertFalse(self.volume.resize.called)
+        self.image_service._get_locations.assert_called_once_with(
+            'fake-context', 'fake-image')
+
+    def test_clone_and_resize(self):
+        self._create_image(size=2 * self.SIZE)
+        self._assert_cloned()
+        self.volume.resize.assert_called_once_with(2 * self.SIZE)
+
+    def test_clone_exists(self):
+        self.stubs.Set(self.image, 'check_image_exists', lambda: True)
+        self._create_image()
+        self.assertFalse(self.prepare_template.called)
+        self.assertFalse(self.rbd.RBD.return_value.clone.called)
+
+    def test_other_cluster(self):
+        self.client.get_fsid.return_value = 'other-fsid'
+        self._create_image()
+        self._assert_imported()
+        self.assertFalse(self.rbd.RBD.return_value.clone.called)
+
+    def test_not_raw(self):
+        self.image_service.show.return_value = {'disk_format': 'qcow2'}
+        self._create_image()
+        self._assert_imported()
+        self.assertFalse(self.image_service._get_locations.called)
+
+    def test_snapshot_not_readable(self):
+        self.rbd.Image.side_effect = FakeRbdError()
+        self._create_image()
+        self._assert_imported()
+
+    def test_clone_fails(self):
+        self.rbd.RBD.return_value.clone.side_effect = FakeRbdError()
+        self._create_image()
+        self._assert_imported()
+
+    def test_no_image(self):
+        with mock.patch.object(imagebackend.disk, 'get_disk_size',
+                               return_value=self.SIZE):
+            self.image.create_image(self.prepare_template,
+                                    self.TEMPLATE_PATH, None)
+        self.prepare_template.assert_called_once_with(
+            target=self.TEMPLATE_PATH, max_size=None)
+        self.assertFalse(self.image_service.show.called)
+
+    def test_parse_location(self):
+        self.assertEqual(['fsid', 'pool', 'image', 'snap'],
+                         self.image._parse_location(
+                             'rbd://fsid/pool/image/snap'))
+        self.assertIsNone(self.image._parse_location(
+            'rbd://fsid/pool/image'))
+        self.assertIsNone(self.image._parse_location(
+            'http://fsid/pool/image/snap'))
+
+
 class BackendTestCase(test.NoDBTestCase):
     INSTANCE = {'name': 'fake-instance',
                 'uuid': uuidutils.generate_uuid()}
@@ -887,6 +1011,7 @@ class BackendTestCase(test.NoDBTestCase):
 
     def setUp(self):
         super(BackendTestCase, self).setUp()
+        self.flags(instances_path=self.useFixture(fixtures.TempDir()).path)
 
         def fake_chown(path, owner_uid=None):
             return None
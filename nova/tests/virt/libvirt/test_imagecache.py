@@ -374,6 +374,20 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             self.assertFalse(os.path.exists(fname))
             self.assertFalse(os.path.exists(info_fname))
 
+    def test_remove_base_file_precached(self):
+        with self._make_base_file() as fname:
+            image_cache_manager = imagecache.ImageCacheManager()
+            imagecache.pin_base_file(fname)
+            os.utime(fname, (-1, time.time() - 3601))
+
+            # Pre-cached files are kept while they are pinned
+            image_cache_manager._remove_base_file(fname)
+            self.assertTrue(os.path.exists(fname))
+
+            self.flags(precached_image_pin_seconds=0, group='libvirt')
+            image_cache_manager._remove_base_file(fname)
+            self.assertFalse(os.path.exists(fname))
+
     def test_remove_base_file_dne(self):
         # This test is solely to execute the "does not exist" code path. We
         # don't expect the method being tested to do anything in this case.
@@ -641,6 +655,9 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         self.stubs.Set(image_cache_manager, '_verify_checksum',
                        lambda x, y: True)
 
+        # None of these images were pre-cached
+        self.stubs.Set(imagecache, '_is_pinned', lambda x: False)
+
         # Fake getmtime as well
         orig_getmtime = os.path.getmtime
 
@@ -880,3 +897,98 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+    def _incremental_body(self, tmpdir, info_attr):
+        self.stubs.Set(imagecache, '_CHECKSUM_CHUNK_SIZE', 10)
+        image_cache_manager, fname = self._check_body(tmpdir, info_attr)
+        image_cache_manager.checksum_pass_limit = 40
+        return image_cache_manager, fname
+
+    def test_verify_checksum_incremental(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = (
+                self._incremental_body(tmpdir, "csum valid"))
+            size = os.path.getsize(fname)
+
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertIsNone(res)
+            self.assertEqual(40, image_cache_manager._checksums_in_progress[
+                fname][1])
+
+            res = None
+            passes = 1
+            while res is None:
+                image_cache_manager._reset_state()
+                image_cache_manager.checksum_pass_limit = 40
+                res = image_cache_manager._verify_checksum(self.img, fname)
+                passes += 1
+            self.assertTrue(res)
+            self.assertEqual((size + 39) // 40, passes)
+            self.assertEqual({}, image_cache_manager._checksums_in_progress)
+
+    def test_verify_checksum_incremental_invalid(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = (
+                self._incremental_body(tmpdir, "csum invalid, valid json"))
+            image_cache_manager.checksum_pass_limit = 0
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertFalse(res)
+
+    def test_verify_checksum_incremental_restarts_on_change(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = (
+                self._incremental_body(tmpdir, "csum valid"))
+            self.assertIsNone(
+                image_cache_manager._verify_checksum(self.img, fname))
+
+            with open(fname, 'a') as f:
+                f.write('changed')
+            image_cache_manager._reset_state()
+            image_cache_manager.checksum_pass_limit = 0
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertFalse(res)
+
+    def test_verify_checksum_file_missing_incremental(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = (
+                self._incremental_body(tmpdir, "csum valid"))
+            os.unlink(imagecache.get_info_filename(fname))
+
+            self.assertIsNone(
+                image_cache_manager._verify_checksum(self.img, fname))
+            self.assertIsNone(imagecache.read_stored_checksum(fname)[0])
+
+            image_cache_manager._reset_state()
+            image_cache_manager.checksum_pass_limit = 0
+            self.assertIsNone(
+                image_cache_manager._verify_checksum(self.img, fname))
+            self.assertEqual(imagecache._hash_file(fname),
+                             imagecache.read_stored_checksum(fname)[0])
+
+    def test_verify_checksum_unchanged_not_read(self):
+        self.flags(checksum_interval_seconds=0, group='libvirt')
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = self._check_body(tmpdir,
+                                                          "csum valid")
+            size = os.path.getsize(fname)
+            self.assertTrue(
+                image_cache_manager._verify_checksum(self.img, fname))
+            self.assertEqual(size, image_cache_manager.checksum_bytes)
+
+            image_cache_manager._touch_base_file(fname)
+            self.assertTrue(
+                image_cache_manager._verify_checksum(self.img, fname))
+            self.assertEqual(size, image_cache_manager.checksum_bytes)
+
+    def test_verify_checksum_rate_limited(self):
+        self.flags(checksum_max_mb_per_second=1, group='libvirt')
+        self.stubs.Set(imagecache, '_CHECKSUM_CHUNK_SIZE', 10)
+        sleeps = []
+        self.stubs.Set(imagecache.time, 'sleep', sleeps.append)
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = self._check_body(tmpdir,
+                                                          "csum valid")
+            self.assertTrue(
+                image_cache_manager._verify_checksum(self.img, fname))
+        self.assertTrue(sleeps)
+        self.assertTrue(all(delay >= 0 for delay in sleeps))
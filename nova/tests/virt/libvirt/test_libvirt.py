@@ -74,6 +74,7 @@ from nova.virt.libvirt import config as vconfig
 from nova.virt.libvirt import driver as libvirt_driver
 from nova.virt.libvirt import firewall
 from nova.virt.libvirt import imagebackend
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
 from nova.virt import netutils
 
@@ -4044,6 +4045,31 @@ class LibvirtConnTestCase(test.TestCase):
                     os.path.join(base_dir, 'fake_image_backing_file'),
                     m_kwargs['target'])
 
+    def test_cache_image(self):
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            base = os.path.join(tmpdir, CONF.image_cache_subdirectory_name,
+                                imagecache.get_cache_fname(
+                                    {'image_id': 'fake-image'}, 'image_id'))
+
+            def fake_fetch_image(context, target, image_id, user_id,
+                                 project_id):
+                open(target, 'w').close()
+
+            with mock.patch.object(libvirt_driver.libvirt_utils,
+                                   'fetch_image',
+                                   side_effect=fake_fetch_image) as fetch:
+                self.assertTrue(conn.cache_image(self.context, 'fake-image'))
+                self.assertFalse(conn.cache_image(self.context,
+                                                  'fake-image'))
+            fetch.assert_called_once_with(self.context, base, 'fake-image',
+                                          self.context.user_id,
+                                          self.context.project_id)
+            self.assertTrue(os.path.exists(base))
+            self.assertTrue(imagecache.read_stored_info(base,
+                                                        field='precached'))
+
     def test_create_images_and_backing_disk_info_none(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
         self.mox.StubOutWithMock(conn, '_fetch_instance_kernel_ramdisk')
@@ -8096,6 +8122,55 @@ class LibvirtDriverTestCase(test.TestCase):
                None, ins_ref, '10.0.0.1', flavor, None)
         self.assertEqual(out, disk_info_text)
 
+    @mock.patch('nova.virt.libvirt.disktransfer.DiskTransfer')
+    @mock.patch.object(libvirt_utils, 'copy_image')
+    def test_migrate_disk_and_power_off_parallel(self, mock_copy,
+                                                 mock_transfer):
+        self.flags(migration_transfer_streams=4,
+                   migration_transfer_max_mb_per_second=10, group='libvirt')
+        disk_info = [{'type': 'raw', 'path': '/test/disk',
+                      'backing_file': '', 'disk_size': '83886080'},
+                     {'type': 'raw', 'path': '/test/disk.local',
+                      'backing_file': '', 'disk_size': '83886080'}]
+        self.stubs.Set(self.libvirtconnection, 'get_instance_disk_info',
+                       lambda *args, **kwargs: jsonutils.dumps(disk_info))
+        self.stubs.Set(self.libvirtconnection, 'power_off',
+                       lambda instance: None)
+        self.stubs.Set(self.libvirtconnection, '_is_storage_shared_with',
+                       lambda dest, inst_base: False)
+        self.stubs.Set(utils, 'execute', lambda *args, **kwargs: None)
+        updates = []
+        self.stubs.Set(self.libvirtconnection.virtapi, 'instance_update',
+                       lambda ctxt, uuid, values: updates.append(
+                           values['progress']))
+
+        def fake_run():
+            progress = mock_transfer.call_args[1]['progress']
+            progress(1, 2)
+            progress(2, 2)
+        mock_transfer.return_value.run.side_effect = fake_run
+
+        ins_ref = self._create_instance()
+        flavor = {'root_gb': 10, 'ephemeral_gb': 20}
+        self.libvirtconnection.migrate_disk_and_power_off(
+            'ctx', ins_ref, '10.0.0.2', flavor, None)
+
+        self.assertFalse(mock_copy.called)
+        inst_base = libvirt_utils.get_instance_path(ins_ref)
+        self.assertEqual(
+            [mock.call(os.path.join(inst_base + '_resize', 'disk'),
+                       '10.0.0.2', '/test/disk', streams=4,
+                       chunk_size=64 * units.Mi,
+                       bytes_per_second=10 * units.Mi, retries=3,
+                       progress=mock.ANY),
+             mock.call(os.path.join(inst_base + '_resize', 'disk.local'),
+                       '10.0.0.2', '/test/disk.local', streams=4,
+                       chunk_size=64 * units.Mi,
+                       bytes_per_second=10 * units.Mi, retries=3,
+                       progress=mock.ANY)],
+            mock_transfer.call_args_list)
+        self.assertEqual([25, 50, 75, 100], updates)
+
     def test_migrate_disk_and_power_off_resize_error(self):
         instance = self._create_instance()
         flavor = {'root_gb': 5}
@@ -8434,6 +8509,18 @@ class LibvirtDriverTestCase(test.TestCase):
         self.assertEqual(['/dev/vols/fake-uuid_foo',
                           '/dev/vols/instance-00000001_bar'], disks)
 
+    @mock.patch.object(libvirt_driver.LibvirtDriver, '_lvm_disks',
+                       return_value=['/dev/vols/fake-uuid_foo'])
+    @mock.patch('nova.virt.libvirt.utils.remove_logical_volumes')
+    def test_cleanup_lvm_async(self, remove, lvm_disks):
+        self.flags(images_volume_group='vols', volume_clear_async=True,
+                   group='libvirt')
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        with mock.patch.object(conn._wipe_queue, 'enqueue') as enqueue:
+            conn._cleanup_lvm({'uuid': 'fake-uuid'})
+        enqueue.assert_called_once_with('/dev/vols/fake-uuid_foo')
+        self.assertFalse(remove.called)
+
     def test_is_booted_from_volume(self):
         func = libvirt_driver.LibvirtDriver._is_booted_from_volume
         instance, disk_mapping = {}, {}
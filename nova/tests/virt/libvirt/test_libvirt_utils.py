@@ -19,6 +19,7 @@ import os
 import mock
 from oslo.config import cfg
 
+from nova import exception
 from nova.openstack.common import processutils
 from nova import test
 from nova import utils
@@ -170,6 +171,47 @@ blah BLAH: bb
         libvirt_utils.clear_logical_volume('/dev/vd')
         self.assertEqual(expected_commands, executes)
 
+    @mock.patch.object(utils, 'execute')
+    @mock.patch.object(libvirt_utils, 'logical_volume_size',
+                       return_value=2621440)
+    def test_lvm_clear_in_chunks(self, mock_size, mock_execute):
+        chunks = []
+        libvirt_utils.clear_logical_volume('/dev/v1', ionice='-c3',
+                                           chunk_size=1048576,
+                                           after_chunk=chunks.append)
+        self.assertEqual([1048576, 1048576, 524288], chunks)
+        self.assertEqual(
+            [mock.call('ionice', '-c3', 'dd', 'bs=1048576', 'if=/dev/zero',
+                       'of=/dev/v1', 'seek=0', 'count=1', 'oflag=direct',
+                       run_as_root=True),
+             mock.call('ionice', '-c3', 'dd', 'bs=1048576', 'if=/dev/zero',
+                       'of=/dev/v1', 'seek=1', 'count=1', 'oflag=direct',
+                       run_as_root=True),
+             mock.call('ionice', '-c3', 'dd', 'bs=1024', 'if=/dev/zero',
+                       'of=/dev/v1', 'seek=2048', 'count=512',
+                       'conv=fdatasync', run_as_root=True)],
+            mock_execute.call_args_list)
+
+    @mock.patch.object(utils, 'execute')
+    @mock.patch.object(libvirt_utils, 'logical_volume_size',
+                       return_value=1048576)
+    def test_lvm_clear_shred_ionice(self, mock_size, mock_execute):
+        self.flags(volume_clear='shred', group='libvirt')
+        libvirt_utils.clear_logical_volume('/dev/v1', ionice='-c2 -n7')
+        mock_execute.assert_called_once_with('ionice', '-c2', '-n7', 'shred',
+                                             '-n3', '-s1048576', '/dev/v1',
+                                             run_as_root=True)
+
+    @mock.patch.object(utils, 'execute')
+    @mock.patch.object(libvirt_utils, 'logical_volume_size',
+                       return_value=1048576)
+    def test_lvm_clear_rejects_other_ionice_arguments(self, mock_size,
+                                                      mock_execute):
+        self.assertRaises(exception.Invalid,
+                          libvirt_utils.clear_logical_volume, '/dev/v1',
+                          ionice='-c3 /bin/sh -c')
+        self.assertFalse(mock_execute.called)
+
     def test_list_rbd_volumes(self):
         conf = '/etc/ceph/fake_ceph.conf'
         pool = 'fake_pool'
@@ -0,0 +1,118 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fixtures
+import mock
+
+from nova import test
+from nova.virt.libvirt import lvmwipe
+from nova.virt.libvirt import utils as libvirt_utils
+
+
+class WipeQueueTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(WipeQueueTestCase, self).setUp()
+        self.queue = lvmwipe.WipeQueue('vg')
+        self.spawned = []
+        self.stubs.Set(lvmwipe.utils, 'spawn_n',
+                       lambda func: self.spawned.append(func))
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.virt.libvirt.utils.logical_volume_size',
+            lambda path: 3 * lvmwipe.units.Mi))
+        self.mock_rename = self._patch('rename_logical_volume')
+        self.mock_clear = self._patch('clear_logical_volume')
+        self.mock_execute = self._patch('execute')
+
+    def _patch(self, name):
+        patcher = mock.patch.object(libvirt_utils, name)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _run_worker(self):
+        self.assertEqual(1, len(self.spawned))
+        self.spawned.pop()()
+
+    def test_enqueue(self):
+        self.queue.enqueue('/dev/vg/uuid_disk', '/dev/vg/uuid_disk.local')
+        self.mock_rename.assert_has_calls([
+            mock.call('vg', 'uuid_disk', 'nova-wipe_uuid_disk'),
+            mock.call('vg', 'uuid_disk.local', 'nova-wipe_uuid_disk.local')])
+        self.assertFalse(self.mock_clear.called)
+        stats = self.queue.get_stats()
+        self.assertEqual(2, stats['pending_volumes'])
+        self.assertEqual(6 * lvmwipe.units.Mi, stats['pending_bytes'])
+
+        self._run_worker()
+        self.assertEqual(
+            ['/dev/vg/nova-wipe_uuid_disk',
+             '/dev/vg/nova-wipe_uuid_disk.local'],
+            [args[0] for args, kwargs in self.mock_clear.call_args_list])
+        self.mock_execute.assert_has_calls([
+            mock.call('lvremove', '-f', '/dev/vg/nova-wipe_uuid_disk',
+                      attempts=3, run_as_root=True),
+            mock.call('lvremove', '-f', '/dev/vg/nova-wipe_uuid_disk.local',
+                      attempts=3, run_as_root=True)])
+        stats = self.queue.get_stats()
+        self.assertEqual(0, stats['pending_bytes'])
+        self.assertEqual(2, stats['wiped_volumes'])
+        self.assertEqual(6 * lvmwipe.units.Mi, stats['wiped_bytes'])
+
+    def test_enqueue_starts_one_worker(self):
+        self.queue.enqueue('/dev/vg/uuid_disk')
+        self.queue.enqueue('/dev/vg/uuid_disk.local')
+        self._run_worker()
+        self.assertEqual(2, self.mock_clear.call_count)
+
+    @mock.patch.object(libvirt_utils, 'remove_logical_volumes')
+    def test_enqueue_rename_fails(self, mock_remove):
+        self.mock_rename.side_effect = test.TestingException()
+        self.queue.enqueue('/dev/vg/uuid_disk')
+        mock_remove.assert_called_once_with('/dev/vg/uuid_disk')
+        self.assertEqual([], self.spawned)
+
+    @mock.patch.object(libvirt_utils, 'list_logical_volumes',
+                       return_value=['other_disk', 'nova-wipe_uuid_disk'])
+    def test_resume(self, mock_list):
+        self.queue.resume()
+        mock_list.assert_called_once_with('vg')
+        self.assertEqual(1, self.queue.get_stats()['pending_volumes'])
+        self._run_worker()
+        self.mock_clear.assert_called_once_with(
+            '/dev/vg/nova-wipe_uuid_disk', ionice=None,
+            chunk_size=64 * lvmwipe.units.Mi, after_chunk=mock.ANY)
+
+    def test_wipe_failure_keeps_space_used(self):
+        self.mock_clear.side_effect = test.TestingException()
+        self.queue.enqueue('/dev/vg/uuid_disk')
+        self._run_worker()
+        self.assertFalse(self.mock_execute.called)
+        stats = self.queue.get_stats()
+        self.assertEqual(0, stats['pending_volumes'])
+        self.assertEqual(1, stats['failed_volumes'])
+        self.assertEqual(3 * lvmwipe.units.Mi, stats['pending_bytes'])
+
+    @mock.patch('time.time', return_value=100)
+    @mock.patch.object(lvmwipe.greenthread, 'sleep')
+    def test_throttle(self, mock_sleep, mock_time):
+        self.flags(volume_clear_max_mb_per_second=2, group='libvirt')
+        self.flags(volume_clear_ionice='-c3', group='libvirt')
+
+        def fake_clear(path, ionice=None, chunk_size=0, after_chunk=None):
+            self.assertEqual('-c3', ionice)
+            for _i in range(3):
+                after_chunk(lvmwipe.units.Mi)
+
+        self.mock_clear.side_effect = fake_clear
+        self.queue.enqueue('/dev/vg/uuid_disk')
+        self._run_worker()
+        self.assertEqual([mock.call(0.5), mock.call(1.0), mock.call(1.5)],
+                         mock_sleep.call_args_list)
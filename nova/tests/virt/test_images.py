@@ -12,8 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import struct
 
+import fixtures
+import mock
+
+from nova import exception
+from nova.openstack.common import imageutils
+from nova.openstack.common import units
 from nova import test
+from nova import utils
 from nova.virt import images
 
 
@@ -22,3 +31,176 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info("/path/that/does/not/exist")
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+def _write_qcow2(path, virtual_size, backing_file=None, cluster_bits=16,
+                 version=2, nb_snapshots=0, incompatible=0):
+    backing_offset = 0
+    backing_size = 0
+    if backing_file is not None:
+        backing_offset = 512
+        backing_size = len(backing_file)
+    header = images._QCOW2_HEADER.pack(
+        images._QCOW2_MAGIC, version, backing_offset, backing_size,
+        cluster_bits, virtual_size, 0, 0, 0, 0, 0, nb_snapshots)
+    # NOTE: Snapshot table offset, then the version 3 feature bits.
+    header += struct.pack('>QQQQ', 0, incompatible, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(header.ljust(512, '\0'))
+        if backing_file is not None:
+            f.write(backing_file)
+
+
+class QemuImgInfoTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(QemuImgInfoTestCase, self).setUp()
+        self.useFixture(fixtures.MonkeyPatch('nova.virt.images._info_cache',
+                                             {}))
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+
+    @mock.patch.object(utils, 'execute')
+    def test_qcow2(self, mock_execute):
+        path = os.path.join(self.tmpdir, 'disk')
+        _write_qcow2(path, 10 * units.Gi, backing_file='../_base/abc')
+        info = images.qemu_img_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(10 * units.Gi, info.virtual_size)
+        self.assertEqual(65536, info.cluster_size)
+        self.assertEqual(os.path.join(self.tmpdir, '../_base/abc'),
+                         info.backing_file)
+        self.assertFalse(mock_execute.called)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qcow2_v3_absolute_backing_file(self, mock_execute):
+        path = os.path.join(self.tmpdir, 'disk')
+        _write_qcow2(path, units.Gi, backing_file='/base/abc', version=3,
+                     cluster_bits=12, incompatible=1)
+        info = images.qemu_img_info(path)
+        self.assertEqual('/base/abc', info.backing_file)
+        self.assertEqual(4096, info.cluster_size)
+        self.assertFalse(mock_execute.called)
+
+    @mock.patch.object(utils, 'execute')
+    def test_raw(self, mock_execute):
+        path = os.path.join(self.tmpdir, 'disk')
+        with open(path, 'wb') as f:
+            f.write('\0' * 4096)
+        info = images.qemu_img_info(path)
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(4096, info.virtual_size)
+        self.assertIsNone(info.backing_file)
+        self.assertFalse(mock_execute.called)
+
+    def _test_falls_back(self, write):
+        path = os.path.join(self.tmpdir, 'disk')
+        write(path)
+        with mock.patch.object(utils, 'execute',
+                               return_value=('file format: vmdk\n', '')
+                               ) as mock_execute:
+            info = images.qemu_img_info(path)
+        self.assertEqual('vmdk', info.file_format)
+        mock_execute.assert_called_once_with('env', 'LC_ALL=C', 'LANG=C',
+                                             'qemu-img', 'info', path)
+
+    def test_other_format_falls_back(self):
+        def write(path):
+            with open(path, 'wb') as f:
+                f.write('KDMV' + '\0' * 508)
+        self._test_falls_back(write)
+
+    def test_qcow2_snapshots_fall_back(self):
+        self._test_falls_back(lambda path: _write_qcow2(path, units.Gi,
+                                                        nb_snapshots=1))
+
+    def test_qcow2_unknown_feature_falls_back(self):
+        self._test_falls_back(lambda path: _write_qcow2(path, units.Gi,
+                                                        version=3,
+                                                        incompatible=4))
+
+    @mock.patch.object(images, '_read_image_info')
+    def test_cached_until_file_changes(self, mock_read):
+        mock_read.side_effect = lambda path, st: imageutils.QemuImgInfo(
+            'file format: raw\nvirtual size: %d' % st.st_size)
+        path = os.path.join(self.tmpdir, 'disk')
+        with open(path, 'wb') as f:
+            f.write('\0' * 512)
+        self.assertEqual(512, images.qemu_img_info(path).virtual_size)
+        images.qemu_img_info(path).virtual_size = 0
+        self.assertEqual(512, images.qemu_img_info(path).virtual_size)
+        self.assertEqual(1, mock_read.call_count)
+
+        with open(path, 'ab') as f:
+            f.write('\0' * 512)
+        self.assertEqual(1024, images.qemu_img_info(path).virtual_size)
+        self.assertEqual(2, mock_read.call_count)
+
+
+class _ChunkedImageService(object):
+    """Serves an image 512 bytes at a time, like a glance download."""
+
+    def __init__(self, image):
+        self.image = image
+        self.chunks_sent = 0
+
+    def download(self, context, image_id, data=None, dst_path=None):
+        with open(dst_path, 'wb') as f:
+            for offset in range(0, len(self.image), 512):
+                chunk = self.image[offset:offset + 512]
+                self.chunks_sent += 1
+                data.write(chunk)
+                f.write(chunk)
+
+
+class FetchTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(FetchTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(self.tmpdir, 'image.part')
+
+    def _fetch(self, image, max_size=0):
+        self.service = _ChunkedImageService(image)
+        with mock.patch.object(images.glance, 'get_remote_image_service',
+                               return_value=(self.service, 'fake-id')):
+            images.fetch(None, 'fake-href', self.path, None, None,
+                         max_size=max_size)
+
+    def _qcow2(self, virtual_size, backing_file=None):
+        source = os.path.join(self.tmpdir, 'source')
+        _write_qcow2(source, virtual_size, backing_file=backing_file)
+        with open(source, 'rb') as f:
+            return f.read() + '\0' * 4096
+
+    def test_fetch_accepted(self):
+        image = self._qcow2(units.Gi)
+        self._fetch(image, max_size=units.Gi)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(image, f.read())
+
+    def test_qcow2_backing_file_rejected_early(self):
+        self.assertRaises(exception.ImageUnacceptable, self._fetch,
+                          self._qcow2(units.Gi, backing_file='/base/abc'))
+        self.assertEqual(1, self.service.chunks_sent)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_qcow2_too_large_rejected_early(self):
+        self.assertRaises(exception.FlavorDiskTooSmall, self._fetch,
+                          self._qcow2(2 * units.Gi), max_size=units.Gi)
+        self.assertEqual(1, self.service.chunks_sent)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_vmdk_too_large_rejected_early(self):
+        header = images._VMDK_SPARSE_HEADER.pack('KDMV', 1, 0,
+                                                 4 * units.Mi)
+        self.assertRaises(exception.FlavorDiskTooSmall, self._fetch,
+                          header.ljust(4096, '\0'), max_size=units.Gi)
+        self.assertEqual(1, self.service.chunks_sent)
+
+    def test_raw_too_large_stopped(self):
+        self.assertRaises(exception.FlavorDiskTooSmall, self._fetch,
+                          '\0' * 8192, max_size=2048)
+        self.assertEqual(5, self.service.chunks_sent)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_other_format_left_to_fetch_to_raw(self):
+        self._fetch('conectix'.ljust(8192, '\0'), max_size=2048)
+        self.assertEqual(16, self.service.chunks_sent)
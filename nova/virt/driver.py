@@ -1105,6 +1105,19 @@ class ComputeDriver(object):
         """
         pass
 
+    def cache_image(self, context, image_id):
+        """Download an image into the driver's local image cache.
+
+        This lets an image be fetched ahead of the instances that will use
+        it.  The image is kept in the cache for a while even if no instance
+        uses it.
+
+        :param image_id: id of the image to cache
+        :returns: True if the image was downloaded, False if it was already
+                  cached
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate."""
         #NOTE(jogo) Currently only used for XenAPI-Pool
@@ -19,7 +19,9 @@
 Handling of VM disk images.
 """
 
+import copy
 import os
+import struct
 
 from oslo.config import cfg
 
@@ -43,16 +45,140 @@ CONF = cfg.CONF
 CONF.register_opts(image_opts)
 
 
+# qcow2 header fields up to the number of snapshots, all big endian: magic,
+# version, backing file offset, backing file size, cluster bits, virtual
+# size, crypt method, L1 size, L1 table offset, refcount table offset,
+# refcount table clusters, number of snapshots.
+_QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQII')
+_QCOW2_MAGIC = 'QFI\xfb'
+_QCOW2_V3_FEATURES = struct.Struct('>Q')
+# NOTE: The dirty and corrupt bits do not change how the header is read,
+# any other incompatible feature is left to qemu-img.
+_QCOW2_KNOWN_INCOMPATIBLE = 0x3
+
+# Signatures of the formats, other than qcow2, that qemu-img probes for,
+# as (offset, signature).  A file carrying none of them is raw to qemu-img.
+_OTHER_FORMAT_SIGNATURES = [
+    (0, 'QFI\xfb'),                        # qcow, and qcow2 we cannot read
+    (0, 'QED\x00'),                        # qed
+    (0, 'KDMV'),                           # vmdk
+    (0, 'COWD'),                           # vmdk
+    (0, '# Disk DescriptorFile'),          # vmdk
+    (0, '# Disk Descriptor File'),         # vmdk
+    (0, 'conectix'),                       # vpc
+    (0, 'vhdxfile'),                       # vhdx
+    (0x40, '\x7f\x10\xda\xbe'),            # vdi
+    (0, '#!/bin/sh\n#V2.0 Format'),        # cloop
+    (0, 'Bochs Virtual HD Image'),         # bochs
+    (0, 'WithoutFreeSpace'),               # parallels
+    (0, 'WithouFreSpacExt'),               # parallels
+    (0, 'LUKS\xba\xbe'),                    # luks
+]
+_PROBE_SIZE = 512
+# The start of a monolithic sparse vmdk, little endian: magic, version,
+# flags and capacity in sectors.
+_VMDK_SPARSE_HEADER = struct.Struct('<4sIIQ')
+
+# Results of qemu_img_info() keyed by path, inode, mtime and size.
+_info_cache = {}
+_INFO_CACHE_MAX_ENTRIES = 4096
+
+
+def _read_qcow2_info(path, header, f):
+    """Return QemuImgInfo for a qcow2 header, or None if it uses features
+    that are left to qemu-img.
+    """
+    if len(header) < _QCOW2_HEADER.size:
+        return None
+    (_magic, version, backing_offset, backing_size, cluster_bits,
+     virtual_size, _crypt, _l1_size, _l1_offset, _refcount_offset,
+     _refcount_clusters, nb_snapshots) = _QCOW2_HEADER.unpack_from(header)
+    if version not in (2, 3) or not 9 <= cluster_bits <= 21:
+        return None
+    if nb_snapshots:
+        # NOTE: qemu-img lists the snapshots, which are not parsed here.
+        return None
+    if version == 3:
+        if len(header) < 80:
+            return None
+        incompatible = _QCOW2_V3_FEATURES.unpack_from(header, 72)[0]
+        if incompatible & ~_QCOW2_KNOWN_INCOMPATIBLE:
+            return None
+
+    info = imageutils.QemuImgInfo()
+    info.file_format = 'qcow2'
+    info.virtual_size = virtual_size
+    info.cluster_size = 1 << cluster_bits
+    if backing_offset:
+        if backing_size > 1023:
+            return None
+        f.seek(backing_offset)
+        backing_file = f.read(backing_size)
+        if len(backing_file) != backing_size:
+            return None
+        # NOTE: Like qemu-img, report the backing file relative to the
+        # directory of the image.
+        info.backing_file = os.path.join(os.path.dirname(path),
+                                         backing_file)
+    return info
+
+
+def _read_image_info(path, st):
+    """Return QemuImgInfo for a qcow2 or raw image read directly from its
+    header, or None if the image has to be left to qemu-img.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_PROBE_SIZE)
+        if header.startswith(_QCOW2_MAGIC):
+            info = _read_qcow2_info(path, header, f)
+        else:
+            for offset, signature in _OTHER_FORMAT_SIGNATURES:
+                if header[offset:offset + len(signature)] == signature:
+                    return None
+            info = imageutils.QemuImgInfo()
+            info.file_format = 'raw'
+            info.virtual_size = st.st_size
+    if info is not None:
+        info.image = os.path.basename(path)
+        info.disk_size = st.st_blocks * 512
+    return info
+
+
+def _qemu_img_info_cmd(path):
+    out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
+                             'qemu-img', 'info', path)
+    return imageutils.QemuImgInfo(out)
+
+
 def qemu_img_info(path):
-    """Return an object containing the parsed output from qemu-img info."""
+    """Return an object containing the parsed output from qemu-img info.
+
+    qcow2 and raw images are read directly, other formats are passed to
+    qemu-img.  Results are cached until the file changes.
+    """
     # TODO(mikal): this code should not be referring to a libvirt specific
     # flag.
     if not os.path.exists(path) and CONF.libvirt.images_type != 'rbd':
         return imageutils.QemuImgInfo()
 
-    out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
-                             'qemu-img', 'info', path)
-    return imageutils.QemuImgInfo(out)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return _qemu_img_info_cmd(path)
+
+    key = (path, st.st_ino, st.st_mtime, st.st_size)
+    info = _info_cache.get(key)
+    if info is None:
+        try:
+            info = _read_image_info(path, st)
+        except IOError:
+            info = None
+        if info is None:
+            info = _qemu_img_info_cmd(path)
+        if len(_info_cache) >= _INFO_CACHE_MAX_ENTRIES:
+            _info_cache.clear()
+        _info_cache[key] = info
+    return copy.deepcopy(info)
 
 
 def convert_image(source, dest, out_format, run_as_root=False):
@@ -61,6 +187,68 @@ def convert_image(source, dest, out_format, run_as_root=False):
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
+class _DownloadInspector(object):
+    """Check an image from its first bytes while it is downloaded.
+
+    Given the image data in order through write(), it raises as soon as it
+    can tell that fetch_to_raw() would refuse the image: a qcow2 image
+    with a backing file, or a qcow2, vmdk or raw image larger than
+    max_size.  Anything it cannot tell is left to the checks made once
+    the download is complete.
+    """
+
+    def __init__(self, image_href, max_size=0):
+        self.image_href = image_href
+        self.max_size = max_size
+        self.bytes_seen = 0
+        self._header = ''
+        self._is_raw = False
+
+    def write(self, chunk):
+        self.bytes_seen += len(chunk)
+        if self._header is not None:
+            self._header += chunk[:_PROBE_SIZE - len(self._header)]
+            if len(self._header) == _PROBE_SIZE:
+                header, self._header = self._header, None
+                self._check_header(header)
+        if self._is_raw:
+            self._check_size(self.bytes_seen)
+
+    def _check_size(self, disk_size):
+        if self.max_size and self.max_size < disk_size:
+            LOG.error(_('%(image)s virtual size %(disk_size)s is larger '
+                        'than flavor root disk size %(size)s, stopping its '
+                        'download'),
+                      {'image': self.image_href, 'disk_size': disk_size,
+                       'size': self.max_size})
+            raise exception.FlavorDiskTooSmall()
+
+    def _check_header(self, header):
+        if header.startswith(_QCOW2_MAGIC):
+            (_magic, version, backing_offset, backing_size, _cluster_bits,
+             virtual_size) = _QCOW2_HEADER.unpack_from(header)[:6]
+            if version not in (2, 3):
+                return
+            if backing_offset:
+                backing_file = header[backing_offset:
+                                      backing_offset + backing_size]
+                if len(backing_file) != backing_size:
+                    backing_file = _('(not in the image header)')
+                raise exception.ImageUnacceptable(
+                    image_id=self.image_href,
+                    reason=(_("fmt=%(fmt)s backed by: %(backing_file)s") %
+                            {'fmt': 'qcow2', 'backing_file': backing_file}))
+            self._check_size(virtual_size)
+        elif header.startswith('KDMV'):
+            capacity = _VMDK_SPARSE_HEADER.unpack_from(header)[3]
+            self._check_size(capacity * 512)
+        else:
+            for offset, signature in _OTHER_FORMAT_SIGNATURES:
+                if header[offset:offset + len(signature)] == signature:
+                    return
+            self._is_raw = True
+
+
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
@@ -68,8 +256,10 @@ def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     #             checked before we got here.
     (image_service, image_id) = glance.get_remote_image_service(context,
                                                                 image_href)
+    inspector = _DownloadInspector(image_href, max_size)
     with fileutils.remove_path_on_error(path):
-        image_service.download(context, image_id, dst_path=path)
+        image_service.download(context, image_id, dst_path=path,
+                               data=inspector)
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
@@ -0,0 +1,220 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Copy a disk image to another host as parallel chunks over ssh.
+
+The allocated extents of the source file are found with SEEK_DATA and
+SEEK_HOLE and split into chunks, which a few greenthreads each write into
+place in a sparse destination file with "ssh <host> dd".  Holes are never
+read or sent.  A chunk which fails is sent again on its own, so a short
+network failure late in a large copy does not restart it, and the rate of
+the whole copy can be capped.
+"""
+
+import collections
+import errno
+import os
+import sys
+import time
+
+import eventlet
+from eventlet import greenthread
+from oslo.config import cfg
+import six
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import units
+from nova import utils
+
+disktransfer_opts = [
+    cfg.IntOpt('migration_transfer_streams',
+               default=1,
+               help='Number of parallel streams to copy each disk to the '
+                    'destination host with when migrating or resizing an '
+                    'instance. 1 => copy the whole file with rsync or scp'),
+    cfg.IntOpt('migration_transfer_chunk_mb',
+               default=64,
+               help='Size in megabytes of the chunks disks are copied in '
+                    'when using more than one migration transfer stream. '
+                    'A failed chunk is sent again on its own'),
+    cfg.IntOpt('migration_transfer_max_mb_per_second',
+               default=0,
+               help='Limit on the rate at which each disk is copied when '
+                    'using more than one migration transfer stream, in '
+                    'megabytes per second. 0 => unlimited'),
+    cfg.IntOpt('migration_transfer_retries',
+               default=3,
+               help='Number of times to send a chunk of a disk again before '
+                    'failing the migration'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(disktransfer_opts, 'libvirt')
+
+LOG = logging.getLogger(__name__)
+
+# Values of "whence" for os.lseek(), which python 2 does not define.
+_SEEK_DATA = 3
+_SEEK_HOLE = 4
+
+# Chunks are aligned to, and sent in blocks of, this many bytes.
+_BLOCK_SIZE = units.Mi
+
+
+def allocated_extents(path):
+    """Return the (start, end) byte ranges of path which hold data.
+
+    The whole file is returned as one extent if the file system cannot
+    report holes.
+    """
+    size = os.path.getsize(path)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        extents = []
+        offset = 0
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, _SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # NOTE: There is no data after offset.
+                    break
+                if e.errno == errno.EINVAL and offset == 0:
+                    return [(0, size)] if size else []
+                raise
+            end = os.lseek(fd, start, _SEEK_HOLE)
+            extents.append((start, end))
+            offset = end
+        return extents
+    finally:
+        os.close(fd)
+
+
+class DiskTransfer(object):
+    """Copy one image file to dest_path on host."""
+
+    def __init__(self, src, host, dest_path, streams, chunk_size,
+                 bytes_per_second=0, retries=0, progress=None):
+        self.src = src
+        self.host = host
+        self.dest_path = dest_path
+        self.streams = streams
+        self.chunk_size = max(_BLOCK_SIZE,
+                              chunk_size - chunk_size % _BLOCK_SIZE)
+        self.bytes_per_second = bytes_per_second
+        self.retries = retries
+        self.progress = progress
+
+        self.size = 0
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self._pending = collections.deque()
+        self._error = None
+        self._started_at = None
+        self._reserved_bytes = 0
+
+    def _chunks(self):
+        """Split the allocated extents into block aligned chunks."""
+        chunks = []
+        next_offset = 0
+        for start, end in allocated_extents(self.src):
+            start = max(start - start % _BLOCK_SIZE, next_offset)
+            end = min(end + -end % _BLOCK_SIZE, self.size)
+            while start < end:
+                length = min(self.chunk_size - start % self.chunk_size,
+                             end - start)
+                chunks.append((start, length))
+                start += length
+            next_offset = start
+        return chunks
+
+    def _throttle(self, length):
+        """Sleep until sending length more bytes keeps under the cap."""
+        if not self.bytes_per_second:
+            return
+        self._reserved_bytes += length
+        due = (self._started_at +
+               float(self._reserved_bytes - length) / self.bytes_per_second)
+        greenthread.sleep(max(0, due - time.time()))
+
+    def _send_chunk(self, offset, length):
+        with open(self.src, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        utils.execute('ssh', self.host, 'dd', 'of=%s' % self.dest_path,
+                      'bs=%d' % _BLOCK_SIZE,
+                      'seek=%d' % (offset / _BLOCK_SIZE),
+                      'conv=notrunc', process_input=data)
+
+    def _worker(self):
+        try:
+            while self._pending:
+                offset, length = self._pending.popleft()
+                self._throttle(length)
+                attempt = 0
+                while True:
+                    try:
+                        self._send_chunk(offset, length)
+                        break
+                    except Exception:
+                        attempt += 1
+                        if attempt > self.retries:
+                            raise
+                        LOG.warn(_('Resending bytes %(offset)d-%(end)d of '
+                                   '%(src)s to %(host)s'),
+                                 {'offset': offset, 'end': offset + length,
+                                  'src': self.src, 'host': self.host})
+                        greenthread.sleep(attempt)
+                self.sent_bytes += length
+                if self.progress is not None:
+                    self.progress(self.sent_bytes, self.total_bytes)
+        except Exception:
+            # NOTE: Stop the other streams picking up new chunks, and keep
+            # the first failure to re-raise once they have finished.
+            self._pending.clear()
+            if self._error is None:
+                self._error = sys.exc_info()
+
+    def run(self):
+        """Copy the file, and return some statistics."""
+        self._started_at = time.time()
+        self.size = os.path.getsize(self.src)
+        chunks = self._chunks()
+        self._pending.extend(chunks)
+        self.total_bytes = sum(length for _offset, length in chunks)
+
+        # NOTE: Recreate the destination as a sparse file of the right size,
+        # so that holes which are not sent read back as zeros.
+        utils.execute('ssh', self.host, 'truncate', '-s', 0,
+                      self.dest_path)
+        utils.execute('ssh', self.host, 'truncate', '-s', self.size,
+                      self.dest_path)
+
+        streams = min(self.streams, len(chunks)) or 1
+        pool = eventlet.GreenPool(streams)
+        for _i in range(streams):
+            pool.spawn_n(self._worker)
+        pool.waitall()
+        if self._error is not None:
+            six.reraise(*self._error)
+
+        seconds = time.time() - self._started_at
+        rate = self.sent_bytes / seconds / units.Mi if seconds else 0.0
+        LOG.info(_('Copied %(sent)d allocated bytes of the %(size)d byte '
+                   'image %(src)s to %(host)s in %(seconds).2f seconds '
+                   '(%(rate).1f MB/s) using %(streams)d streams'),
+                 {'sent': self.sent_bytes, 'size': self.size,
+                  'src': self.src, 'host': self.host, 'seconds': seconds,
+                  'rate': rate, 'streams': streams})
+        return {'size': self.size, 'sent_bytes': self.sent_bytes,
+                'seconds': seconds, 'rate': rate, 'streams': streams}
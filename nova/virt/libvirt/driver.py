@@ -97,9 +97,11 @@ from nova.virt import event as virtevent
 from nova.virt import firewall
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import disktransfer
 from nova.virt.libvirt import firewall as libvirt_firewall
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import lvmwipe
 from nova.virt.libvirt import utils as libvirt_utils
 from nova.virt import netutils
 from nova.virt import watchdog_actions
@@ -387,6 +389,12 @@ class LibvirtDriver(driver.ComputeDriver):
         self.image_cache_manager = imagecache.ImageCacheManager()
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
 
+        self._wipe_queue = None
+        if (CONF.libvirt.volume_clear_async and
+                CONF.libvirt.images_volume_group):
+            self._wipe_queue = lvmwipe.WipeQueue(
+                CONF.libvirt.images_volume_group)
+
         self.disk_cachemodes = {}
 
         self.valid_cachemodes = ["default",
@@ -659,6 +667,9 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._init_events()
 
+        if self._wipe_queue is not None:
+            self._wipe_queue.resume()
+
     def _get_new_connection(self):
         # call with _wrapped_conn_lock held
         LOG.debug(_('Connecting to libvirt: %s'), self.uri())
@@ -1082,7 +1093,10 @@ class LibvirtDriver(driver.ComputeDriver):
         """Delete all LVM disks for given instance object."""
         disks = self._lvm_disks(instance)
         if disks:
-            libvirt_utils.remove_logical_volumes(*disks)
+            if self._wipe_queue is not None:
+                self._wipe_queue.enqueue(*disks)
+            else:
+                libvirt_utils.remove_logical_volumes(*disks)
 
     def _lvm_disks(self, instance):
         """Returns all LVM disks for given instance object."""
@@ -4125,6 +4139,12 @@ class LibvirtDriver(driver.ComputeDriver):
         stats = self.get_host_stats(refresh=True)
         stats['supported_instances'] = jsonutils.dumps(
                 stats['supported_instances'])
+        if self._wipe_queue is not None:
+            # NOTE: Volumes waiting to be wiped no longer belong to an
+            # instance, but their space is not free yet.
+            pending_bytes = self._wipe_queue.pending_bytes
+            stats['local_gb_pending_wipe'] = ((pending_bytes + units.Gi - 1)
+                                              / units.Gi)
         return stats
 
     def check_instance_shared_storage_local(self, context, instance):
@@ -4819,6 +4839,31 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def cache_image(self, context, image_id):
+        """Download an image into _base, and pin it there for a while."""
+        filename = imagecache.get_cache_fname({'image_id': image_id},
+                                              'image_id')
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        fileutils.ensure_tree(base_dir)
+        base = os.path.join(base_dir, filename)
+        lock_path = os.path.join(CONF.instances_path, 'locks')
+
+        # NOTE: This takes the lock that imagebackend.Image.cache() takes to
+        # fetch the same base file, so a boot waits for the pre-cache
+        # download rather than starting its own.
+        @utils.synchronized(filename, external=True, lock_path=lock_path)
+        def fetch_image_sync():
+            if os.path.exists(base):
+                return False
+            libvirt_utils.fetch_image(context, base, image_id,
+                                      context.user_id, context.project_id)
+            return True
+
+        fetched = fetch_image_sync()
+        imagecache.pin_base_file(base)
+        return fetched
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
@@ -4901,7 +4946,7 @@ class LibvirtDriver(driver.ComputeDriver):
             if shared_storage:
                 dest = None
                 utils.execute('mkdir', '-p', inst_base)
-            for info in disk_info:
+            for index, info in enumerate(disk_info):
                 # assume inst_base == dirname(info['path'])
                 img_path = info['path']
                 fname = os.path.basename(img_path)
@@ -4915,11 +4960,14 @@ class LibvirtDriver(driver.ComputeDriver):
                     if shared_storage:
                         utils.execute('mv', tmp_path, img_path)
                     else:
-                        libvirt_utils.copy_image(tmp_path, img_path, host=dest)
+                        self._copy_disk(context, instance, tmp_path,
+                                        img_path, dest, index,
+                                        len(disk_info))
                         utils.execute('rm', '-f', tmp_path)
 
                 else:  # raw or qcow2 with no backing file
-                    libvirt_utils.copy_image(from_path, img_path, host=dest)
+                    self._copy_disk(context, instance, from_path, img_path,
+                                    dest, index, len(disk_info))
         except Exception:
             with excutils.save_and_reraise_exception():
                 self._cleanup_remote_migration(dest, inst_base,
@@ -4928,6 +4976,38 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return disk_info_text
 
+    def _copy_disk(self, context, instance, src, dest_path, host, index,
+                   disk_count):
+        """Copy disk number index of a migrating instance to host.
+
+        With more than one migration transfer stream the disk is copied in
+        parallel chunks, and how much of all of the disks of the instance
+        has been copied is recorded as the progress of the instance.
+        """
+        if not host or CONF.libvirt.migration_transfer_streams <= 1:
+            libvirt_utils.copy_image(src, dest_path, host=host)
+            return
+
+        reported = [None]
+
+        def progress(done, total):
+            fraction = float(done) / total if total else 1.0
+            percent = int(100 * (index + fraction) / disk_count)
+            if percent != reported[0]:
+                reported[0] = percent
+                self.virtapi.instance_update(context, instance['uuid'],
+                                             {'progress': percent})
+
+        transfer = disktransfer.DiskTransfer(
+            src, host, dest_path,
+            streams=CONF.libvirt.migration_transfer_streams,
+            chunk_size=CONF.libvirt.migration_transfer_chunk_mb * units.Mi,
+            bytes_per_second=(CONF.libvirt.migration_transfer_max_mb_per_second
+                              * units.Mi),
+            retries=CONF.libvirt.migration_transfer_retries,
+            progress=progress)
+        transfer.run()
+
     def _wait_for_running(self, instance):
         state = self.get_info(instance)['state']
 
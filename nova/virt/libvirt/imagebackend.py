@@ -18,10 +18,12 @@ import contextlib
 import os
 
 import six
+import six.moves.urllib.parse as urlparse
 
 from oslo.config import cfg
 
 from nova import exception
+from nova.image import glance
 from nova.openstack.common import excutils
 from nova.openstack.common import fileutils
 from nova.openstack.common.gettextutils import _
@@ -85,6 +87,9 @@ CONF = cfg.CONF
 CONF.register_opts(__imagebackend_opts, 'libvirt')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 CONF.import_opt('preallocate_images', 'nova.virt.driver')
+CONF.import_opt('rbd_user', 'nova.virt.libvirt.volume', group='libvirt')
+CONF.import_opt('rbd_secret_uuid', 'nova.virt.libvirt.volume',
+                group='libvirt')
 
 LOG = logging.getLogger(__name__)
 
@@ -500,10 +505,14 @@ class RBDVolumeProxy(object):
     The underlying librados client and ioctx can be accessed as the attributes
     'client' and 'ioctx'.
     """
-    def __init__(self, driver, name, pool=None):
+    def __init__(self, driver, name, pool=None, snapshot=None,
+                 read_only=False):
         client, ioctx = driver._connect_to_rados(pool)
         try:
-            self.volume = driver.rbd.Image(ioctx, str(name), snapshot=None)
+            snap_name = str(snapshot) if snapshot is not None else None
+            self.volume = driver.rbd.Image(ioctx, str(name),
+                                           snapshot=snap_name,
+                                           read_only=read_only)
         except driver.rbd.Error:
             LOG.exception(_("error opening rbd image %s"), name)
             driver._disconnect_from_rados(client, ioctx)
@@ -660,10 +669,115 @@ class Rbd(Image):
         with RBDVolumeProxy(self, volume_name) as vol:
             vol.resize(size)
 
+    def _get_fsid(self):
+        client, ioctx = self._connect_to_rados()
+        try:
+            return client.get_fsid()
+        finally:
+            self._disconnect_from_rados(client, ioctx)
+
+    @staticmethod
+    def _parse_location(url):
+        """Split an rbd://fsid/pool/image/snapshot image location.
+
+        Returns None for other locations.
+        """
+        prefix = 'rbd://'
+        if not url.startswith(prefix):
+            return None
+        pieces = [urlparse.unquote(piece)
+                  for piece in url[len(prefix):].split('/')]
+        if len(pieces) != 4 or '' in pieces:
+            return None
+        return pieces
+
+    def _is_cloneable(self, fsid, pool, image, snapshot):
+        if fsid != self._get_fsid():
+            LOG.debug(_('Image %s is in another ceph cluster'), image)
+            return False
+        try:
+            with RBDVolumeProxy(self, image, pool=pool, snapshot=snapshot,
+                                read_only=True):
+                return True
+        except self.rbd.Error as e:
+            LOG.debug(_('Unable to open image %(pool)s/%(image)s@%(snap)s: '
+                        '%(error)s'),
+                      {'pool': pool, 'image': image, 'snap': snapshot,
+                       'error': e})
+            return False
+
+    def _clone(self, pool, image, snapshot):
+        src_client, src_ioctx = self._connect_to_rados(pool)
+        try:
+            dest_client, dest_ioctx = self._connect_to_rados()
+            try:
+                self.rbd.RBD().clone(src_ioctx, str(image), str(snapshot),
+                                     dest_ioctx, str(self.rbd_name),
+                                     features=self.rbd.RBD_FEATURE_LAYERING)
+            finally:
+                self._disconnect_from_rados(dest_client, dest_ioctx)
+        finally:
+            self._disconnect_from_rados(src_client, src_ioctx)
+
+    def _clone_from_glance(self, context, image_id):
+        """Clone the volume from the glance image if glance stores it as a
+        snapshot in this ceph cluster.
+
+        Returns whether the volume was cloned.
+        """
+        if context is None or image_id is None:
+            return False
+        if not self._supports_layering():
+            return False
+
+        image_service = glance.get_default_image_service()
+        try:
+            image_meta = image_service.show(context, image_id)
+            if image_meta.get('disk_format') != 'raw':
+                return False
+            locations = image_service._get_locations(context, image_id)
+        except Exception as e:
+            LOG.debug(_('Unable to get the locations of image %(image_id)s: '
+                        '%(error)s'), {'image_id': image_id, 'error': e})
+            return False
+
+        for location in locations:
+            pieces = self._parse_location(location['url'])
+            if pieces is None or not self._is_cloneable(*pieces):
+                continue
+            if self.check_image_exists():
+                # NOTE: The volume was cloned for an earlier boot, and there
+                # is no base file to show it.
+                return True
+            fsid, pool, image, snapshot = pieces
+            try:
+                self._clone(pool, image, snapshot)
+            except self.rbd.Error:
+                LOG.exception(_('Failed to clone image %(image_id)s to '
+                                '%(name)s'),
+                              {'image_id': image_id, 'name': self.rbd_name})
+                continue
+            LOG.info(_('Cloned image %(image_id)s from %(pool)s/%(image)s@'
+                       '%(snap)s to %(name)s'),
+                     {'image_id': image_id, 'pool': pool, 'image': image,
+                      'snap': snapshot, 'name': self.rbd_name})
+            return True
+        return False
+
     def create_image(self, prepare_template, base, size, *args, **kwargs):
         if self.rbd is None:
             raise RuntimeError(_('rbd python libraries not found'))
 
+        # NOTE: A raw glance image stored in this ceph cluster is cloned
+        # copy-on-write, without a base file on this host.
+        if self._clone_from_glance(kwargs.get('context'),
+                                   kwargs.get('image_id')):
+            if size:
+                with RBDVolumeProxy(self, self.rbd_name) as vol:
+                    if size > vol.size():
+                        vol.resize(size)
+            return
+
         if not os.path.exists(base):
             prepare_template(target=base, max_size=size, *args, **kwargs)
         else:
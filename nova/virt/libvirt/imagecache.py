@@ -33,6 +33,7 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import processutils
+from nova.openstack.common import units
 from nova import utils
 from nova.virt import imagecache
 from nova.virt.libvirt import utils as virtutils
@@ -66,6 +67,21 @@ imagecache_opts = [
                default=3600,
                help='How frequently to checksum base images',
                deprecated_group='DEFAULT'),
+    cfg.IntOpt('precached_image_pin_seconds',
+               default=86400,
+               help='Number of seconds for which an image that was '
+                    'pre-cached is kept in the image cache, even if no '
+                    'instance uses it'),
+    cfg.IntOpt('checksum_max_mb_per_pass',
+               default=0,
+               help='Maximum number of megabytes of base images read to '
+                    'checksum them in one image cache manager pass. Larger '
+                    'images are checksummed over several passes. 0 means '
+                    'no limit.'),
+    cfg.IntOpt('checksum_max_mb_per_second',
+               default=0,
+               help='Maximum rate in megabytes per second at which base '
+                    'images are read to checksum them. 0 means no limit.'),
     ]
 
 CONF = cfg.CONF
@@ -73,6 +89,8 @@ CONF.register_opts(imagecache_opts, 'libvirt')
 CONF.import_opt('instances_path', 'nova.compute.manager')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 
+_CHECKSUM_CHUNK_SIZE = units.Mi
+
 
 def get_cache_fname(images, key):
     """Return a filename based on the SHA1 hash of a given image ID.
@@ -214,6 +232,18 @@ def write_stored_info(target, field=None, value=None):
     write_file(info_file, field, value)
 
 
+def pin_base_file(base_file):
+    """Keep a base file for precached_image_pin_seconds from now."""
+    write_stored_info(base_file, field='precached', value=True)
+
+
+def _is_pinned(base_file):
+    _precached, pinned_at = read_stored_info(base_file, field='precached',
+                                             timestamped=True)
+    return bool(pinned_at and time.time() - pinned_at <
+                CONF.libvirt.precached_image_pin_seconds)
+
+
 def _hash_file(filename):
     """Generate a hash for the contents of a file."""
     checksum = hashlib.sha1()
@@ -223,6 +253,12 @@ def _hash_file(filename):
     return checksum.hexdigest()
 
 
+def _stat_key(path):
+    """Return what is compared to tell whether a file has changed."""
+    st = os.stat(path)
+    return (st.st_size, st.st_ino, st.st_mtime)
+
+
 def read_stored_checksum(target, timestamped=True):
     """Read the checksum.
 
@@ -240,6 +276,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        # NOTE: Both map a base file to the _stat_key() it had when it was
+        # last verified, or when its checksum was started.  Checksums in
+        # progress also keep the offset reached and the hash object, which
+        # cannot be persisted, so they restart if nova-compute does.
+        self._verified_files = {}
+        self._checksums_in_progress = {}
         self._reset_state()
 
     def _reset_state(self):
@@ -255,6 +297,11 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.removable_base_files = []
         self.unexplained_images = []
 
+        self.checksum_pass_limit = (CONF.libvirt.checksum_max_mb_per_pass *
+                                    units.Mi)
+        self.checksum_bytes = 0
+        self.checksum_seconds = 0.0
+
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
         entpath = os.path.join(base_dir, ent)
@@ -354,6 +401,90 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             if m:
                 yield img, False, True
 
+    def _hash_file_incremental(self, base_file):
+        """Continue checksumming a file from where the last pass stopped.
+
+        Reads at most what is left of checksum_max_mb_per_pass, at no more
+        than checksum_max_mb_per_second.  Returns the checksum (as hex)
+        once the whole file has been read, or None.
+        """
+        key = _stat_key(base_file)
+        state = self._checksums_in_progress.pop(base_file, None)
+        if state is None or state[0] != key:
+            state = (key, 0, hashlib.sha1())
+        key, offset, checksum = state
+
+        pass_limit = self.checksum_pass_limit
+        rate = CONF.libvirt.checksum_max_mb_per_second * units.Mi
+        started_at = time.time()
+        read = 0
+        done = False
+        with open(base_file, 'rb') as f:
+            f.seek(offset)
+            while not pass_limit or self.checksum_bytes < pass_limit:
+                chunk = f.read(_CHECKSUM_CHUNK_SIZE)
+                if not chunk:
+                    done = True
+                    break
+                checksum.update(chunk)
+                offset += len(chunk)
+                read += len(chunk)
+                self.checksum_bytes += len(chunk)
+                # Give other threads a chance to run, and keep to the rate
+                delay = 0
+                if rate:
+                    delay = float(read) / rate - (time.time() - started_at)
+                time.sleep(max(delay, 0))
+        self.checksum_seconds += time.time() - started_at
+
+        if done:
+            return checksum.hexdigest()
+
+        self._checksums_in_progress[base_file] = (key, offset, checksum)
+        LOG.info(_('%(base_file)s: checksummed %(offset)d of %(size)d '
+                   'bytes, continuing in the next pass'),
+                 {'base_file': base_file, 'offset': offset, 'size': key[0]})
+        return None
+
+    def _touch_base_file(self, base_file):
+        """Update the mtime of a base file which is in use, without
+        making it look changed to the checksum verification.
+        """
+        if (base_file not in self._verified_files and
+                base_file not in self._checksums_in_progress):
+            os.utime(base_file, None)
+            return
+
+        old_key = _stat_key(base_file)
+        os.utime(base_file, None)
+        new_key = _stat_key(base_file)
+        if self._verified_files.get(base_file) == old_key:
+            self._verified_files[base_file] = new_key
+        state = self._checksums_in_progress.get(base_file)
+        if state is not None and state[0] == old_key:
+            self._checksums_in_progress[base_file] = (new_key,) + state[1:]
+
+    def _report_checksum_progress(self):
+        """Log the checksum throughput of this pass and the backlog."""
+        if not CONF.libvirt.checksum_base_images:
+            return
+        for base_file in self._checksums_in_progress.keys():
+            if not os.path.exists(base_file):
+                del self._checksums_in_progress[base_file]
+        backlog = sum(key[0] - offset for key, offset, _checksum
+                      in self._checksums_in_progress.values())
+        rate = 0.0
+        if self.checksum_seconds:
+            rate = self.checksum_bytes / self.checksum_seconds / units.Mi
+        LOG.info(_('Checksummed %(bytes)d bytes of base images in '
+                   '%(seconds).1f seconds (%(rate).1f MB/s); %(files)d '
+                   'base files with %(backlog)d bytes left to checksum'),
+                 {'bytes': self.checksum_bytes,
+                  'seconds': self.checksum_seconds,
+                  'rate': rate,
+                  'files': len(self._checksums_in_progress),
+                  'backlog': backlog})
+
     def _verify_checksum(self, img_id, base_file, create_if_missing=True):
         """Compare the checksum stored on disk with the current file.
 
@@ -382,22 +513,33 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                         CONF.libvirt.checksum_interval_seconds):
                     return True
 
+                # NOTE: Files which have not changed since they were last
+                # verified are not read again.
+                if self._verified_files.get(base_file) == _stat_key(
+                        base_file):
+                    return True
+
+                key = _stat_key(base_file)
+                current_checksum = self._hash_file_incremental(base_file)
+                if current_checksum is None:
+                    return None
+
                 # NOTE(mikal): If there is no timestamp, then the checksum was
                 # performed by a previous version of the code.
                 if not stored_timestamp:
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
-                current_checksum = _hash_file(base_file)
-
                 if current_checksum != stored_checksum:
                     LOG.error(_('image %(id)s at (%(base_file)s): image '
                                 'verification failed'),
                               {'id': img_id,
                                'base_file': base_file})
+                    self._verified_files.pop(base_file, None)
                     return False
 
                 else:
+                    self._verified_files[base_file] = key
                     return True
 
             else:
@@ -413,7 +555,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     LOG.info(_('%(id)s (%(base_file)s): generating checksum'),
                              {'id': img_id,
                               'base_file': base_file})
-                    write_stored_checksum(base_file)
+                    key = _stat_key(base_file)
+                    checksum = self._hash_file_incremental(base_file)
+                    if checksum is not None:
+                        write_stored_info(base_file, field='sha1',
+                                          value=checksum)
+                        self._verified_files[base_file] = key
 
                 return None
 
@@ -439,6 +586,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if age < maxage:
             LOG.info(_('Base file too young to remove: %s'),
                      base_file)
+        elif _is_pinned(base_file):
+            LOG.info(_('Base file was pre-cached recently, not removing: '
+                       '%s'), base_file)
         else:
             LOG.info(_('Removing base file: %s'), base_file)
             try:
@@ -519,7 +669,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                            'base_file': base_file})
                 if os.path.exists(base_file):
                     virtutils.chown(base_file, os.getuid())
-                    os.utime(base_file, None)
+                    self._touch_base_file(base_file)
 
     def _age_and_verify_cached_images(self, context, all_instances, base_dir):
         LOG.debug(_('Verify base images'))
@@ -563,6 +713,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 for base_file in self.removable_base_files:
                     self._remove_base_file(base_file)
 
+        self._report_checksum_progress()
+
         # That's it
         LOG.debug(_('Verification complete'))
 
@@ -0,0 +1,188 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Wipe the logical volumes of deleted instances in the background.
+
+Instead of clearing the disks of a deleted instance before the delete
+completes, the volumes are renamed to a pending wipe name and queued.  A
+single greenthread then clears them one at a time, at a limited rate and
+I/O priority, and removes each volume once it has been cleared.  As the
+queue is just the set of volumes with a pending wipe name, volumes which
+were not wiped before nova-compute stopped are picked up when it starts
+again.
+"""
+
+import collections
+import os
+import time
+
+from eventlet import greenthread
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import units
+from nova import utils
+from nova.virt.libvirt import utils as libvirt_utils
+
+lvmwipe_opts = [
+    cfg.BoolOpt('volume_clear_async',
+                default=False,
+                help='Clear the logical volumes of deleted instances in the '
+                     'background, after the delete has completed. The space '
+                     'is freed once a volume has been cleared.'),
+    cfg.StrOpt('volume_clear_ionice',
+               help='ionice arguments to clear volumes in the background '
+                    'with, "-c<class>" optionally followed by "-n<level>", '
+                    'for example "-c3" for the idle class'),
+    cfg.IntOpt('volume_clear_max_mb_per_second',
+               default=0,
+               help='Limit on the rate at which volumes are cleared in the '
+                    'background, in megabytes per second. 0 => unlimited'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(lvmwipe_opts, 'libvirt')
+
+LOG = logging.getLogger(__name__)
+
+# Logical volumes waiting to be wiped are renamed with this prefix, which
+# does not match the <instance uuid>_ pattern of instance disks.
+WIPE_PREFIX = 'nova-wipe_'
+
+_WIPE_CHUNK_SIZE = 64 * units.Mi
+
+
+class WipeQueue(object):
+    """Queue of logical volumes in a volume group to wipe and remove."""
+
+    def __init__(self, vg):
+        self.vg = vg
+        self._queue = collections.deque()
+        self._sizes = {}
+        self._failed = {}
+        self._running = False
+        self._current = None
+        self._current_done = 0
+        self._wiped_volumes = 0
+        self._wiped_bytes = 0
+
+    def _path(self, name):
+        return os.path.join('/dev', self.vg, name)
+
+    def _add(self, name, size):
+        self._sizes[name] = size
+        self._queue.append(name)
+
+    def _start(self):
+        if self._queue and not self._running:
+            self._running = True
+            utils.spawn_n(self._run)
+
+    def resume(self):
+        """Queue volumes left with a pending wipe name by a previous run."""
+        for name in libvirt_utils.list_logical_volumes(self.vg):
+            if name.startswith(WIPE_PREFIX) and name not in self._sizes:
+                LOG.info(_('Resuming wipe of logical volume %s'), name)
+                self._failed.pop(name, None)
+                self._add(name, libvirt_utils.logical_volume_size(
+                    self._path(name)))
+        self._start()
+
+    def enqueue(self, *paths):
+        """Rename logical volumes out of the way and queue them for wiping.
+
+        Volumes which cannot be renamed are wiped and removed before this
+        returns, as they would be without the queue.
+        """
+        unqueued = []
+        for path in paths:
+            name = os.path.basename(path)
+            pending_name = WIPE_PREFIX + name
+            try:
+                size = libvirt_utils.logical_volume_size(path)
+                libvirt_utils.rename_logical_volume(self.vg, name,
+                                                    pending_name)
+                self._add(pending_name, size)
+            except Exception:
+                LOG.exception(_('Failed to queue logical volume %s for '
+                                'wiping, wiping it now'), path)
+                unqueued.append(path)
+        if unqueued:
+            libvirt_utils.remove_logical_volumes(*unqueued)
+        self._start()
+
+    def _throttle(self, started_at):
+        bytes_per_second = CONF.libvirt.volume_clear_max_mb_per_second
+        bytes_per_second *= units.Mi
+
+        def after_chunk(length):
+            self._current_done += length
+            if bytes_per_second:
+                due = started_at + float(self._current_done) / bytes_per_second
+                greenthread.sleep(max(0, due - time.time()))
+            else:
+                greenthread.sleep(0)
+        return after_chunk
+
+    def _wipe(self, name):
+        path = self._path(name)
+        self._current = name
+        self._current_done = 0
+        started_at = time.time()
+        libvirt_utils.clear_logical_volume(
+            path, ionice=CONF.libvirt.volume_clear_ionice,
+            chunk_size=_WIPE_CHUNK_SIZE,
+            after_chunk=self._throttle(started_at))
+        libvirt_utils.execute('lvremove', '-f', path, attempts=3,
+                              run_as_root=True)
+        self._wiped_volumes += 1
+        self._wiped_bytes += self._sizes[name]
+        LOG.info(_('Wiped logical volume %(name)s in %(seconds).1f seconds, '
+                   '%(pending)d volumes of %(pending_bytes)d bytes left to '
+                   'wipe'),
+                 {'name': name, 'seconds': time.time() - started_at,
+                  'pending': len(self._queue) - 1,
+                  'pending_bytes': self.pending_bytes - self._sizes[name]})
+
+    def _run(self):
+        while self._queue:
+            name = self._queue[0]
+            try:
+                self._wipe(name)
+            except Exception:
+                # NOTE: The volume keeps its pending wipe name, so the wipe
+                # is tried again when nova-compute restarts.  Until then its
+                # space is still in use.
+                LOG.exception(_('Failed to wipe logical volume %s'), name)
+                self._failed[name] = self._sizes[name]
+            self._queue.popleft()
+            del self._sizes[name]
+            self._current = None
+        self._running = False
+
+    @property
+    def pending_bytes(self):
+        """Space taken by volumes which are queued, being wiped, or could
+        not be wiped.
+        """
+        return sum(self._sizes.values()) + sum(self._failed.values())
+
+    def get_stats(self):
+        """Return the backlog and progress of the queue."""
+        return {'pending_volumes': len(self._queue),
+                'pending_bytes': self.pending_bytes,
+                'current_volume': self._current,
+                'current_bytes_done': self._current_done,
+                'failed_volumes': len(self._failed),
+                'wiped_volumes': self._wiped_volumes,
+                'wiped_bytes': self._wiped_bytes}
@@ -21,6 +21,7 @@
 import errno
 import os
 import platform
+import re
 
 from lxml import etree
 from oslo.config import cfg
@@ -352,11 +353,28 @@ def logical_volume_size(path):
     return int(out)
 
 
-def _zero_logical_volume(path, volume_size):
+def _ionice_prefix(ionice):
+    """Return the command prefix which runs a command with the given ionice
+    arguments, if any.
+
+    Only "-c<class>" optionally followed by "-n<level>" is accepted, which
+    is all the rootwrap filters for ionice allow.
+    """
+    if not ionice:
+        return ()
+    if not re.match(r'^-c[0-3]( -n[0-7])?$', ionice.strip()):
+        raise exception.Invalid(_("ionice arguments %s are not of the form "
+                                  "'-c<class> [-n<level>]'") % ionice)
+    return ('ionice',) + tuple(ionice.split())
+
+
+def _zero_logical_volume(path, volume_size, offset=0, ionice=None):
     """Write zeros over the specified path
 
     :param path: logical volume path
     :param size: number of zeros to write
+    :param offset: where to start writing, a multiple of 1MiB
+    :param ionice: ionice arguments to run dd with, e.g. '-c3'
     """
     bs = units.Mi
     direct_flags = ('oflag=direct',)
@@ -368,8 +386,9 @@ def _zero_logical_volume(path, volume_size):
     # the easier to use iflag=count_bytes option.
     while remaining_bytes:
         zero_blocks = remaining_bytes / bs
-        seek_blocks = (volume_size - remaining_bytes) / bs
-        zero_cmd = ('dd', 'bs=%s' % bs,
+        seek_blocks = (offset + volume_size - remaining_bytes) / bs
+        zero_cmd = _ionice_prefix(ionice) + (
+                    'dd', 'bs=%s' % bs,
                     'if=/dev/zero', 'of=%s' % path,
                     'seek=%s' % seek_blocks, 'count=%s' % zero_blocks)
         zero_cmd += direct_flags
@@ -383,10 +402,15 @@ def _zero_logical_volume(path, volume_size):
         sync_flags = ('conv=fdatasync',)
 
 
-def clear_logical_volume(path):
+def clear_logical_volume(path, ionice=None, chunk_size=0, after_chunk=None):
     """Obfuscate the logical volume.
 
     :param path: logical volume path
+    :param ionice: ionice arguments to run the wipe with, e.g. '-c3'
+    :param chunk_size: when zeroing, write zeros this many bytes (a
+                       multiple of 1MiB) at a time rather than all at once
+    :param after_chunk: called with the number of bytes written after each
+                        chunk, which can sleep to throttle the wipe
     """
     volume_clear = CONF.libvirt.volume_clear
 
@@ -407,15 +431,33 @@ def clear_logical_volume(path):
     if volume_clear == 'zero':
         # NOTE(p-draigbrady): we could use shred to do the zeroing
         # with -n0 -z, however only versions >= 8.22 perform as well as dd
-        _zero_logical_volume(path, volume_size)
+        chunk_size = chunk_size or max(volume_size, 1)
+        for offset in range(0, volume_size, chunk_size):
+            length = min(chunk_size, volume_size - offset)
+            _zero_logical_volume(path, length, offset=offset, ionice=ionice)
+            if after_chunk is not None:
+                after_chunk(length)
     elif volume_clear == 'shred':
-        utils.execute('shred', '-n3', '-s%d' % volume_size, path,
-                      run_as_root=True)
+        shred_cmd = _ionice_prefix(ionice) + (
+                     'shred', '-n3', '-s%d' % volume_size, path)
+        utils.execute(*shred_cmd, run_as_root=True)
+        if after_chunk is not None:
+            after_chunk(volume_size)
     else:
         raise exception.Invalid(_("volume_clear='%s' is not handled")
                                 % volume_clear)
 
 
+def rename_logical_volume(vg, lv, new_name):
+    """Rename a logical volume.
+
+    :param vg: volume group name
+    :param lv: current name of the logical volume
+    :param new_name: new name for the logical volume
+    """
+    execute('lvrename', vg, lv, new_name, run_as_root=True)
+
+
 def remove_logical_volumes(*paths):
     """Remove one or more logical volume."""
 